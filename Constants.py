@@ -19,9 +19,49 @@ class Modes(Enum):
     MODE_REPLAY = 'MODE_REPLAY'
 
 
+# The integer code of a direction is its index in this list (e.g., for vectorized engines)
+DIRECTIONS_LIST = [Directions.UP, Directions.DOWN, Directions.LEFT, Directions.RIGHT]
+# The kinds of 2048 games (the agent playing them)
+GAME_TYPES = ['HUMAN', 'RANDOM', 'NEURAL', 'NTUPLE', 'EXPECTIMAX', 'MONTECARLO']
 GRID_NB_ROWS_COLUMNS = 4
+RANDOM_SEED = None  # Set an integer to get the same results when generating random numbers (games, networks)
+USE_BITBOARD_GRID = True  # Use the 64-bit bitboard engine for 4x4 grids
 TILE_NUMBER_TO_WIN = 2048
+HISTORY_KEYFRAME_INTERVAL = 32  # Number of rounds between two full Grid states stored in an History
+REPLAY_FLUSH_INTERVAL = 16  # Number of rounds between two flushes of a game log streamed during the Game
+REPLAY_HISTORY_WINDOW = 256  # Number of recent rounds kept in memory while a game log is streamed
+REPLAY_FORMAT = 'log'  # Format of the saved games: 'log' (text), 'bin' (binary replay) or 'seed' (seed replay)
 DATA_DIR_NAME = 'data'
 TRAIN_DIR_NAME = 'train_logs'
+MODELS_DIR_NAME = 'models'
+CACHE_DIR_NAME = 'cache'
+REPLAY_CATALOG_FILE_NAME = 'replays.sqlite'  # Index of the summaries of the replays (see model.ReplayCatalog)
+NEURAL_NET_MODEL_FILE_NAME = 'neural_net.npz'
+NEURAL_NET_LAYER_SHAPES = [[16, 4], [4, 4]]  # (Nb inputs, nb neurons) of each layer: one hidden layer, one output
 NEURAL_NET_TRAINING_RATE = 0.3
 NEURAL_NET_MAX_EPOCHS = 400
+NEURAL_NET_BATCH_SIZE = 32  # Number of samples per weights update (1 for online training)
+NEURAL_NET_INCREMENTAL_EPOCHS = 100  # Number of epochs when training a saved network on new logs only
+NEURAL_NET_REPLAY_RATIO = 0.5  # Number of examples of already consumed logs replayed per new example
+NEURAL_NET_MIN_MAX_TILE = None  # Set a tile value to train only on the logs that reached it (e.g., 1024)
+NEURAL_NET_USE_CORPUS = False  # Stream the training examples from an on-disk corpus (for corpora larger than memory)
+CORPUS_DIR_NAME = 'corpus'
+CORPUS_BLOCK_SIZE = 65536  # Number of consecutive examples read at once from an on-disk corpus
+NEUROEVOLUTION_CHECKPOINT_FILE_NAME = 'neuroevolution.npz'
+NEUROEVOLUTION_POPULATION_SIZE = 32  # Number of candidate networks per generation
+NEUROEVOLUTION_GENERATIONS = 20
+NEUROEVOLUTION_GAMES_PER_CANDIDATE = 8  # Number of seeded games played to measure the fitness of a candidate
+NEUROEVOLUTION_ELITE_FRACTION = 0.25  # Fraction of the best candidates kept (and mutated) at each generation
+NEUROEVOLUTION_MUTATION_STD = 0.1
+NTUPLE_MODEL_FILE_NAME = 'ntuple.npz'
+NTUPLE_TRAINING_GAMES = 2000  # Number of self-played games to train a new n-tuple network
+NTUPLE_LEARNING_RATE = 0.1
+EXPECTIMAX_DEPTH = 2
+EXPECTIMAX_MIN_PROBABILITY = 0.0001
+EXPECTIMAX_TABLE_SIZE = 1000000
+# Share transposition table entries between symmetric boards (the row heuristics of ai/Heuristics.py are symmetric)
+EXPECTIMAX_USE_SYMMETRIES = True
+ANYTIME_TIME_BUDGET_MS = 10
+ANYTIME_MAX_DEPTH = 8
+MONTECARLO_NB_ROLLOUTS = 100
+MONTECARLO_ROLLOUT_DEPTH = 20
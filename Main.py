@@ -1,81 +1,179 @@
 # coding: utf-8
 import argparse
+import os
 import pathlib
+import time
 from os import path
-from random import shuffle
-import numpy as np
+
 import Constants
-from Constants import Directions
-from ai.Layer import Layer
-from ai.NeuralNetwork import NeuralNetwork
+from Simulation import run_simulation
+from ai.Agents import build_agent
+from model.BinaryReplay import convert_log_to_binary
+from model.BitboardGrid import create_grid
 from model.Game import Game
-from model.Grid import Grid
+from model.GameObserver import ReplayLogObserver
+from model.ReplayCatalog import ReplayCatalog
 from ui.Window import Window
 
 # Parser for command line arguments
 my_parser = argparse.ArgumentParser(description='Play a new 2048 game or analyze a finished one', allow_abbrev=False)
-my_parser.add_argument('mode', action='store', type=str, choices=['PLAY', 'STATS'],
-                       help='whether to play or analyze a 2048 game')
-my_parser.add_argument('--game', action='store', type=str, choices=['HUMAN', 'RANDOM', 'NEURAL'],
-                       help='the kind of 2048 game to play')
+my_parser.add_argument('mode', action='store', type=str, choices=['PLAY', 'STATS', 'SIMULATE', 'CONVERT'],
+                       help='whether to play, analyze or simulate 2048 games, or to convert game logs '
+                            'into binary replays')
+my_parser.add_argument('--game', action='store', type=str,
+                       choices=Constants.GAME_TYPES,
+                       help='the kind of 2048 game to play (or of the replays to select in STATS mode)')
 my_parser.add_argument('--path', action='store', type=pathlib.Path,
                        help='relative path of the game log file to analyze in the data folder '
-                            '(e.g., train_logs/human_2048_1.log)')
-args = my_parser.parse_args()
+                            '(e.g., train_logs/human_2048_1.log), of the directory of replays to search, '
+                            'or of the file/directory to convert')
+my_parser.add_argument('--min-tile', action='store', type=int,
+                       help='select the replays that reached this tile when searching a directory in STATS mode')
+my_parser.add_argument('--max-rounds', action='store', type=int,
+                       help='select the replays of at most this number of rounds when searching a directory '
+                            'in STATS mode')
+my_parser.add_argument('--games', action='store', type=int, default=100,
+                       help='the number of games to play in SIMULATE mode (default: 100)')
+my_parser.add_argument('--workers', action='store', type=int, default=os.cpu_count(),
+                       help='the number of worker processes in SIMULATE mode or for a MONTECARLO game '
+                            '(default: number of CPUs)')
+my_parser.add_argument('--depth', action='store', type=int, default=Constants.EXPECTIMAX_DEPTH,
+                       help='the search depth of an EXPECTIMAX game (default: {})'.format(Constants.EXPECTIMAX_DEPTH))
+my_parser.add_argument('--time-budget', action='store', type=float,
+                       help='the maximum thinking time per move of an EXPECTIMAX game in milliseconds '
+                            '(the search is deepened until the budget runs out, --depth is then ignored)')
+my_parser.add_argument('--rollouts', action='store', type=int, default=Constants.MONTECARLO_NB_ROLLOUTS,
+                       help='the number of random continuations per direction of a MONTECARLO game '
+                            '(default: {})'.format(Constants.MONTECARLO_NB_ROLLOUTS))
+my_parser.add_argument('--rollout-depth', action='store', type=int, default=Constants.MONTECARLO_ROLLOUT_DEPTH,
+                       help='the maximum number of moves per continuation of a MONTECARLO game '
+                            '(default: {})'.format(Constants.MONTECARLO_ROLLOUT_DEPTH))
+my_parser.add_argument('--retrain', action='store_true',
+                       help='train the network of a NEURAL or NTUPLE game again even if the saved one is up to date')
+my_parser.add_argument('--incremental', action='store_true',
+                       help='train the saved network of a NEURAL game on the new training logs only '
+                            '(or the saved network of an NTUPLE game on more self-played games)')
+my_parser.add_argument('--evolve', action='store_true',
+                       help='train the network of a NEURAL game by neuroevolution (self-played games) '
+                            'instead of on the training logs')
+my_parser.add_argument('--save-replays', action='store_true',
+                       help='stream the log of every game of a SIMULATE run into data/replays (the logs of '
+                            'interrupted games can still be loaded up to their last round)')
+my_parser.add_argument('--seed', action='store', type=int, default=Constants.RANDOM_SEED,
+                       help='the seed of the new tiles of a PLAY game or of the games of a SIMULATE run '
+                            '(default: random)')
 
-# Additional checks for parser
-if args.mode == 'PLAY' and (args.game is None):
-    my_parser.error("PLAY mode requires the --game argument to be given.")
-elif args.mode == 'STATS' and (args.path is None):
-    my_parser.error("STATS mode requires the --path argument to be given.")
+# The guard is required so that worker processes of the SIMULATE mode can import this file
+if __name__ == '__main__':
+    args = my_parser.parse_args()
 
-# --------------- PLAY mode ---------------
-if args.mode == 'PLAY':
-    # We create a new empty Grid object
-    grid = Grid(nb_rows_columns=Constants.GRID_NB_ROWS_COLUMNS)
-    # We create a Game from that Grid with two tiles to start
-    game = Game(grid, init_grid_with_two_tiles=True)
+    # Additional checks for parser
+    if args.mode == 'PLAY' and (args.game is None):
+        my_parser.error("PLAY mode requires the --game argument to be given.")
+    elif args.mode in ['STATS', 'CONVERT'] and (args.path is None):
+        my_parser.error("{} mode requires the --path argument to be given.".format(args.mode))
+    elif args.mode == 'SIMULATE' and (args.game is None or args.game == 'HUMAN'):
+        my_parser.error("SIMULATE mode requires the --game argument to be given (HUMAN is not allowed).")
+    if args.games < 1:
+        my_parser.error("--games must be at least 1.")
 
-    replay_dir = path.join(Constants.DATA_DIR_NAME,
-                           'replays',
-                           '{}_{}'.format(Constants.GRID_NB_ROWS_COLUMNS, Constants.GRID_NB_ROWS_COLUMNS))
+    agent_options = dict()
+    if args.game == 'NEURAL':
+        agent_options = dict(use_cached_model=not args.retrain, incremental=args.incremental,
+                             evolve=args.evolve, nb_workers=args.workers)
+    elif args.game == 'NTUPLE':
+        agent_options = dict(use_cached_model=not args.retrain, incremental=args.incremental)
+    elif args.game == 'EXPECTIMAX':
+        agent_options = dict(depth=args.depth,
+                             min_probability=Constants.EXPECTIMAX_MIN_PROBABILITY,
+                             table_size=Constants.EXPECTIMAX_TABLE_SIZE,
+                             use_symmetries=Constants.EXPECTIMAX_USE_SYMMETRIES)
+        if args.time_budget is not None:
+            agent_options.update(time_budget=args.time_budget / 1000.0, max_depth=Constants.ANYTIME_MAX_DEPTH)
+    elif args.game == 'MONTECARLO':
+        # In SIMULATE mode, worker processes already play games in parallel
+        agent_options = dict(nb_rollouts=args.rollouts,
+                             rollout_depth=args.rollout_depth,
+                             nb_workers=args.workers if args.mode == 'PLAY' else 1)
 
-    # --------------- RANDOM game ---------------
-    if args.game == "RANDOM":
-        # The list of directions that can be played
-        directions = [Directions.LEFT, Directions.RIGHT, Directions.UP, Directions.DOWN]
-        while not game.ended_game:  # While the game is not finished
-            shuffle(directions)
-            game.play_many_directions(directions)  # We played one of the four directions
-        game.save_game(base_path=replay_dir)
+    # --------------- PLAY mode ---------------
+    if args.mode == 'PLAY':
+        replay_dir = path.join(Constants.DATA_DIR_NAME,
+                               'replays',
+                               '{}_{}'.format(Constants.GRID_NB_ROWS_COLUMNS, Constants.GRID_NB_ROWS_COLUMNS))
 
-    # --------------- NEURAL game ---------------
-    elif args.game == "NEURAL":
-        # TODO: customize your neural network below
-        nn = NeuralNetwork()
-        nn.add_layer(Layer(16, 4))  # Only one hidden layer
-        nn.add_layer(Layer(4, 4))  # Output layer
-        # End of neural network customization
+        # --------------- HUMAN game ---------------
+        if args.game == "HUMAN":
+            # No need to create grid or game objects when we launch GUI
+            app = Window(nb_rows_columns=Constants.GRID_NB_ROWS_COLUMNS, base_path=replay_dir)
+            app.start_new_game()
 
-        train_dir = path.join(Constants.DATA_DIR_NAME, Constants.TRAIN_DIR_NAME)
-        nn.train_from_directory(directory=train_dir,
-                                learning_rate=Constants.NEURAL_NET_TRAINING_RATE,
-                                max_epochs=Constants.NEURAL_NET_MAX_EPOCHS)
+        # --------------- RANDOM, NEURAL, NTUPLE, EXPECTIMAX or MONTECARLO game ---------------
+        else:
+            # The agent is built (and trained for a NEURAL or NTUPLE game) before the game starts
+            agent = build_agent(args.game, **agent_options)
+            # We create a new empty Grid object (backed by a bitboard for 4x4 grids)
+            grid = create_grid(nb_rows_columns=Constants.GRID_NB_ROWS_COLUMNS)
+            # We create a Game from that Grid with two tiles to start
+            if Constants.REPLAY_FORMAT == 'log':
+                # The log is written during the Game, so that only the last rounds are kept in memory
+                log_path = path.join(replay_dir, "{}.log".format(int(time.time())))
+                game = Game(grid, init_grid_with_two_tiles=True, seed=args.seed,
+                            observers=[ReplayLogObserver(log_path, agent_type=args.game)],
+                            history_window=Constants.REPLAY_HISTORY_WINDOW)
+            else:
+                game = Game(grid, init_grid_with_two_tiles=True, seed=args.seed)
+            while not game.ended_game:  # While the game is not finished
+                game.play_many_directions(agent.predict(game))  # We play the first valid predicted direction
+            if Constants.REPLAY_FORMAT != 'log':
+                game.save_game(base_path=replay_dir, binary=Constants.REPLAY_FORMAT == 'bin',
+                               seed_only=Constants.REPLAY_FORMAT == 'seed', agent_type=args.game)
+            if args.game == 'EXPECTIMAX':
+                agent.print_stats()
+            elif args.game == 'MONTECARLO':
+                agent.close()
 
-        while not game.ended_game:
-            x = np.array(np.mat(game.grid.to_string()))
-            predictions = nn.predict(x)
-            game.play_many_directions(predictions)
-        game.save_game(base_path=replay_dir)
+    # --------------- SIMULATE mode ---------------
+    elif args.mode == 'SIMULATE':
+        if args.game in ['NEURAL', 'NTUPLE']:
+            # The network is trained (or evolved by all the workers) once in this process, then each worker loads
+            # it from the models directory instead of training it again
+            build_agent(args.game, **agent_options)
+            agent_options.update(use_cached_model=True, incremental=False)
+            if args.game == 'NEURAL':
+                agent_options.update(nb_workers=1)
+        replay_dir = None
+        if args.save_replays:
+            replay_dir = path.join(Constants.DATA_DIR_NAME, 'replays', 'simulations')
+        run_simulation(args.game, nb_games=args.games, nb_workers=args.workers, agent_options=agent_options,
+                       seed=args.seed, replay_dir=replay_dir)
 
-    # --------------- HUMAN game ---------------
-    else:
-        # No need to create grid or game objects when we launch GUI
-        app = Window(nb_rows_columns=Constants.GRID_NB_ROWS_COLUMNS, base_path=replay_dir)
-        app.start_new_game()
+    # --------------- CONVERT mode ---------------
+    elif args.mode == 'CONVERT':
+        filepath = path.join(Constants.DATA_DIR_NAME, args.path)
+        if path.isdir(filepath):
+            log_paths = [path.join(filepath, f) for f in sorted(os.listdir(filepath)) if f.endswith('.log')]
+        else:
+            log_paths = [filepath]
+        for log_path in log_paths:
+            binary_path = convert_log_to_binary(log_path)
+            print("{} ({} bytes) -> {} ({} bytes)".format(log_path, path.getsize(log_path),
+                                                        binary_path, path.getsize(binary_path)))
 
-# --------------- STATS mode ---------------
-else:
-    filepath = path.join(Constants.DATA_DIR_NAME, args.path)
-    game = Game.load_game(filepath, display_grid=False)
-    game.history.print_stats()
+    # --------------- STATS mode ---------------
+    else:
+        filepath = path.join(Constants.DATA_DIR_NAME, args.path)
+        if path.isdir(filepath):
+            # The replays are selected from their summaries in the catalog (only new or modified ones are loaded)
+            with ReplayCatalog() as catalog:
+                nb_updated, nb_removed = catalog.update(filepath)
+                print("Catalog updated: {} replays indexed, {} removed".format(nb_updated, nb_removed))
+                replays = catalog.query(directory=filepath, agent=args.game, min_max_tile=args.min_tile,
+                                        max_rounds=args.max_rounds)
+            for replay in replays:
+                print("{path}: {agent} {final_state}, score {score}, max. tile {max_tile}, "
+                      "{nb_rounds} rounds".format(**replay))
+            print("Replays selected: {}".format(len(replays)))
+        else:
+            game = Game.load_game(filepath, display_grid=False)
+            game.history.print_stats()
@@ -0,0 +1,143 @@
+# coding: utf-8
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import Constants
+from ai.Agents import build_agent
+from model.BitboardGrid import create_grid
+from model.Game import Game
+from model.GameObserver import ReplayLogObserver
+
+# The agent of the current (worker) process, built only once by init_worker
+_worker_agent = None
+# The directory where the worker process streams the logs of its games (None to play without logs)
+_worker_replay_dir = None
+_worker_game_type = None
+
+
+def init_worker(game_type, agent_options, replay_dir=None):
+    """
+    Build (e.g., train or load) the agent once per worker process
+
+    @param game_type: the kind of game to simulate (e.g., 'RANDOM' or 'NEURAL')
+    @type game_type: str
+    @param agent_options: options given to the agent constructor (see build_agent)
+    @type agent_options: dict
+    @param replay_dir: (optional) the directory where the logs of the games are streamed
+    @type replay_dir: str
+    """
+    global _worker_agent, _worker_replay_dir, _worker_game_type
+    _worker_agent = build_agent(game_type, **agent_options)
+    _worker_replay_dir = replay_dir
+    _worker_game_type = game_type
+
+
+def seed_of(seed_sequence):
+    """
+    Utility method to draw an integer seed from a seed sequence
+
+    @param seed_sequence: a numpy seed sequence
+    @type seed_sequence: np.random.SeedSequence
+    @return: a 64-bit seed
+    @rtype: int
+    """
+    return int(seed_sequence.generate_state(1, dtype='uint64')[0])
+
+
+def play_headless_game(seed_sequence):
+    """
+    Play a complete game without any display with the agent of the current worker process
+    The game and the agent get their own random streams, spawned from the seed sequence of the game, so that
+    the results do not depend on the worker playing the game
+
+    @param seed_sequence: the seed sequence of the game in the simulation
+    @type seed_sequence: np.random.SeedSequence
+    @return: the final score, the max. tile, the number of rounds and whether the game was won
+    @rtype: tuple of (int, int, int, bool)
+    """
+    game_sequence, agent_sequence = seed_sequence.spawn(2)
+    if hasattr(_worker_agent, 'seed'):
+        _worker_agent.seed(seed_of(agent_sequence))
+    grid = create_grid(nb_rows_columns=Constants.GRID_NB_ROWS_COLUMNS)
+    if _worker_replay_dir is not None:
+        # One log per game of the simulation, named after the seed of the simulation and the number of the game
+        log_path = os.path.join(_worker_replay_dir, "{}_{}.log".format(seed_sequence.entropy,
+                                                                        seed_sequence.spawn_key[-1]))
+        game = Game(grid, init_grid_with_two_tiles=True, display_grid=False, seed=seed_of(game_sequence),
+                    observers=[ReplayLogObserver(log_path, agent_type=_worker_game_type)],
+                    history_window=Constants.REPLAY_HISTORY_WINDOW)
+    else:
+        game = Game(grid, init_grid_with_two_tiles=True, display_grid=False, seed=seed_of(game_sequence))
+    while not game.ended_game:
+        game.play_many_directions(_worker_agent.predict(game))
+    return int(game.current_score), int(game.grid.grid.max()), game.round_count, game.grid.is_winning()
+
+
+def run_simulation(game_type, nb_games, nb_workers, agent_options=None, seed=None, replay_dir=None):
+    """
+    Play many headless games across a pool of worker processes and print aggregated results
+    Each game gets a child seed sequence spawned from the seed of the simulation: the same seed plays the same games
+    whatever the number of workers
+
+    @param game_type: the kind of game to simulate (e.g., 'RANDOM' or 'NEURAL')
+    @type game_type: str
+    @param nb_games: the number of games to play
+    @type nb_games: int
+    @param nb_workers: the number of worker processes (1 to play all games in the current process)
+    @type nb_workers: int
+    @param agent_options: (optional) options given to the agent constructor (see build_agent)
+    @type agent_options: dict
+    @param seed: (optional) the seed of the simulation (default: fresh entropy, displayed to replay the simulation)
+    @type seed: int
+    @param replay_dir: (optional) the directory where the log of each game is streamed (default: no logs)
+    @type replay_dir: str
+    @return: the results of every game (see play_headless_game)
+    @rtype: list of tuples
+    """
+    agent_options = agent_options if agent_options is not None else dict()
+    root_sequence = np.random.SeedSequence(seed)
+    print("Simulation seed: {}".format(root_sequence.entropy))
+    game_sequences = root_sequence.spawn(nb_games)
+    start_time = time.time()
+    if nb_workers <= 1:
+        init_worker(game_type, agent_options, replay_dir)
+        results = [play_headless_game(game_sequence) for game_sequence in game_sequences]
+    else:
+        chunk_size = max(1, nb_games // (4 * nb_workers))
+        with ProcessPoolExecutor(max_workers=nb_workers, initializer=init_worker,
+                                 initargs=(game_type, agent_options, replay_dir)) as executor:
+            results = list(executor.map(play_headless_game, game_sequences, chunksize=chunk_size))
+    elapsed_time = time.time() - start_time
+    print_simulation_stats(results, elapsed_time)
+    return results
+
+
+def print_simulation_stats(results, elapsed_time):
+    """
+    Display throughput, score and max. tile statistics of a simulation
+
+    @param results: the results of every game (see play_headless_game)
+    @type results: list of tuples
+    @param elapsed_time: the duration of the simulation in seconds
+    @type elapsed_time: float
+    """
+    print("Games played: {}".format(len(results)))
+    if not results:
+        return
+    scores = np.array([r[0] for r in results])
+    nb_moves = sum(r[2] for r in results)
+    nb_wins = sum(1 for r in results if r[3])
+    max_tiles = Counter(r[1] for r in results)
+    max_tiles_freq = {tile: round(100.0 * count / len(results), 2) for tile, count in sorted(max_tiles.items())}
+
+    print("Elapsed time: {:.2f} s".format(elapsed_time))
+    print("Throughput: {:.1f} games/s, {:.1f} moves/s".format(len(results) / elapsed_time, nb_moves / elapsed_time))
+    print("Win rate: {:.2f}%".format(100.0 * nb_wins / len(results)))
+    print("Score: mean {:.1f}, std {:.1f}, min {}, median {}, max {}".format(
+        np.mean(scores), np.std(scores), np.min(scores), np.median(scores), np.max(scores)))
+    print("Score percentiles (10/25/75/90): {}".format(np.round(np.percentile(scores, [10, 25, 75, 90]), 1).tolist()))
+    print("Max. tile frequencies: {}".format(max_tiles_freq))
@@ -0,0 +1,261 @@
+# coding: utf-8
+import json
+import random
+from os import path
+
+import numpy as np
+
+import Constants
+from Constants import DIRECTIONS_LIST, Directions
+from ai.AnytimeSearch import IterativeDeepeningAgent
+from ai.Expectimax import ExpectimaxAgent
+from ai.Layer import Layer
+from ai.MonteCarlo import MonteCarloAgent
+from ai.NTuple import NTupleAgent, NTupleNetwork
+from ai.NeuralNetwork import TRAINING_VERSION, NeuralNetwork
+from ai.Neuroevolution import NeuroevolutionTrainer
+from model.Symmetry import inverse_transform_direction
+
+
+class RandomAgent:
+    """
+    An agent that plays the legal directions in a random order (followed by the illegal ones)
+    """
+
+    def __init__(self, seed=None):
+        """
+        @param seed: (optional) the seed of the random generator
+        @type seed: int
+        """
+        self.directions = None
+        self.rng = None
+        self.seed(seed)
+
+    def seed(self, seed):
+        """
+        Reset the random generator of this agent (e.g., before each game of a reproducible simulation)
+
+        @param seed: the new seed
+        @type seed: int
+        """
+        self.directions = [Directions.LEFT, Directions.RIGHT, Directions.UP, Directions.DOWN]
+        self.rng = random.Random(seed)
+
+    def predict(self, game):
+        """
+        Function to get the next directions to play given the current Game
+
+        @param game: the Game being played
+        @type game: Game
+
+        @return: The ordered list of directions to play (0: first choice, 1: second choice, etc.)
+        @rtype: list of Constants.Directions
+        """
+        legal_directions = [d for d, (_, _, legal) in zip(DIRECTIONS_LIST, game.grid.successors()) if legal]
+        self.rng.shuffle(self.directions)
+        return [d for d in self.directions if d in legal_directions] + \
+            [d for d in self.directions if d not in legal_directions]
+
+
+class NeuralAgent:
+    """
+    An agent that plays the directions predicted by a trained NeuralNetwork
+    The network is trained on scaled canonical Grid states (see NeuralNetwork.inputs_of_states), so it is fed the
+    same input and the predicted directions are transformed back
+    """
+
+    def __init__(self, nn):
+        """
+        @param nn: a trained neural network
+        @type nn: NeuralNetwork
+        """
+        self.nn = nn
+
+    def predict(self, game):
+        """
+        Function to get the next directions to play given the current Game
+
+        @param game: the Game being played
+        @type game: Game
+
+        @return: The ordered list of directions to play (0: first choice, 1: second choice, etc.)
+        @rtype: list of Constants.Directions
+        """
+        x, symmetries = NeuralNetwork.inputs_of_states(game.grid.grid.reshape((1,) + game.grid.grid.shape))
+        return [inverse_transform_direction(DIRECTIONS_LIST[index], int(symmetries[0]))
+                for index in self.nn.predict_batch(x)[0]]
+
+
+def build_neural_network(use_cached_model=True, incremental=False, evolve=False, nb_workers=1):
+    """
+    Build the neural network and train it with the game logs located in the training directory
+    The trained network is saved in the models directory and loaded instead of being trained again
+    as long as the training logs, the layer shapes and the training hyperparameters are unchanged
+
+    @param use_cached_model: whether to load the last trained network when it is still up to date
+    @type use_cached_model: bool
+    @param incremental: whether to train the last trained network on the new training logs only (if its layer
+                        shapes and training hyperparameters are unchanged) instead of training a new network
+    @type incremental: bool
+    @param evolve: whether to train the network by neuroevolution (self-play) instead of on the game logs
+    @type evolve: bool
+    @param nb_workers: the number of worker processes playing the games of the neuroevolution
+    @type nb_workers: int
+    @return: a trained neural network
+    @rtype: NeuralNetwork
+    """
+    rng = np.random.default_rng(Constants.RANDOM_SEED)  # Initial weights and order of the training samples
+    nn = NeuralNetwork()
+    for n_input, n_neurons in Constants.NEURAL_NET_LAYER_SHAPES:
+        nn.add_layer(Layer(n_input, n_neurons, rng=rng))
+
+    if evolve:
+        return evolve_neural_network(nn.layer_shapes, use_cached_model=use_cached_model, nb_workers=nb_workers)
+
+    train_dir = path.join(Constants.DATA_DIR_NAME, Constants.TRAIN_DIR_NAME)
+    model_path = path.join(Constants.DATA_DIR_NAME, Constants.MODELS_DIR_NAME, Constants.NEURAL_NET_MODEL_FILE_NAME)
+    metadata = {'layer_shapes': nn.layer_shapes,
+                'learning_rate': Constants.NEURAL_NET_TRAINING_RATE,
+                'max_epochs': Constants.NEURAL_NET_MAX_EPOCHS,
+                'batch_size': Constants.NEURAL_NET_BATCH_SIZE,
+                'tile_number_to_win': Constants.TILE_NUMBER_TO_WIN,
+                'training_version': TRAINING_VERSION,
+                'training_files': NeuralNetwork.list_training_files(train_dir)}
+    cached_metadata = NeuralNetwork.load_metadata(model_path) if path.isfile(model_path) else None
+    if use_cached_model and cached_metadata is not None:
+        if is_same_training(cached_metadata, metadata):
+            print("OK - Trained neural network loaded: {}".format(model_path))
+            return NeuralNetwork.load(model_path)
+        if incremental and is_same_training(cached_metadata, metadata, ignore_training_files=True):
+            print("OK - Trained neural network loaded for incremental training: {}".format(model_path))
+            nn = NeuralNetwork.load(model_path)
+            metadata['training_files'] = nn.train_on_new_files(train_dir, cached_metadata['training_files'],
+                                                               learning_rate=Constants.NEURAL_NET_TRAINING_RATE,
+                                                               max_epochs=Constants.NEURAL_NET_INCREMENTAL_EPOCHS,
+                                                               batch_size=Constants.NEURAL_NET_BATCH_SIZE,
+                                                               replay_ratio=Constants.NEURAL_NET_REPLAY_RATIO,
+                                                               rng=rng)
+            nn.save(model_path, metadata)
+            return nn
+
+    corpus_dir = path.join(Constants.DATA_DIR_NAME, Constants.CORPUS_DIR_NAME) \
+        if Constants.NEURAL_NET_USE_CORPUS else None
+    nn.train_from_directory(directory=train_dir,
+                            learning_rate=Constants.NEURAL_NET_TRAINING_RATE,
+                            max_epochs=Constants.NEURAL_NET_MAX_EPOCHS,
+                            batch_size=Constants.NEURAL_NET_BATCH_SIZE,
+                            corpus_directory=corpus_dir,
+                            rng=rng)
+    nn.save(model_path, metadata)
+    return nn
+
+
+def evolve_neural_network(layer_shapes, use_cached_model=True, nb_workers=1):
+    """
+    Train a neural network by neuroevolution until Constants.NEUROEVOLUTION_GENERATIONS generations
+    The trainer is checkpointed in the models directory after each generation and resumed from there
+
+    @param layer_shapes: the (n_input, n_neurons) shape of each layer
+    @type layer_shapes: list of list of int
+    @param use_cached_model: whether to resume the last checkpoint (if its layer shapes are unchanged)
+    @type use_cached_model: bool
+    @param nb_workers: the number of worker processes playing the games
+    @type nb_workers: int
+    @return: the best neural network found
+    @rtype: NeuralNetwork
+    """
+    checkpoint_path = path.join(Constants.DATA_DIR_NAME, Constants.MODELS_DIR_NAME,
+                                Constants.NEUROEVOLUTION_CHECKPOINT_FILE_NAME)
+    trainer = None
+    if use_cached_model and path.isfile(checkpoint_path):
+        trainer = NeuroevolutionTrainer.load_checkpoint(checkpoint_path)
+        if trainer.layer_shapes != layer_shapes:
+            trainer = None
+        else:
+            print("OK - Neuroevolution checkpoint loaded (generation #{}): {}".format(trainer.generation,
+                                                                                      checkpoint_path))
+    if trainer is None:
+        trainer = NeuroevolutionTrainer(layer_shapes)
+    trainer.train(Constants.NEUROEVOLUTION_GENERATIONS, nb_workers=nb_workers, checkpoint_path=checkpoint_path)
+    return trainer.best_network()
+
+
+def is_same_training(metadata, other_metadata, ignore_training_files=False):
+    """
+    Check whether two trainings used the same hyperparameters and the same training logs
+    (the modification times of the logs are ignored, only their content matters)
+
+    @param metadata: the metadata of a trained neural network
+    @type metadata: dict
+    @param other_metadata: the metadata of another trained neural network
+    @type other_metadata: dict
+    @param ignore_training_files: whether to compare the layer shapes and hyperparameters only
+    @type ignore_training_files: bool
+    @return: whether both neural networks result from the same training
+    @rtype: bool
+    """
+    def without_mtimes(m):
+        m = json.loads(json.dumps(m))  # Same types as metadata read from a file (e.g., lists instead of tuples)
+        m['training_files'] = [[f['path'], f['size'], f['hash']] for f in m.get('training_files', list())]
+        if ignore_training_files:
+            del m['training_files']
+        return m
+    return without_mtimes(metadata) == without_mtimes(other_metadata)
+
+
+def build_ntuple_network(use_cached_model=True, incremental=False, nb_training_games=Constants.NTUPLE_TRAINING_GAMES):
+    """
+    Build an n-tuple network trained by self-play
+    The trained network is saved in the models directory and loaded instead of being trained again
+
+    @param use_cached_model: whether to load the last trained network (if any)
+    @type use_cached_model: bool
+    @param incremental: whether to train the last trained network on nb_training_games more games
+    @type incremental: bool
+    @param nb_training_games: the number of self-played games to train a new network
+    @type nb_training_games: int
+    @return: a trained n-tuple network
+    @rtype: NTupleNetwork
+    """
+    model_path = path.join(Constants.DATA_DIR_NAME, Constants.MODELS_DIR_NAME, Constants.NTUPLE_MODEL_FILE_NAME)
+    if use_cached_model and path.isfile(model_path):
+        network = NTupleNetwork.load(model_path)
+        print("OK - Trained n-tuple network loaded ({} training games): {}".format(network.nb_trained_games,
+                                                                                   model_path))
+        if not incremental:
+            return network
+    else:
+        network = NTupleNetwork()
+    network.train(nb_training_games, learning_rate=Constants.NTUPLE_LEARNING_RATE, seed=Constants.RANDOM_SEED)
+    network.save(model_path, {'learning_rate': Constants.NTUPLE_LEARNING_RATE})
+    return network
+
+
+def build_agent(game_type, **agent_options):
+    """
+    Build the agent associated to a kind of game given on the command line
+
+    @param game_type: the kind of game (e.g., 'RANDOM', 'NEURAL', 'NTUPLE', 'EXPECTIMAX' or 'MONTECARLO')
+    @type game_type: str
+    @param agent_options: options given to the agent constructor (e.g., depth=3 for an EXPECTIMAX agent)
+                          An EXPECTIMAX agent given a time_budget (in seconds) is wrapped into an
+                          IterativeDeepeningAgent searching up to max_depth
+    @type agent_options: dict
+    @return: an agent providing a predict(game) method
+    @rtype: object
+    """
+    if game_type == 'RANDOM':
+        return RandomAgent()
+    elif game_type == 'NEURAL':
+        return NeuralAgent(build_neural_network(**agent_options))
+    elif game_type == 'NTUPLE':
+        return NTupleAgent(build_ntuple_network(**agent_options))
+    elif game_type == 'EXPECTIMAX':
+        time_budget = agent_options.pop('time_budget', None)
+        max_depth = agent_options.pop('max_depth', Constants.ANYTIME_MAX_DEPTH)
+        if time_budget is not None:
+            return IterativeDeepeningAgent(ExpectimaxAgent(**agent_options), time_budget, max_depth)
+        return ExpectimaxAgent(**agent_options)
+    elif game_type == 'MONTECARLO':
+        return MonteCarloAgent(**agent_options)
+    raise ValueError("No agent available for game type: {}".format(game_type))
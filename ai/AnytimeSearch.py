@@ -0,0 +1,75 @@
+# coding: utf-8
+import time
+from collections import Counter
+
+import numpy as np
+
+from Constants import DIRECTIONS_LIST
+from ai.Expectimax import SearchTimeout, board_of
+
+
+class IterativeDeepeningAgent:
+    """
+    An agent that wraps a search agent (e.g., an ExpectimaxAgent) to always answer within a fixed time budget
+    The search is deepened one move at a time until the budget runs out, and the ordered directions of the deepest
+    completed search are played
+    """
+
+    def __init__(self, search_agent, time_budget, max_depth=8):
+        """
+        @param search_agent: a search agent providing an evaluate_directions(board, depth) method and a deadline
+        @type search_agent: ExpectimaxAgent
+        @param time_budget: the maximum thinking time per move (in seconds)
+        @type time_budget: float
+        @param max_depth: the maximum search depth
+        @type max_depth: int
+        """
+        self.search_agent = search_agent
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.move_times = list()
+        self.depths_reached = list()
+
+    def predict(self, game):
+        """
+        Function to get the next directions to play given the current Game
+
+        @param game: the Game being played
+        @type game: Game
+
+        @return: The ordered list of directions to play (0: first choice, 1: second choice, etc.)
+        @rtype: list of Constants.Directions
+        """
+        start_time = time.perf_counter()
+        board = board_of(game.grid)
+
+        # A one-move search is cheap enough to be always completed, so that a move is always available
+        self.search_agent.deadline = None
+        values = self.search_agent.evaluate_directions(board, 1)
+        depth_reached = 1
+
+        self.search_agent.deadline = start_time + self.time_budget
+        try:
+            for depth in range(2, self.max_depth + 1):
+                values = self.search_agent.evaluate_directions(board, depth)
+                depth_reached = depth
+        except SearchTimeout:
+            pass
+        finally:
+            self.search_agent.deadline = None
+
+        self.move_times.append(time.perf_counter() - start_time)
+        self.depths_reached.append(depth_reached)
+        return sorted(DIRECTIONS_LIST, key=lambda d: values[d], reverse=True)
+
+    def print_stats(self):
+        """
+        Method to display the latency and the search depth reached for each move played by this agent
+        """
+        if self.move_times:
+            times_ms = 1000.0 * np.array(self.move_times)
+            print("Time budget per move (ms): {}".format(1000.0 * self.time_budget))
+            print("Move latency (ms): mean {:.2f}, median {:.2f}, p99 {:.2f}, max {:.2f}".format(
+                np.mean(times_ms), np.median(times_ms), np.percentile(times_ms, 99), np.max(times_ms)))
+            print("Depths reached: {}".format(dict(sorted(Counter(self.depths_reached).items()))))
+            self.search_agent.transposition_table.print_stats()
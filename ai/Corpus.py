@@ -0,0 +1,201 @@
+# coding: utf-8
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+import Constants
+from ai.Dataset import DATASET_FORMAT_VERSION, build_dataset, hash_of
+
+BOARDS_FILE_NAME = 'boards.u8'
+LABELS_FILE_NAME = 'labels.f32'
+INDEX_FILE_NAME = 'corpus.json'
+# Bump this number when the JSON index changes, to start a new corpus
+INDEX_VERSION = 2
+
+
+class TrainingCorpus:
+    """
+    This class represents an on-disk training corpus that can be larger than the available memory:
+        - a raw file of boards, one uint8 tile exponent per tile (16 bytes per 4x4 board)
+        - a raw file of labels (float32)
+        - a small JSON index with the number of examples and, in order, the hash and the number of examples of
+          each game log added
+    New examples are appended at the end of both raw files, and the examples of the logs removed from the
+    training set are dropped (see add_files)
+
+    Both raw files are opened with np.memmap and read by blocks of consecutive examples, so that the memory used
+    stays the same whatever the size of the corpus
+    """
+
+    def __init__(self, directory, nb_inputs=None, nb_outputs=None):
+        """
+        Init method to open (or create) a training corpus
+
+        @param directory: the directory of the corpus files
+        @type directory: str
+        @param nb_inputs: (optional) the number of inputs (tiles) per example, required for a new corpus
+        @type nb_inputs: int
+        @param nb_outputs: (optional) the number of outputs (labels) per example, required for a new corpus
+        @type nb_outputs: int
+        """
+        self.directory = directory
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self.index_path = os.path.join(directory, INDEX_FILE_NAME)
+        self.index = None
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        # A corpus of examples extracted differently is started again (its raw files are overwritten by append)
+        if self.index is None or self.index.get('version') != [INDEX_VERSION, DATASET_FORMAT_VERSION] or \
+                self.index['tile_number_to_win'] != Constants.TILE_NUMBER_TO_WIN:
+            self.index = {'version': [INDEX_VERSION, DATASET_FORMAT_VERSION], 'nb_inputs': nb_inputs,
+                          'nb_outputs': nb_outputs, 'size': 0, 'tile_number_to_win': Constants.TILE_NUMBER_TO_WIN,
+                          'files': list()}
+
+    def __len__(self):
+        """
+        @return: the number of examples of this corpus
+        @rtype: int
+        """
+        return self.index['size']
+
+    def _write_index(self):
+        """
+        Utility method to replace the JSON index at once (the examples it counts are always complete on disk)
+        """
+        temp_index_path = '{}.{}.tmp'.format(self.index_path, os.getpid())
+        with open(temp_index_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(temp_index_path, self.index_path)
+
+    def _open(self, file_name, dtype, nb_columns):
+        """
+        Utility method to memory-map one of the raw files of this corpus
+
+        @return: a read-only (size, nb_columns) memory-mapped array
+        @rtype: np.memmap
+        """
+        if len(self) == 0:
+            return np.zeros((0, nb_columns), dtype=dtype)
+        return np.memmap(os.path.join(self.directory, file_name), dtype=dtype, mode='r',
+                         shape=(len(self), nb_columns))
+
+    def append(self, x, y):
+        """
+        Method to append examples at the end of this corpus
+
+        @param x: the inputs (tile values divided by Constants.TILE_NUMBER_TO_WIN, as parsed for the neural network)
+        @type x: np.array
+        @param y: the outputs
+        @type y: np.array
+        """
+        if self.index['nb_inputs'] is None:
+            self.index['nb_inputs'], self.index['nb_outputs'] = x.shape[1], y.shape[1]
+        values = np.rint(np.asarray(x) * self.index['tile_number_to_win'])
+        exponents = np.log2(np.maximum(values, 1)).round().astype('uint8')
+        # Any data after the last complete example (e.g., an interrupted append) is overwritten
+        for file_name, data, row_size in ((BOARDS_FILE_NAME, exponents, self.index['nb_inputs']),
+                                          (LABELS_FILE_NAME, np.asarray(y, dtype='float32'),
+                                           4 * self.index['nb_outputs'])):
+            with open(os.path.join(self.directory, file_name), 'ab') as f:
+                f.truncate(len(self) * row_size)
+                f.write(np.ascontiguousarray(data).tobytes())
+        self.index['size'] += len(x)
+        self._write_index()
+
+    def add_files(self, file_paths, parse_function, nb_files_per_chunk=64, file_hashes=None):
+        """
+        Method to make this corpus hold the examples of the given game logs only: the examples of the logs that are
+        not given anymore (e.g., deleted or excluded by Constants.NEURAL_NET_MIN_MAX_TILE) are removed, then the
+        examples of the logs that have not been added yet are appended
+        Logs are parsed by chunks (see Dataset.build_dataset) so that only one chunk is kept in memory
+
+        @param file_paths: the paths of the 2048 log files
+        @type file_paths: list of str
+        @param parse_function: the function converting a Game into (x, y)
+        @type parse_function: function
+        @param nb_files_per_chunk: the number of logs parsed at once
+        @type nb_files_per_chunk: int
+        @param file_hashes: (optional) the hash of each log when already known (e.g., from the replay catalog)
+        @type file_hashes: list of str
+        """
+        file_hashes = file_hashes if file_hashes is not None else [hash_of(file_path) for file_path in file_paths]
+        files_of_hashes = dict()
+        for file_path, file_hash in zip(file_paths, file_hashes):
+            files_of_hashes.setdefault(file_hash, file_path)
+        self.remove_files(set(files_of_hashes))
+
+        added_hashes = set(file_hash for file_hash, _ in self.index['files'])
+        new_files = [(file_path, file_hash) for file_hash, file_path in files_of_hashes.items()
+                     if file_hash not in added_hashes]
+        for i in range(0, len(new_files), nb_files_per_chunk):
+            chunk = new_files[i:i + nb_files_per_chunk]
+            x, y, sizes = build_dataset([file_path for file_path, _ in chunk], parse_function, return_sizes=True,
+                                        file_hashes=[file_hash for _, file_hash in chunk])
+            self.index['files'].extend([file_hash, size] for (_, file_hash), size in zip(chunk, sizes))
+            self.append(x, y)
+
+    def remove_files(self, kept_hashes):
+        """
+        Method to remove the examples of the game logs that are not kept, by copying the kept examples into new raw
+        files block by block (the JSON index is only replaced once both raw files are complete)
+
+        @param kept_hashes: the hashes of the game logs whose examples are kept
+        @type kept_hashes: set of str
+        """
+        if all(file_hash in kept_hashes for file_hash, _ in self.index['files']):
+            return
+        kept_files, kept_ranges, start = list(), list(), 0
+        for file_hash, count in self.index['files']:
+            if file_hash in kept_hashes:
+                kept_files.append([file_hash, count])
+                kept_ranges.append((start, start + count))
+            start += count
+        for file_name, dtype, nb_columns in ((BOARDS_FILE_NAME, 'uint8', self.index['nb_inputs']),
+                                             (LABELS_FILE_NAME, 'float32', self.index['nb_outputs'])):
+            data = self._open(file_name, dtype, nb_columns)
+            temp_path = '{}.{}.tmp'.format(os.path.join(self.directory, file_name), os.getpid())
+            with open(temp_path, 'wb') as f:
+                for range_start, range_end in kept_ranges:
+                    f.write(np.ascontiguousarray(data[range_start:range_end]).tobytes())
+            del data
+            os.replace(temp_path, os.path.join(self.directory, file_name))
+        self.index['files'] = kept_files
+        self.index['size'] = sum(count for _, count in kept_files)
+        self._write_index()
+
+    def batches(self, batch_size, shuffle=True, block_size=Constants.CORPUS_BLOCK_SIZE, rng=None):
+        """
+        Generator over the mini-batches of this corpus
+        When shuffling, the order of the blocks of consecutive examples is shuffled, then the examples of each
+        block (only one block is read into memory at once)
+
+        @param batch_size: the number of examples per mini-batch
+        @type batch_size: int
+        @param shuffle: whether to shuffle the examples
+        @type shuffle: bool
+        @param block_size: the number of consecutive examples read at once
+        @type block_size: int
+        @param rng: (optional) the random generator shuffling the examples (default: a new unseeded one)
+        @type rng: np.random.Generator
+        @return: the successive (x, y) mini-batches, x being normalized as parsed for the neural network
+        @rtype: generator of tuple of (np.array, np.array)
+        """
+        boards = self._open(BOARDS_FILE_NAME, 'uint8', self.index['nb_inputs'])
+        labels = self._open(LABELS_FILE_NAME, 'float32', self.index['nb_outputs'])
+        rng = rng if rng is not None else np.random.default_rng()
+        block_starts = np.arange(0, len(self), block_size)
+        if shuffle:
+            rng.shuffle(block_starts)
+        for start in block_starts:
+            block_boards = np.array(boards[start:start + block_size])
+            block_labels = np.array(labels[start:start + block_size], dtype='float64')
+            if shuffle:
+                order = rng.permutation(len(block_boards))
+                block_boards, block_labels = block_boards[order], block_labels[order]
+            block_x = np.where(block_boards > 0, np.left_shift(1, block_boards.astype('int64')), 0) / \
+                self.index['tile_number_to_win']
+            for j in range(0, len(block_x), batch_size):
+                yield block_x[j:j + batch_size], block_labels[j:j + batch_size]
@@ -0,0 +1,132 @@
+# coding: utf-8
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import Constants
+from model.Game import Game
+
+# Bump this number when the inputs/outputs extracted from the game logs change, to invalidate cached datasets
+DATASET_FORMAT_VERSION = 3
+
+
+def parse_file(parse_function, file_path):
+    """
+    Parse a single game log into inputs/outputs (run by the worker processes of build_dataset)
+
+    @param parse_function: the function converting a Game into (x, y) (e.g., parse_inputs_outputs_for_neural_net)
+    @type parse_function: function
+    @param file_path: the path of the 2048 log file
+    @type file_path: str
+    @return: the inputs/outputs for every history step of that log
+    @rtype: tuple of (np.array, np.array)
+    """
+    return parse_function(Game.load_game(file_path, display_grid=False))
+
+
+def hash_of(file_path):
+    """
+    Get the hash of the content of a game log (the same hash as in the replay catalog)
+
+    @param file_path: the path of the 2048 log file
+    @type file_path: str
+    @return: the SHA-1 hex digest of the file
+    @rtype: str
+    """
+    with open(file_path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def cache_path_of(file_path, cache_dir, file_hash=None):
+    """
+    Get the path of the cached inputs/outputs of a game log, keyed by the hash of its content
+
+    @param file_path: the path of the 2048 log file
+    @type file_path: str
+    @param cache_dir: the directory of the cached datasets
+    @type cache_dir: str
+    @param file_hash: (optional) the hash of the log when already known (e.g., from the replay catalog)
+    @type file_hash: str
+    @return: the path of the cached .npz file
+    @rtype: str
+    """
+    file_hash = file_hash if file_hash is not None else hash_of(file_path)
+    return os.path.join(cache_dir, "{}_{}_v{}.npz".format(file_hash, Constants.TILE_NUMBER_TO_WIN,
+                                                          DATASET_FORMAT_VERSION))
+
+
+def build_dataset(file_paths, parse_function, nb_workers=None, cache_dir=None, return_sizes=False, file_hashes=None):
+    """
+    Build the inputs/outputs of a list of game logs
+    The logs are parsed in a pool of worker processes and their inputs/outputs are cached on disk, so that
+    unchanged logs are never parsed again. The final arrays are allocated once and filled log by log
+
+    @param file_paths: the paths of the 2048 log files
+    @type file_paths: list of str
+    @param parse_function: the function converting a Game into (x, y) (must be a module-level function or
+                           a static method so that it can be sent to worker processes)
+    @type parse_function: function
+    @param nb_workers: (optional) the number of worker processes (default: number of CPUs)
+    @type nb_workers: int
+    @param cache_dir: (optional) the directory of the cached datasets (default: data/cache/datasets)
+    @type cache_dir: str
+    @param return_sizes: whether to also return the number of examples of each log
+    @type return_sizes: bool
+    @param file_hashes: (optional) the hash of each log when already known, so that the logs are not read to find
+                        their cached inputs/outputs (default: each log is hashed)
+    @type file_hashes: list of str
+    @return: the inputs/outputs of all the logs (None, None if there is no log), and the number of examples of each
+             log if return_sizes is set
+    @rtype: tuple of (np.array, np.array) or tuple of (np.array, np.array, list of int)
+    """
+    if not file_paths:
+        return (None, None, list()) if return_sizes else (None, None)
+    nb_workers = nb_workers if nb_workers is not None else os.cpu_count()
+    if cache_dir is None:
+        cache_dir = os.path.join(Constants.DATA_DIR_NAME, Constants.CACHE_DIR_NAME, 'datasets')
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+
+    datasets = dict()
+    missing_paths = list()
+    file_hashes = file_hashes if file_hashes is not None else [None] * len(file_paths)
+    for file_path, file_hash in zip(file_paths, file_hashes):
+        cache_path = cache_path_of(file_path, cache_dir, file_hash)
+        if os.path.isfile(cache_path):
+            with np.load(cache_path) as data:
+                datasets[file_path] = (data['x'], data['y'])
+            print("OK - File loaded from cache: {}".format(file_path))
+        else:
+            missing_paths.append((file_path, cache_path))
+
+    if nb_workers > 1 and len(missing_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(nb_workers, len(missing_paths))) as executor:
+            results = executor.map(parse_file, [parse_function] * len(missing_paths),
+                                   [file_path for file_path, _ in missing_paths])
+            parsed = list(results)
+    else:
+        parsed = [parse_file(parse_function, file_path) for file_path, _ in missing_paths]
+    for (file_path, cache_path), (x, y) in zip(missing_paths, parsed):
+        print("OK - File parsed: {}".format(file_path))
+        temp_cache_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        with open(temp_cache_path, 'wb') as f:
+            np.savez(f, x=x, y=y)
+        os.replace(temp_cache_path, cache_path)
+        datasets[file_path] = (x, y)
+
+    # The final arrays are allocated once (instead of being concatenated log after log)
+    nb_examples = sum(len(datasets[file_path][0]) for file_path in file_paths)
+    first_x, first_y = datasets[file_paths[0]]
+    all_x = np.empty((nb_examples,) + first_x.shape[1:], dtype=first_x.dtype)
+    all_y = np.empty((nb_examples,) + first_y.shape[1:], dtype=first_y.dtype)
+    offset = 0
+    for file_path in file_paths:
+        x, y = datasets[file_path]
+        all_x[offset:offset + len(x)] = x
+        all_y[offset:offset + len(y)] = y
+        offset += len(x)
+    if return_sizes:
+        return all_x, all_y, [len(datasets[file_path][0]) for file_path in file_paths]
+    return all_x, all_y
@@ -0,0 +1,102 @@
+# coding: utf-8
+from collections import OrderedDict
+
+import numpy as np
+
+from model.Symmetry import canonical_board, canonical_states
+
+
+class EvaluationCache:
+    """
+    A bounded cache of evaluations that any agent can use, with a Least Recently Used (LRU) eviction policy
+    Boards are keyed by their canonical form so that the 8 symmetric images of a board share a single entry
+    (only valid for evaluations that give the same value to symmetric boards)
+    """
+
+    def __init__(self, capacity, use_symmetries=True):
+        """
+        @param capacity: the maximum number of entries
+        @type capacity: int
+        @param use_symmetries: whether to key boards by their canonical form
+        @type use_symmetries: bool
+        """
+        self.capacity = capacity
+        self.use_symmetries = use_symmetries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key_of(self, board, context=None):
+        """
+        Get the key of a board in this cache
+
+        @param board: a 64-bit bitboard or a square Grid state
+        @type board: int or np.array
+        @param context: (optional) anything else the evaluation depends on (e.g., a search depth)
+        @type context: object
+        @return: the key of the board
+        @rtype: tuple
+        """
+        if isinstance(board, np.ndarray):
+            state = board.reshape((1,) + board.shape)
+            board = (canonical_states(state)[0] if self.use_symmetries else state).tobytes()
+        elif self.use_symmetries:
+            board = canonical_board(board)[0]
+        return board, context
+
+    def get(self, board, context=None):
+        """
+        Get the cached evaluation of a board
+
+        @param board: a 64-bit bitboard or a square Grid state
+        @type board: int or np.array
+        @param context: (optional) anything else the evaluation depends on (e.g., a search depth)
+        @type context: object
+        @return: the cached evaluation, or None if the board has not been evaluated yet
+        @rtype: object
+        """
+        key = self.key_of(board, context)
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, board, value, context=None):
+        """
+        Store the evaluation of a board, evicting the least recently used entry if the cache is full
+
+        @param board: a 64-bit bitboard or a square Grid state
+        @type board: int or np.array
+        @param value: the evaluation of the board (not None)
+        @type value: object
+        @param context: (optional) anything else the evaluation depends on (e.g., a search depth)
+        @type context: object
+        """
+        key = self.key_of(board, context)
+        if key not in self.entries and len(self.entries) >= self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+    def clear(self):
+        """
+        Remove all the entries (the counters are kept)
+        """
+        self.entries.clear()
+
+    def print_stats(self):
+        """
+        Method to display the hit/miss/eviction counters of this cache
+        """
+        nb_lookups = self.hits + self.misses
+        print("Evaluation cache: {} entries, {} hits, {} misses ({:.2f}% hit rate), {} evictions".format(
+            len(self), self.hits, self.misses, 100.0 * self.hits / nb_lookups if nb_lookups else 0.0,
+            self.evictions))
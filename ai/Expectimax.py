@@ -0,0 +1,165 @@
+# coding: utf-8
+import time
+
+import numpy as np
+
+from Constants import DIRECTIONS_LIST
+from ai.EvaluationCache import EvaluationCache
+from ai.Heuristics import Heuristic
+from model.BitboardGrid import BITBOARD_SIZE, NIBBLE_MASK, BitboardGrid, board_successors, exponent_of
+
+# Each new tile is either a 2 or a 4 tile with the same probability (see Grid.generate_new_number)
+SPAWN_PROBABILITIES = ((1, 0.5), (2, 0.5))
+
+
+class SearchTimeout(Exception):
+    """
+    Exception raised when a search goes beyond its deadline
+    """
+    pass
+
+
+def board_of(grid):
+    """
+    Utility method to get the bitboard of a 4x4 Grid, whatever its engine
+
+    @param grid: a 4x4 Grid (or BitboardGrid) object
+    @type grid: Grid
+    @return: the 64-bit bitboard of that Grid
+    @rtype: int
+    """
+    if isinstance(grid, BitboardGrid):
+        return grid.board
+    if grid.nb_rows != BITBOARD_SIZE or grid.nb_columns != BITBOARD_SIZE:
+        raise ValueError("Search agents only support {0}x{0} grids".format(BITBOARD_SIZE))
+    board = 0
+    for i, value in enumerate(np.ravel(grid.grid)):
+        board |= exponent_of(value) << (4 * i)
+    return board
+
+
+class ExpectimaxAgent:
+    """
+    An agent that searches max (player) and chance (new tile) nodes over bitboards
+    Chance nodes whose cumulative probability is too low are pruned and evaluated states are memoized
+    in a bounded transposition table (an EvaluationCache)
+    """
+
+    def __init__(self, depth=2, min_probability=0.0001, table_size=1000000, use_symmetries=True, heuristic=None):
+        """
+        @param depth: the number of moves (max nodes) to look ahead
+        @type depth: int
+        @param min_probability: chance nodes less likely than this cumulative probability are evaluated directly
+        @type min_probability: float
+        @param table_size: the maximum number of entries of the transposition table
+        @type table_size: int
+        @param use_symmetries: whether symmetric boards share their transposition table entries
+                               (only valid if the evaluation gives the same value to symmetric boards)
+        @type use_symmetries: bool
+        @param heuristic: (optional) the evaluation of the leaves of the search (default: Heuristic())
+        @type heuristic: Heuristic
+        """
+        self.depth = depth
+        self.heuristic = heuristic if heuristic is not None else Heuristic()
+        self.min_probability = min_probability
+        self.table_size = table_size
+        self.transposition_table = EvaluationCache(table_size, use_symmetries=use_symmetries)
+        self.move_times = list()
+        self.deadline = None  # If set (see time.perf_counter), a search raises SearchTimeout after it
+
+    def predict(self, game):
+        """
+        Function to get the next directions to play given the current Game
+
+        @param game: the Game being played
+        @type game: Game
+
+        @return: The ordered list of directions to play (0: first choice, 1: second choice, etc.)
+        @rtype: list of Constants.Directions
+        """
+        start_time = time.perf_counter()
+        values = self.evaluate_directions(board_of(game.grid), self.depth)
+        self.move_times.append(time.perf_counter() - start_time)
+        return sorted(DIRECTIONS_LIST, key=lambda d: values[d], reverse=True)
+
+    def evaluate_directions(self, board, depth):
+        """
+        Compute the expected value of each direction (illegal directions get a -inf value)
+
+        @param board: a 64-bit bitboard
+        @type board: int
+        @param depth: the number of moves to look ahead
+        @type depth: int
+        @return: the expected value of each direction
+        @rtype: dict of Constants.Directions to float
+        """
+        values = dict()
+        for direction, (new_board, _, legal) in zip(DIRECTIONS_LIST, board_successors(board)):
+            if legal:
+                values[direction] = self.chance_node(new_board, depth - 1, 1.0)
+            else:
+                values[direction] = float('-inf')
+        return values
+
+    def max_node(self, board, depth, probability):
+        """
+        Compute the value of a board where the player has to move
+
+        @param board: a 64-bit bitboard
+        @type board: int
+        @param depth: the number of moves left to look ahead
+        @type depth: int
+        @param probability: the cumulative probability to reach that board
+        @type probability: float
+        @return: the value of the best direction (0 if no move is possible)
+        @rtype: float
+        """
+        best_value = 0.0
+        for new_board, _, legal in board_successors(board):
+            if legal:
+                best_value = max(best_value, self.chance_node(new_board, depth, probability))
+        return best_value
+
+    def chance_node(self, board, depth, probability):
+        """
+        Compute the expected value of a board where a new tile has to be generated
+
+        @param board: a 64-bit bitboard
+        @type board: int
+        @param depth: the number of moves left to look ahead
+        @type depth: int
+        @param probability: the cumulative probability to reach that board
+        @type probability: float
+        @return: the expected value over all possible new tiles
+        @rtype: float
+        """
+        if depth <= 0 or probability < self.min_probability:
+            return self.heuristic.evaluate(board)
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        value = self.transposition_table.get(board, depth)
+        if value is not None:
+            return value
+
+        free_positions = [i for i in range(16) if not (board >> (4 * i)) & NIBBLE_MASK]
+        cell_probability = probability / len(free_positions)
+        value = 0.0
+        for i in free_positions:
+            for exponent, spawn_probability in SPAWN_PROBABILITIES:
+                value += spawn_probability * self.max_node(board | (exponent << (4 * i)), depth - 1,
+                                                           cell_probability * spawn_probability)
+        value /= len(free_positions)
+
+        self.transposition_table.put(board, value, depth)
+        return value
+
+    def print_stats(self):
+        """
+        Method to display the latency measured for each move played by this agent
+        """
+        if self.move_times:
+            times_ms = 1000.0 * np.array(self.move_times)
+            print("Search depth: {}".format(self.depth))
+            print("Move latency (ms): mean {:.2f}, median {:.2f}, p99 {:.2f}, max {:.2f}".format(
+                np.mean(times_ms), np.median(times_ms), np.percentile(times_ms, 99), np.max(times_ms)))
+            self.transposition_table.print_stats()
@@ -0,0 +1,153 @@
+# coding: utf-8
+import numpy as np
+
+from model.BitboardGrid import BITBOARD_SIZE, NIBBLE_MASK, ROW_MASK, transpose
+
+# The heuristic value of a 4x4 board is the sum of the values of its 4 rows and of its 4 columns
+# Each line (row or column) is described by the following features:
+#   - lost: a constant (so that any board is better than a lost game, valued 0)
+#   - empty: the number of empty tiles
+#   - merges: the number of tiles that can be merged with a neighbour
+#   - monotonicity: how far the line is from being sorted (in the best of both orders)
+#   - sum: the sum of the tile exponents raised to SUM_POWER
+#   - smoothness: the sum of the differences between the exponents of adjacent tiles
+#   - corner: the exponent of the biggest tile of the line if it lies at one of its ends
+# All the features are invariant when a line is reversed, so that symmetric boards share the same value
+FEATURES = ['lost', 'empty', 'merges', 'monotonicity', 'sum', 'smoothness', 'corner']
+DEFAULT_WEIGHTS = {'lost': 200000.0, 'empty': 270.0, 'merges': 700.0, 'monotonicity': -100.0, 'sum': -3.0,
+                   'smoothness': -50.0, 'corner': 0.0}
+MONOTONICITY_POWER = 4
+SUM_POWER = 3.5
+
+_FEATURE_TABLES = None
+
+
+def _build_feature_tables():
+    """
+    Compute the features of the 65,536 possible lines of a 4x4 bitboard
+
+    @return: a (65536, nb features) array, one line per possible line (indexed by its 16-bit encoding)
+    @rtype: np.array
+    """
+    all_lines = np.arange(ROW_MASK + 1, dtype='int64')
+    shifts = 4 * np.arange(BITBOARD_SIZE, dtype='int64')
+    ranks = ((all_lines[:, None] >> shifts) & NIBBLE_MASK).astype('float64')
+
+    features = np.zeros((ROW_MASK + 1, len(FEATURES)))
+    features[:, FEATURES.index('lost')] = 1.0
+    features[:, FEATURES.index('empty')] = np.count_nonzero(ranks == 0, axis=1)
+
+    # Runs of equal tiles (empty tiles being skipped, as when the line is moved): a run of k tiles counts for k merges
+    merges = np.zeros(ROW_MASK + 1)
+    counter = np.zeros(ROW_MASK + 1)
+    previous = np.zeros(ROW_MASK + 1)
+    for i in range(BITBOARD_SIZE):
+        rank = ranks[:, i]
+        filled = rank != 0
+        equal = filled & (rank == previous)
+        merges += np.where(filled & ~equal & (counter > 0), 1 + counter, 0)
+        counter = np.where(equal, counter + 1, np.where(filled, 0, counter))
+        previous = np.where(filled, rank, previous)
+    merges += np.where(counter > 0, 1 + counter, 0)
+    features[:, FEATURES.index('merges')] = merges
+
+    powered = ranks ** MONOTONICITY_POWER
+    decreasing = np.clip(powered[:, :-1] - powered[:, 1:], 0, None).sum(axis=1)
+    increasing = np.clip(powered[:, 1:] - powered[:, :-1], 0, None).sum(axis=1)
+    features[:, FEATURES.index('monotonicity')] = np.minimum(decreasing, increasing)
+
+    features[:, FEATURES.index('sum')] = (ranks ** SUM_POWER).sum(axis=1)
+    features[:, FEATURES.index('smoothness')] = np.abs(np.diff(ranks, axis=1)).sum(axis=1)
+    biggest = ranks.max(axis=1)
+    features[:, FEATURES.index('corner')] = np.where((ranks[:, 0] == biggest) | (ranks[:, -1] == biggest), biggest, 0)
+    return features
+
+
+def feature_tables():
+    """
+    Lazily build (only once per process) and return the features of the 65,536 possible lines
+
+    @return: a (65536, nb features) array, one line per possible line (indexed by its 16-bit encoding)
+    @rtype: np.array
+    """
+    global _FEATURE_TABLES
+    if _FEATURE_TABLES is None:
+        _FEATURE_TABLES = _build_feature_tables()
+    return _FEATURE_TABLES
+
+
+def lines_of(boards):
+    """
+    Vectorized method to get the 16-bit encodings of the rows and columns of many 4x4 boards
+
+    @param boards: a (N, 4, 4) array of tile exponents
+    @type boards: np.array
+    @return: a (N, 8) array with the encodings of the 4 rows then of the 4 columns of each board
+    @rtype: np.array
+    """
+    shifts = 4 * np.arange(BITBOARD_SIZE, dtype='int64')
+    boards = np.asarray(boards, dtype='int64')
+    rows = (boards << shifts).sum(axis=2)
+    columns = (boards.transpose(0, 2, 1) << shifts).sum(axis=2)
+    return np.concatenate((rows, columns), axis=1)
+
+
+class Heuristic:
+    """
+    A weighted board evaluation built from per-line features (see FEATURES)
+    The weighted value of every possible line is precomputed, so that evaluating a bitboard takes 8 table lookups
+    """
+
+    def __init__(self, weights=None):
+        """
+        @param weights: (optional) the weight of each feature (the default weight is used for missing features)
+        @type weights: dict of str to float
+        """
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights is not None:
+            unknown_features = set(weights) - set(FEATURES)
+            if unknown_features:
+                raise ValueError("Unknown heuristic features: {}".format(sorted(unknown_features)))
+            self.weights.update(weights)
+        weight_vector = np.array([self.weights[feature] for feature in FEATURES])
+        self.line_values = feature_tables() @ weight_vector
+        self.line_value_list = self.line_values.tolist()  # Python floats are faster to sum one by one
+
+    def evaluate(self, board):
+        """
+        Evaluate a 64-bit bitboard with 8 table lookups (4 rows and 4 columns)
+
+        @param board: a 64-bit bitboard
+        @type board: int
+        @return: the heuristic value of that bitboard
+        @rtype: float
+        """
+        values = self.line_value_list
+        columns = transpose(board)
+        return values[board & ROW_MASK] + values[(board >> 16) & ROW_MASK] + \
+            values[(board >> 32) & ROW_MASK] + values[(board >> 48) & ROW_MASK] + \
+            values[columns & ROW_MASK] + values[(columns >> 16) & ROW_MASK] + \
+            values[(columns >> 32) & ROW_MASK] + values[(columns >> 48) & ROW_MASK]
+
+    def evaluate_batch(self, boards):
+        """
+        Vectorized method to evaluate many 4x4 boards at once
+
+        @param boards: a (N, 4, 4) array of tile exponents
+        @type boards: np.array
+        @return: the (N,) heuristic values
+        @rtype: np.array
+        """
+        return self.line_values[lines_of(boards)].sum(axis=1)
+
+    @staticmethod
+    def features_batch(boards):
+        """
+        Vectorized method to get the unweighted features of many 4x4 boards (e.g., as inputs of a neural network)
+
+        @param boards: a (N, 4, 4) array of tile exponents
+        @type boards: np.array
+        @return: a (N, nb features) array, each feature being summed over the rows and columns of each board
+        @rtype: np.array
+        """
+        return feature_tables()[lines_of(boards)].sum(axis=1)
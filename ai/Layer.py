@@ -1,16 +1,13 @@
 # coding: utf-8
 import numpy as np
 
-# Uncomment to get the same results when generating random numbers
-# np.random.seed(100)
-
 
 class Layer:
     """
     Represents a layer (hidden or output) in our neural network
     """
 
-    def __init__(self, n_input, n_neurons, weights=None, bias=None):
+    def __init__(self, n_input, n_neurons, weights=None, bias=None, rng=None):
         """
         @param n_input: The input size (coming from the input layer or a previous hidden layer)
         @type n_input: int
@@ -21,10 +18,14 @@ class Layer:
 
         @param bias: The layer's bias
         @type bias: np.array
+        @param rng: (optional) the random generator of the initial weights and bias (default: a new unseeded one)
+        @type rng: np.random.Generator
         """
-        self.weights = weights if weights is not None else np.random.rand(n_input, n_neurons)
-        self.bias = bias if bias is not None else np.random.rand(n_neurons)
+        rng = rng if rng is not None else np.random.default_rng()
+        self.weights = weights if weights is not None else rng.random((n_input, n_neurons))
+        self.bias = bias if bias is not None else rng.random(n_neurons)
         self.last_activation = None
+        self._activation_buffer = np.empty((0, n_neurons))  # Reused by activate() to avoid allocations
         self.error = None
         self.delta = None
 
@@ -59,13 +60,26 @@ class Layer:
     def activate(self, x):
         """
         Calculates the dot product of this layer.
+        The result is computed in a preallocated buffer that is reused (and grown if needed) at each call
 
-        @param x: The input
+        @param x: The input (one sample or one sample per line)
         @type x: np.array
 
-        @return: The result
+        @return: The result (a view on the buffer of this layer)
         @rtype: np.array
         """
-        r = np.dot(x, self.weights) + self.bias
-        self.last_activation = self.apply_activation(r)
+        x_2d = x if np.ndim(x) == 2 else np.atleast_2d(x)
+        nb_samples = x_2d.shape[0]
+        if self._activation_buffer.shape[0] < nb_samples or self._activation_buffer.shape[1] != self.weights.shape[1]:
+            self._activation_buffer = np.empty((max(nb_samples, 2 * self._activation_buffer.shape[0]),
+                                                self.weights.shape[1]))
+        r = self._activation_buffer[:nb_samples]
+        np.dot(x_2d, self.weights, out=r)
+        r += self.bias
+        # In-place sigmoid: 1 / (1 + exp(-r))
+        np.negative(r, out=r)
+        np.exp(r, out=r)
+        r += 1
+        np.reciprocal(r, out=r)
+        self.last_activation = r if x_2d is x else r[0]
         return self.last_activation
@@ -0,0 +1,132 @@
+# coding: utf-8
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Constants import DIRECTIONS_LIST
+from model.BatchGame import BatchGame
+from model.BatchGrid import BatchGrid
+
+
+def play_rollouts(start_grids, start_scores, nb_rollouts, rollout_depth, seed=None):
+    """
+    Play random continuations from several starting grids, all at once with a BatchGame
+
+    @param start_grids: a (k, nb_rows, nb_columns) array of tile exponents (before the new tile is generated)
+    @type start_grids: np.array
+    @param start_scores: a (k,) array of the scores obtained to reach each starting grid
+    @type start_scores: np.array
+    @param nb_rollouts: the number of random continuations played from each starting grid
+    @type nb_rollouts: int
+    @param rollout_depth: the maximum number of random moves per continuation
+    @type rollout_depth: int
+    @param seed: (optional) the seed of the random generator
+    @type seed: int
+    @return: the average final score obtained from each starting grid
+    @rtype: np.array
+    """
+    nb_starts = start_grids.shape[0]
+    batch = BatchGame(nb_starts * nb_rollouts, start_grids.shape[1], init_grids_with_two_tiles=False,
+                      auto_reset=False, seed=seed)
+    batch.grid.grids[:] = np.repeat(start_grids, nb_rollouts, axis=0)
+    batch.current_scores[:] = np.repeat(start_scores, nb_rollouts)
+    batch.grid.generate_new_numbers()
+    batch.ended_games[:] = ~batch.grid.move_is_still_possible()
+    for _ in range(rollout_depth):
+        if batch.ended_games.all():
+            break
+        # Each continuation plays the four directions in a random order (as the RANDOM agent)
+        random_orders = np.argsort(batch.rng.random((batch.nb_games, len(DIRECTIONS_LIST))), axis=1)
+        batch.play_directions(random_orders)
+    return batch.current_scores.reshape(nb_starts, nb_rollouts).mean(axis=1)
+
+
+class MonteCarloAgent:
+    """
+    An agent that plays, for each legal direction, many fast random continuations and prefers the directions
+    with the best average final score
+    Continuations are played in a single batch, optionally split across a pool of worker processes
+    """
+
+    def __init__(self, nb_rollouts=100, rollout_depth=20, nb_workers=1, seed=None):
+        """
+        @param nb_rollouts: the number of random continuations played for each legal direction
+        @type nb_rollouts: int
+        @param rollout_depth: the maximum number of random moves per continuation
+        @type rollout_depth: int
+        @param nb_workers: the number of worker processes sharing the continuations (1 to use the current process)
+        @type nb_workers: int
+        @param seed: (optional) the seed of the random generator
+        @type seed: int
+        """
+        self.nb_rollouts = nb_rollouts
+        self.rollout_depth = rollout_depth
+        self.nb_workers = nb_workers
+        self.rng = np.random.default_rng(seed)
+        self.executor = None  # The pool of worker processes, started by the first evaluation (see close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Method to stop the worker processes of this agent (a new pool is started if the agent is used again)
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def seed(self, seed):
+        """
+        Reset the random generator of this agent (e.g., before each game of a reproducible simulation)
+
+        @param seed: the new seed
+        @type seed: int
+        """
+        self.rng = np.random.default_rng(seed)
+
+    def predict(self, game):
+        """
+        Function to get the next directions to play given the current Game
+
+        @param game: the Game being played
+        @type game: Game
+
+        @return: The ordered list of directions to play (0: first choice, 1: second choice, etc.)
+        @rtype: list of Constants.Directions
+        """
+        new_grids, scores, legal = BatchGrid.successors_of(BatchGrid.exponents_of(game.grid.grid)[None])
+        legal_codes = np.nonzero(legal[:, 0])[0]
+        legal_directions = [DIRECTIONS_LIST[code] for code in legal_codes]
+        if not legal_directions:
+            return list(DIRECTIONS_LIST)
+
+        average_scores = self.evaluate(new_grids[legal_codes, 0], scores[legal_codes, 0])
+        ranking = [legal_directions[i] for i in np.argsort(-average_scores, kind='stable')]
+        return ranking + [d for d in DIRECTIONS_LIST if d not in legal_directions]
+
+    def evaluate(self, start_grids, start_scores):
+        """
+        Compute the average final score of the random continuations played from each starting grid
+
+        @param start_grids: a (k, nb_rows, nb_columns) array of tile exponents
+        @type start_grids: np.array
+        @param start_scores: a (k,) array of the scores obtained to reach each starting grid
+        @type start_scores: np.array
+        @return: the average final score obtained from each starting grid
+        @rtype: np.array
+        """
+        if self.nb_workers <= 1:
+            return play_rollouts(start_grids, start_scores, self.nb_rollouts, self.rollout_depth,
+                                 seed=self.rng.integers(2 ** 32))
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.nb_workers)
+        chunks = [len(c) for c in np.array_split(np.arange(self.nb_rollouts), self.nb_workers) if len(c) > 0]
+        futures = [self.executor.submit(play_rollouts, start_grids, start_scores, chunk, self.rollout_depth,
+                                        self.rng.integers(2 ** 32)) for chunk in chunks]
+        # The average of each chunk is weighted by its number of continuations
+        return sum(chunk * f.result() for chunk, f in zip(chunks, futures)) / self.nb_rollouts
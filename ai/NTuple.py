@@ -0,0 +1,239 @@
+# coding: utf-8
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from Constants import DIRECTIONS_LIST
+from ai.Expectimax import board_of
+from model.BitboardGrid import BITBOARD_SIZE, BitboardGrid, board_successors
+from model.Game import Game
+from model.Symmetry import board_symmetries
+
+# Each n-tuple is a list of positions (row * 4 + column) whose tile exponents index a lookup table
+# Every tuple is also applied to the 8 symmetric images of the board (sharing the same table)
+DEFAULT_TUPLES = [(0, 1, 2, 3),  # Outer row
+                  (4, 5, 6, 7),  # Inner row
+                  (0, 1, 4, 5),  # Corner square
+                  (1, 2, 5, 6),  # Edge square
+                  (5, 6, 9, 10)]  # Center square
+NB_EXPONENTS = 16  # A tile exponent is stored in 4 bits
+
+
+class NTupleNetwork:
+    """
+    A value function of 4x4 bitboards: the sum of the weights of the n-tuples of the board (and of its 8 symmetric
+    images), each weight being read from the float32 lookup table of its n-tuple
+    The network evaluates afterstates (boards after a move, before a new tile is generated) and is trained by
+    temporal difference learning, TD(0), on self-played Games
+    """
+
+    def __init__(self, tuples=None, weights=None):
+        """
+        @param tuples: (optional) the positions of each n-tuple (default: DEFAULT_TUPLES)
+        @type tuples: list of tuple of int
+        @param weights: (optional) the flat float32 array of all the lookup tables (default: zeros)
+        @type weights: np.array
+        """
+        self.tuples = [tuple(t) for t in (tuples if tuples is not None else DEFAULT_TUPLES)]
+        self.offsets = list()
+        offset = 0
+        for t in self.tuples:
+            self.offsets.append(offset)
+            offset += NB_EXPONENTS ** len(t)
+        self.weights = weights if weights is not None else np.zeros(offset, dtype='float32')
+        if self.weights.shape != (offset,):
+            raise ValueError("Expected {} weights for these tuples, got {}".format(offset, self.weights.shape))
+        self.shifts = [[4 * position for position in t] for t in self.tuples]
+        self.nb_trained_games = 0
+
+    def features(self, board):
+        """
+        Get the indexes (in the flat weights array) of the n-tuples of a board and of its symmetric images
+
+        @param board: a 64-bit bitboard
+        @type board: int
+        @return: the indexes of the weights to sum
+        @rtype: list of int
+        """
+        indexes = list()
+        for image in board_symmetries(board):
+            for offset, shifts in zip(self.offsets, self.shifts):
+                index = 0
+                for shift in shifts:
+                    index = (index << 4) | ((image >> shift) & 0xF)
+                indexes.append(offset + index)
+        return indexes
+
+    def evaluate(self, board):
+        """
+        Evaluate an afterstate
+
+        @param board: a 64-bit bitboard
+        @type board: int
+        @return: the expected sum of the scores still to come from that afterstate
+        @rtype: float
+        """
+        return float(self.weights[self.features(board)].sum())
+
+    def evaluate_many(self, boards):
+        """
+        Evaluate many afterstates with a single lookup in the tables
+
+        @param boards: 64-bit bitboards
+        @type boards: list of int
+        @return: the (len(boards),) values
+        @rtype: np.array
+        """
+        if not boards:
+            return np.zeros(0)
+        indexes = [self.features(board) for board in boards]
+        return self.weights[indexes].sum(axis=1)
+
+    def best_successor(self, successors):
+        """
+        Choose the legal move maximizing the score obtained plus the value of the resulting afterstate
+
+        @param successors: the result of the four directions (see BitboardGrid.successors)
+        @type successors: list of tuple of (int, int, bool)
+        @return: the index of the best direction, its afterstate, the score obtained and the value of the afterstate
+                 (None if no move is legal)
+        @rtype: tuple of (int, int, int, float)
+        """
+        legal_indexes = [i for i, (_, _, legal) in enumerate(successors) if legal]
+        if not legal_indexes:
+            return None
+        values = self.evaluate_many([successors[i][0] for i in legal_indexes])
+        best = max(range(len(legal_indexes)), key=lambda j: successors[legal_indexes[j]][1] + values[j])
+        index = legal_indexes[best]
+        return index, successors[index][0], successors[index][1], float(values[best])
+
+    def update(self, board, target, learning_rate):
+        """
+        Move the value of an afterstate towards a target
+
+        @param board: a 64-bit bitboard (the afterstate)
+        @type board: int
+        @param target: the new estimate of its value
+        @type target: float
+        @param learning_rate: the step size (divided among the weights of the afterstate)
+        @type learning_rate: float
+        """
+        indexes = self.features(board)
+        error = target - float(self.weights[indexes].sum())
+        # The same weight can be used by several symmetric images, hence np.add.at
+        np.add.at(self.weights, indexes, np.float32(learning_rate * error / len(indexes)))
+
+    def train(self, nb_games, learning_rate, print_every=100, seed=None):
+        """
+        Train this network by TD(0) on games played against itself with the Game/BitboardGrid engine:
+        after each move, the value of the previous afterstate is moved towards the score obtained by the next
+        move plus the value of the next afterstate (0 once the Game is over)
+        Each game gets a child seed sequence of the training seed, numbered after the games already trained, so that
+        the same seed plays the same games, and an incremental training plays new ones
+
+        @param nb_games: the number of self-played games
+        @type nb_games: int
+        @param learning_rate: the step size of the TD updates
+        @type learning_rate: float
+        @param print_every: the number of games between two progress reports
+        @type print_every: int
+        @param seed: (optional) the seed of the self-played games (default: fresh entropy)
+        @type seed: int
+        """
+        root_sequence = np.random.SeedSequence(seed)
+        start_time = time.perf_counter()
+        scores = list()
+        nb_moves = 0
+        for game_number in range(1, nb_games + 1):
+            game_sequence = np.random.SeedSequence(root_sequence.entropy, spawn_key=(self.nb_trained_games,))
+            game = Game(BitboardGrid(BITBOARD_SIZE), init_grid_with_two_tiles=True, display_grid=False,
+                        seed=int(game_sequence.generate_state(1, dtype='uint64')[0]))
+            afterstate = None
+            while not game.ended_game:
+                best = self.best_successor(game.grid.successors())
+                if best is None:
+                    break
+                index, next_afterstate, score, value = best
+                if afterstate is not None:
+                    self.update(afterstate, score + value, learning_rate)
+                afterstate = next_afterstate
+                game.play_many_directions([DIRECTIONS_LIST[index]])
+                nb_moves += 1
+            if afterstate is not None:
+                self.update(afterstate, 0.0, learning_rate)
+            scores.append(game.current_score)
+            self.nb_trained_games += 1
+
+            if game_number % print_every == 0 or game_number == nb_games:
+                elapsed_time = time.perf_counter() - start_time
+                print("Games {}/{}: mean score {:.1f} over the last {} games, "
+                      "{:.1f} games/s, {:.0f} moves/s".format(game_number, nb_games, np.mean(scores[-print_every:]),
+                                                              len(scores[-print_every:]), game_number / elapsed_time,
+                                                              nb_moves / elapsed_time))
+
+    def save(self, file_path, metadata=None):
+        """
+        Saves the lookup tables and the n-tuples into a .npz file, with a small JSON metadata header
+
+        @param file_path: the path of the .npz file to write
+        @type file_path: str
+        @param metadata: (optional) JSON-serializable information stored along with the tables
+        @type metadata: dict
+        """
+        Path(os.path.dirname(file_path) or '.').mkdir(parents=True, exist_ok=True)
+        metadata = dict(metadata if metadata is not None else dict())
+        metadata.update(tuples=self.tuples, nb_trained_games=self.nb_trained_games)
+        # The file is replaced at once so that concurrent readers (e.g., SIMULATE workers) never see a partial file
+        temp_file_path = '{}.{}.tmp'.format(file_path, os.getpid())
+        with open(temp_file_path, 'wb') as f:
+            np.savez(f, metadata=np.array(json.dumps(metadata)), weights=self.weights)
+        os.replace(temp_file_path, file_path)
+
+    @staticmethod
+    def load(file_path):
+        """
+        Loads an n-tuple network saved with save()
+
+        @param file_path: the path of the .npz file to read
+        @type file_path: str
+        @return: the n-tuple network
+        @rtype: NTupleNetwork
+        """
+        with np.load(file_path) as data:
+            metadata = json.loads(str(data['metadata']))
+            network = NTupleNetwork(tuples=metadata['tuples'], weights=data['weights'])
+        network.nb_trained_games = metadata['nb_trained_games']
+        return network
+
+
+class NTupleAgent:
+    """
+    An agent that plays the direction maximizing the score obtained plus the value of the resulting afterstate
+    """
+
+    def __init__(self, network):
+        """
+        @param network: a trained n-tuple network
+        @type network: NTupleNetwork
+        """
+        self.network = network
+
+    def predict(self, game):
+        """
+        Function to get the next directions to play given the current Game
+
+        @param game: the Game being played
+        @type game: Game
+
+        @return: The ordered list of directions to play (0: first choice, 1: second choice, etc.)
+        @rtype: list of Constants.Directions
+        """
+        successors = board_successors(board_of(game.grid))
+        values = self.network.evaluate_many([new_board for new_board, _, _ in successors])
+        ranking = sorted(range(len(DIRECTIONS_LIST)),
+                         key=lambda i: successors[i][1] + values[i] if successors[i][2] else float('-inf'),
+                         reverse=True)
+        return [DIRECTIONS_LIST[i] for i in ranking]
@@ -1,12 +1,28 @@
 # coding: utf-8
+import json
 import os
+import time
+from pathlib import Path
+
 import numpy as np
-from Constants import Directions, TILE_NUMBER_TO_WIN
-from model.Game import Game
+
+import Constants
+from Constants import DIRECTIONS_LIST, TILE_NUMBER_TO_WIN, Directions
+from ai.Corpus import TrainingCorpus
+from ai.Dataset import build_dataset
+from ai.Layer import Layer
+from model.BinaryReplay import BINARY_REPLAY_EXTENSION
+from model.History import History
+from model.ReplayCatalog import ReplayCatalog
+from model.SeedReplay import SEED_REPLAY_EXTENSION
+from model.Symmetry import canonical_states, transform_direction
 
 NORMALIZED_DIR_DICT = {'Up': 1.0, 'Down': 0.75, 'Left': 0.5, 'Right': 0.25}
-DIRECTIONS_LIST = [Directions.UP, Directions.DOWN, Directions.LEFT, Directions.RIGHT]
 DIRECTION_VALUES_LIST = [1.0, 0.75, 0.5, 0.25]
+DIRECTION_VALUES = np.array(DIRECTION_VALUES_LIST)
+# A game saved in several formats is used for training in the first one of these formats
+TRAINING_EXTENSIONS = (BINARY_REPLAY_EXTENSION, '.log', SEED_REPLAY_EXTENSION)
+TRAINING_VERSION = 2  # Saved networks trained by an older version of backpropagation are trained again
 
 
 class NeuralNetwork:
@@ -26,6 +42,121 @@ class NeuralNetwork:
         """
         self._layers.append(layer)
 
+    @property
+    def layer_shapes(self):
+        """
+        @return: the (n_input, n_neurons) shape of each layer
+        @rtype: list of list of int
+        """
+        return [list(layer.weights.shape) for layer in self._layers]
+
+    def get_parameters(self):
+        """
+        @return: the weights and biases of every layer, flattened into a single vector (e.g., for neuroevolution)
+        @rtype: np.array
+        """
+        return np.concatenate([np.concatenate((layer.weights.ravel(), layer.bias.ravel())) for layer in self._layers])
+
+    def set_parameters(self, parameters):
+        """
+        Replaces the weights and biases of every layer by those of a vector built by get_parameters()
+
+        @param parameters: the flattened weights and biases
+        @type parameters: np.array
+        """
+        offset = 0
+        for layer in self._layers:
+            n_weights, n_bias = layer.weights.size, layer.bias.size
+            layer.weights = np.array(parameters[offset:offset + n_weights], dtype='float64').reshape(layer.weights.shape)
+            layer.bias = np.array(parameters[offset + n_weights:offset + n_weights + n_bias], dtype='float64')
+            offset += n_weights + n_bias
+        if offset != len(parameters):
+            raise ValueError("Expected {} parameters, got {}".format(offset, len(parameters)))
+
+    def save(self, file_path, metadata=None):
+        """
+        Saves the weights and biases of every layer into a .npz file, with a small JSON metadata header
+        (e.g., the training files and hyperparameters)
+
+        @param file_path: the path of the .npz file to write
+        @type file_path: str
+        @param metadata: (optional) JSON-serializable information stored along with the layers
+        @type metadata: dict
+        """
+        Path(os.path.dirname(file_path) or '.').mkdir(parents=True, exist_ok=True)
+        arrays = {'metadata': np.array(json.dumps(metadata if metadata is not None else dict()))}
+        for i, layer in enumerate(self._layers):
+            arrays['weights_{}'.format(i)] = layer.weights
+            arrays['bias_{}'.format(i)] = layer.bias
+        # The file is replaced at once so that concurrent readers (e.g., SIMULATE workers) never see a partial file
+        temp_file_path = '{}.{}.tmp'.format(file_path, os.getpid())
+        with open(temp_file_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_file_path, file_path)
+
+    @staticmethod
+    def load(file_path):
+        """
+        Loads a neural network saved with save()
+
+        @param file_path: the path of the .npz file to read
+        @type file_path: str
+
+        @return: the neural network
+        @rtype: NeuralNetwork
+        """
+        nn = NeuralNetwork()
+        with np.load(file_path) as data:
+            i = 0
+            while 'weights_{}'.format(i) in data:
+                weights = data['weights_{}'.format(i)]
+                nn.add_layer(Layer(weights.shape[0], weights.shape[1], weights=weights, bias=data['bias_{}'.format(i)]))
+                i += 1
+        return nn
+
+    @staticmethod
+    def load_metadata(file_path):
+        """
+        Reads the metadata of a neural network saved with save(), without loading its layers
+
+        @param file_path: the path of the .npz file to read
+        @type file_path: str
+
+        @return: the metadata
+        @rtype: dict
+        """
+        with np.load(file_path) as data:
+            return json.loads(str(data['metadata']))
+
+    @staticmethod
+    def list_training_files(directory, min_max_tile=Constants.NEURAL_NET_MIN_MAX_TILE):
+        """
+        Lists the game logs of a training directory with their size, modification time and content hash
+        The logs are selected from the replay catalog, which only loads (and hashes) new or modified logs
+        Text logs, binary and seed replays are all selected, but a game saved in several formats (e.g., a text log
+        and its conversion by the CONVERT mode) is only selected once, preferably as a binary replay (the fastest
+        to load)
+
+        @param directory: the path to the directory containing the 2048 log files
+        @type directory: str
+        @param min_max_tile: (optional) the tile that the selected logs must have reached (default: all the logs)
+        @type min_max_tile: int
+
+        @return: one {'path', 'size', 'mtime', 'hash'} dictionary per log file, sorted by path
+        @rtype: list of dict
+        """
+        with ReplayCatalog() as catalog:
+            catalog.update(directory)
+            replays = catalog.query(directory=directory, min_max_tile=min_max_tile)
+        replays_of_games = dict()
+        for r in replays:
+            base_path, extension = os.path.splitext(r['path'])
+            replays_of_games.setdefault(base_path, dict())[extension] = r
+        selected = [next(formats[extension] for extension in TRAINING_EXTENSIONS if extension in formats)
+                    for formats in replays_of_games.values()]
+        return [{'path': r['path'], 'size': r['size'], 'mtime': r['mtime'], 'hash': r['hash']}
+                for r in sorted(selected, key=lambda r: r['path'])]
+
     def feed_forward(self, x):
         """
         Feed forward the input through the layers
@@ -33,7 +164,7 @@ class NeuralNetwork:
         @param x: The input values
         @type x: np.array
 
-        @return: The result
+        @return: The result (stored in a buffer of the output layer that is reused by the next call)
         @rtype X: np.array
         """
         for layer in self._layers:
@@ -50,26 +181,39 @@ class NeuralNetwork:
         @return: The ordered list of directions to play (0: first choice, 1: second choice, etc.)
         @rtype: list of Constants.Directions
         """
-        ff = self.feed_forward(x)
-        output_error_vector = np.power(np.subtract(np.array(DIRECTION_VALUES_LIST), ff), 2)
-        direction_vector_choices = np.argsort(output_error_vector)
-        choices_to_return = list()
-        for index in np.nditer(direction_vector_choices):
-            choices_to_return.append(DIRECTIONS_LIST[int(index)])
-        return choices_to_return
+        return [DIRECTIONS_LIST[index] for index in self.predict_batch(np.atleast_2d(x))[0]]
+
+    def predict_batch(self, boards):
+        """
+        Function to predict the next directions to play for many Grids at once, with a single forward pass
+
+        @param boards: The input values, one Grid per line
+        @type boards: np.array of shape (N, n_input)
+
+        @return: The indexes in Constants.DIRECTIONS_LIST of the directions to play, sorted by order of preference
+        @rtype: np.array of shape (N, 4)
+        """
+        output = self.feed_forward(boards)
+        output_errors = np.square(DIRECTION_VALUES - output)
+        return np.argsort(output_errors, axis=1, kind='stable')
 
     def backpropagation(self, x, y, learning_rate):
         """
-        Performs the backward propagation algorithm and updates the layers weights
+        Performs the backward propagation algorithm on a mini-batch and updates the layers weights and biases
+        The forward and backward passes are matrix-matrix products over the whole batch, and the parameters are
+        updated with the gradient averaged over the batch (a batch of one sample is a plain online update)
         Source: https://blog.zhaytam.com/2018/08/15/implement-neural-network-backpropagation/
 
-        @param x: The input values
+        @param x: The input values (one sample or a (batch_size, n_input) matrix)
         @type x: np.array
-        @param y: The target values
+        @param y: The target values (one sample or a (batch_size, n_output) matrix)
         @type y: np.array
         @param learning_rate: The learning rate (between 0 and 1)
         @type learning_rate: float
         """
+        x = np.atleast_2d(x)
+        y = np.atleast_2d(y)
+
         # Feed forward for the output
         output = self.feed_forward(x)
 
@@ -84,47 +228,94 @@ class NeuralNetwork:
                 layer.delta = layer.error * layer.apply_activation_derivative(output)
             else:
                 next_layer = self._layers[i + 1]
-                layer.error = np.dot(next_layer.weights, next_layer.delta)
+                layer.error = np.dot(next_layer.delta, next_layer.weights.T)
                 layer.delta = layer.error * layer.apply_activation_derivative(layer.last_activation)
 
-        # Update the weights
+        # Update the weights and biases
         for i in range(len(self._layers)):
             layer = self._layers[i]
             # The input is either the previous layers output or X itself (for the first hidden layer)
-            input_to_use = np.atleast_2d(x if i == 0 else self._layers[i - 1].last_activation)
-            layer.weights += layer.delta * input_to_use.T * learning_rate
+            input_to_use = x if i == 0 else self._layers[i - 1].last_activation
+            layer.weights += np.dot(input_to_use.T, layer.delta) * (learning_rate / len(x))
+            layer.bias += layer.delta.sum(axis=0) * (learning_rate / len(x))
 
-    def train(self, x, y, learning_rate, max_epochs):
+    def train(self, x, y, learning_rate, max_epochs, batch_size=Constants.NEURAL_NET_BATCH_SIZE, shuffle=True,
+              rng=None):
         """
-        Trains the neural network using backpropagation
+        Trains the neural network using mini-batch backpropagation
         Source: https://blog.zhaytam.com/2018/08/15/implement-neural-network-backpropagation/
 
-        @param x: The input values
-        @type x: np.array
+        @param x: The input values, or an on-disk TrainingCorpus streamed by mini-batches (y is then ignored)
+        @type x: np.array or TrainingCorpus
         @param y: The target values
         @type y: np.array
         @param learning_rate: The learning rate (between 0 and 1)
         @type learning_rate: float
         @param max_epochs: The maximum number of epochs (cycles)
         @type max_epochs: int
+        @param batch_size: The number of samples per weights update (1 for online training)
+        @type batch_size: int
+        @param shuffle: Whether to shuffle the samples at each epoch
+        @type shuffle: bool
+        @param rng: (optional) the random generator shuffling the samples (default: a new unseeded one)
+        @type rng: np.random.Generator
 
         @return: The list of calculated MSE errors
         @rtype: list(float)
         """
         mses = []
-        if x is not None:  # If some train data is available
+        rng = rng if rng is not None else np.random.default_rng()
+        if x is not None and len(x) > 0:  # If some train data is available
+            start_time = time.perf_counter()
             for i in range(max_epochs):
-                for j in range(len(x)):
-                    self.backpropagation(x[j], y[j], learning_rate)
+                for batch_x, batch_y in self.batches(x, y, batch_size, shuffle, rng):
+                    self.backpropagation(batch_x, batch_y, learning_rate)
                 if i % 10 == 0:
-                    mse = np.mean(np.square(y - self.feed_forward(x)))
+                    # The error is accumulated batch by batch so that a corpus is never loaded at once
+                    squared_errors = 0.0
+                    for batch_x, batch_y in self.batches(x, y, Constants.CORPUS_BLOCK_SIZE, False):
+                        squared_errors += float(np.sum(np.square(batch_y - self.feed_forward(batch_x))))
+                    mse = squared_errors / (len(x) * self._layers[-1].weights.shape[1])
                     mses.append(mse)
                     print('Epoch: #%s, MSE: %f' % (i, float(mse)))
+            elapsed_time = time.perf_counter() - start_time
+            print('Training: %d samples/s' % (max_epochs * len(x) / max(elapsed_time, 1e-9)))
         return mses
 
-    def train_from_directory(self, directory, learning_rate, max_epochs):
+    @staticmethod
+    def batches(x, y, batch_size, shuffle, rng=None):
+        """
+        Generator over the mini-batches of in-memory arrays or of an on-disk TrainingCorpus
+
+        @param x: The input values, or a TrainingCorpus (y is then ignored)
+        @type x: np.array or TrainingCorpus
+        @param y: The target values
+        @type y: np.array
+        @param batch_size: The number of samples per mini-batch
+        @type batch_size: int
+        @param shuffle: Whether to shuffle the samples
+        @type shuffle: bool
+        @param rng: (optional) the random generator shuffling the samples (default: a new unseeded one)
+        @type rng: np.random.Generator
+
+        @return: the successive (x, y) mini-batches
+        @rtype: generator of tuple of (np.array, np.array)
+        """
+        if isinstance(x, TrainingCorpus):
+            yield from x.batches(batch_size, shuffle, rng=rng)
+            return
+        rng = rng if rng is not None else np.random.default_rng()
+        order = rng.permutation(len(x)) if shuffle else np.arange(len(x))
+        for j in range(0, len(x), batch_size):
+            batch = order[j:j + batch_size]
+            yield x[batch], y[batch]
+
+    def train_from_directory(self, directory, learning_rate, max_epochs, batch_size=Constants.NEURAL_NET_BATCH_SIZE,
+                             corpus_directory=None, rng=None):
         """
         Train a neural network based on a set of game logs located in a single directory
+        With a corpus directory, the examples of the new logs are appended to an on-disk TrainingCorpus and the
+        training streams mini-batches from it instead of loading all the examples into memory
 
         @param directory: the path to the directory containing the 2048 log files
         @type directory: str
@@ -132,40 +323,122 @@ class NeuralNetwork:
         @type learning_rate: float
         @param max_epochs: The maximum number of epochs (cycles)
         @type max_epochs: int
+        @param batch_size: The number of samples per weights update
+        @type batch_size: int
+        @param corpus_directory: (optional) the directory of the TrainingCorpus to use
+        @type corpus_directory: str
+        @param rng: (optional) the random generator shuffling the samples (default: a new unseeded one)
+        @type rng: np.random.Generator
         """
-        all_x = None
-        all_y = None
-        for filename in os.listdir(directory):
-            if filename.endswith(".log"):
-                print("OK - File parsed: {}".format(os.path.join(directory, filename)))
-                game = Game.load_game(os.path.join(directory, filename), display_grid=False)
-                x, y = self.parse_inputs_outputs_for_neural_net(game)
-                if all_x is None:
-                    all_x = x
-                    all_y = y
-                else:
-                    all_x = np.concatenate((all_x, x))
-                    all_y = np.concatenate((all_y, y))
-            else:
-                print("NOK - File not parsed: {}".format(os.path.join(directory, filename)))
-        self.train(all_x, all_y, learning_rate, max_epochs)
+        training_files = self.list_training_files(directory)
+        file_paths, file_hashes = [f['path'] for f in training_files], [f['hash'] for f in training_files]
+        if corpus_directory is not None:
+            corpus = TrainingCorpus(corpus_directory)
+            corpus.add_files(file_paths, NeuralNetwork.parse_inputs_outputs_for_neural_net, file_hashes=file_hashes)
+            self.train(corpus, None, learning_rate, max_epochs, batch_size=batch_size, rng=rng)
+            return
+        all_x, all_y = self.load_training_data(file_paths, file_hashes)
+        self.train(all_x, all_y, learning_rate, max_epochs, batch_size=batch_size, rng=rng)
+
+    def train_on_new_files(self, directory, consumed_files, learning_rate, max_epochs,
+                           batch_size=Constants.NEURAL_NET_BATCH_SIZE, replay_ratio=0.0, rng=None):
+        """
+        Train an already trained neural network on the game logs of a directory that it has not been trained on yet
+        The new examples can be mixed with a random sample of the examples of the logs already consumed, so that
+        the neural network does not forget them
+
+        @param directory: the path to the directory containing the 2048 log files
+        @type directory: str
+        @param consumed_files: the manifest of the logs already consumed (see list_training_files)
+        @type consumed_files: list of dict
+        @param learning_rate: The learning rate (between 0 and 1)
+        @type learning_rate: float
+        @param max_epochs: The maximum number of epochs (cycles)
+        @type max_epochs: int
+        @param batch_size: The number of samples per weights update
+        @type batch_size: int
+        @param replay_ratio: The number of old examples sampled for each new example (0 to train on new logs only)
+        @type replay_ratio: float
+        @param rng: (optional) the random generator sampling the old examples and shuffling the samples
+                    (default: a new unseeded one)
+        @type rng: np.random.Generator
+
+        @return: the manifest of all the logs consumed, including the new ones, sorted by path
+        @rtype: list of dict
+        """
+        consumed_keys = set((f['path'], f['hash']) for f in consumed_files)
+        training_files = self.list_training_files(directory)
+        new_files = [f for f in training_files if (f['path'], f['hash']) not in consumed_keys]
+        old_files = [f for f in training_files if (f['path'], f['hash']) in consumed_keys]
+        if not new_files:
+            print("OK - No new training file in: {}".format(directory))
+            return sorted(consumed_files, key=lambda f: (f['path'], f['hash']))
+
+        rng = rng if rng is not None else np.random.default_rng()
+        x, y = self.load_training_data([f['path'] for f in new_files], [f['hash'] for f in new_files])
+        nb_replayed = int(replay_ratio * len(x))
+        if nb_replayed > 0 and old_files:
+            old_x, old_y = self.load_training_data([f['path'] for f in old_files], [f['hash'] for f in old_files])
+            replayed = rng.choice(len(old_x), size=min(nb_replayed, len(old_x)), replace=False)
+            x = np.concatenate((x, old_x[replayed]))
+            y = np.concatenate((y, old_y[replayed]))
+        self.train(x, y, learning_rate, max_epochs, batch_size=batch_size, rng=rng)
+        return sorted(list(consumed_files) + new_files, key=lambda f: (f['path'], f['hash']))
+
+    def load_training_data(self, file_paths, file_hashes=None):
+        """
+        Parse a list of game logs into the inputs/outputs used to train the neural network
+        Logs are parsed in parallel and cached (see Dataset.build_dataset)
+
+        @param file_paths: the paths of the 2048 log files
+        @type file_paths: list of str
+        @param file_hashes: (optional) the content hash of each log, from the replay catalog (see list_training_files)
+        @type file_hashes: list of str
+
+        @return: Inputs/Outputs for every history step of every log (None, None if there is no log)
+        @rtype: tuple of (np.array, np.array)
+        """
+        return build_dataset(file_paths, NeuralNetwork.parse_inputs_outputs_for_neural_net, file_hashes=file_hashes)
+
+    @staticmethod
+    def inputs_of_states(states):
+        """
+        Helper method to convert Grid states into the inputs of the neural network, for training and for playing:
+        the canonical form of each Grid state (see Symmetry.canonical_states), scaled by TILE_NUMBER_TO_WIN
+
+        @param states: a (N, n, n) array of Grid states (tile values)
+        @type states: np.array
+        @return: the (N, n * n) inputs and the (N,) symmetries that map the given states to their canonical form
+        @rtype: tuple of (np.array, np.array)
+        """
+        canonical_values, symmetries = canonical_states(states)
+        return canonical_values / TILE_NUMBER_TO_WIN, symmetries
 
     @staticmethod
     def parse_inputs_outputs_for_neural_net(game):
         """
         Helper methode to convert a 2048 log file into a list of (x,y) to train the neural network
+        Grid states are converted into their canonical form (see Symmetry.canonical_states), along with the
+        direction played, and duplicate examples are removed
 
         @param game: An existing 2048 game
         @type game: Game
 
-        @return: Inputs/Outputs for every history step
+        @return: Inputs/Outputs for every distinct history step where a direction was played
         @rtype: tuple of (np.array, np.array)
         """
-        nb_training_examples = len(game.history.grid_history)
-        x = np.zeros((nb_training_examples, game.grid.nb_rows * game.grid.nb_columns))
-        y = np.zeros((nb_training_examples, 1))
-        for i in range(len(game.history.grid_history)):
-            if game.history.direction_state_history[i] in ['Up', 'Down', 'Left', 'Right']:
-                x[i, :] = [float(num) / TILE_NUMBER_TO_WIN for num in game.history.grid_history[i].strip().split(' ')]
-                y[i, :] = [NORMALIZED_DIR_DICT[game.history.direction_state_history[i]]]
-        return x, y
+        history = game.history
+        played = [i for i in range(len(history)) if isinstance(history.direction_state_history[i], Directions)]
+        x = np.zeros((len(played), game.grid.nb_rows * game.grid.nb_columns))
+        y = np.zeros((len(played), 1))
+        if played:
+            # All the Grid states are rebuilt at once as tile exponents (no string is parsed)
+            exponents = history.grid_exponents()[played].reshape(len(played), game.grid.nb_rows, game.grid.nb_columns)
+            x[:, :], symmetries = NeuralNetwork.inputs_of_states(History.values_of(exponents))
+            y[:, 0] = [NORMALIZED_DIR_DICT[transform_direction(history.direction_state_history[i],
+                                                               int(symmetry)).value]
+                       for i, symmetry in zip(played, symmetries)]
+        # Symmetric Grid states with the same (transformed) direction are kept only once
+        _, first_indexes = np.unique(np.hstack((x, y)), axis=0, return_index=True)
+        first_indexes.sort()
+        return x[first_indexes], y[first_indexes]
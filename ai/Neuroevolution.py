@@ -0,0 +1,216 @@
+# coding: utf-8
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import Constants
+from ai.Layer import Layer
+from ai.NeuralNetwork import NeuralNetwork
+from model.BitboardGrid import create_grid
+from model.Game import Game
+
+
+def network_of(layer_shapes, parameters):
+    """
+    Build a neural network from its layer shapes and its flattened weights and biases
+
+    @param layer_shapes: the (n_input, n_neurons) shape of each layer
+    @type layer_shapes: list of list of int
+    @param parameters: the flattened weights and biases (see NeuralNetwork.get_parameters)
+    @type parameters: np.array
+    @return: the neural network
+    @rtype: NeuralNetwork
+    """
+    nn = NeuralNetwork()
+    for n_input, n_neurons in layer_shapes:
+        nn.add_layer(Layer(n_input, n_neurons, weights=np.zeros((n_input, n_neurons)), bias=np.zeros(n_neurons)))
+    nn.set_parameters(parameters)
+    return nn
+
+
+def play_candidate(layer_shapes, parameters, seeds):
+    """
+    Fitness of a candidate network: its mean score over headless games (run by the worker processes of the trainer)
+
+    @param layer_shapes: the (n_input, n_neurons) shape of each layer
+    @type layer_shapes: list of list of int
+    @param parameters: the flattened weights and biases of the candidate
+    @type parameters: np.array
+    @param seeds: the seed of each game (the same seeds for all the candidates of a generation)
+    @type seeds: list of int
+    @return: the mean score and the total number of moves played
+    @rtype: tuple of (float, int)
+    """
+    from ai.Agents import NeuralAgent  # Imported here since ai.Agents imports this module
+    agent = NeuralAgent(network_of(layer_shapes, parameters))
+    scores = list()
+    nb_moves = 0
+    for seed in seeds:
+        game = Game(create_grid(nb_rows_columns=Constants.GRID_NB_ROWS_COLUMNS), init_grid_with_two_tiles=True,
+                    display_grid=False, seed=seed)
+        with np.errstate(over='ignore'):  # Random candidates easily saturate their sigmoids
+            while not game.ended_game:
+                game.play_many_directions(agent.predict(game))
+        scores.append(game.current_score)
+        nb_moves += game.round_count
+    return float(np.mean(scores)), nb_moves
+
+
+class NeuroevolutionTrainer:
+    """
+    A genetic algorithm over the flattened weights and biases of a neural network:
+    at each generation, every candidate plays the same seeded games, the best candidates (elites) are kept and
+    the rest of the population is replaced by mutated copies (gaussian noise) of the elites
+    The population is checkpointed after each generation so that an interrupted training can be resumed
+    """
+
+    def __init__(self, layer_shapes, population_size=Constants.NEUROEVOLUTION_POPULATION_SIZE,
+                 nb_games=Constants.NEUROEVOLUTION_GAMES_PER_CANDIDATE,
+                 elite_fraction=Constants.NEUROEVOLUTION_ELITE_FRACTION,
+                 mutation_std=Constants.NEUROEVOLUTION_MUTATION_STD, seed=None):
+        """
+        @param layer_shapes: the (n_input, n_neurons) shape of each layer of the networks
+        @type layer_shapes: list of list of int
+        @param population_size: the number of candidate networks per generation
+        @type population_size: int
+        @param nb_games: the number of games played by each candidate to measure its fitness
+        @type nb_games: int
+        @param elite_fraction: the fraction of the population kept (and mutated) for the next generation
+        @type elite_fraction: float
+        @param mutation_std: the standard deviation of the gaussian noise added to the parameters
+        @type mutation_std: float
+        @param seed: (optional) the seed of the random generator (mutations and game seeds)
+        @type seed: int
+        """
+        self.layer_shapes = [list(shape) for shape in layer_shapes]
+        self.population_size = population_size
+        self.nb_games = nb_games
+        self.elite_fraction = elite_fraction
+        self.mutation_std = mutation_std
+        self.rng = np.random.default_rng(seed)
+        nb_parameters = sum(n_input * n_neurons + n_neurons for n_input, n_neurons in self.layer_shapes)
+        self.population = self.rng.standard_normal((population_size, nb_parameters))
+        self.generation = 0
+        self.best_parameters = self.population[0].copy()
+        self.best_fitness = float('-inf')
+
+    def evaluate(self, seeds, executor=None):
+        """
+        Measure the fitness of every candidate of the current population
+
+        @param seeds: the seed of each game
+        @type seeds: list of int
+        @param executor: (optional) the pool of worker processes (None to play in the current process)
+        @type executor: ProcessPoolExecutor
+        @return: the (population_size,) fitnesses and the total number of moves played
+        @rtype: tuple of (np.array, int)
+        """
+        arguments = ([self.layer_shapes] * len(self.population), list(self.population), [seeds] * len(self.population))
+        if executor is not None:
+            results = list(executor.map(play_candidate, *arguments))
+        else:
+            results = list(map(play_candidate, *arguments))
+        return np.array([fitness for fitness, _ in results]), sum(nb_moves for _, nb_moves in results)
+
+    def next_population(self, fitnesses):
+        """
+        Build the next generation: the elites followed by mutated copies of randomly chosen elites
+
+        @param fitnesses: the fitness of each candidate of the current population
+        @type fitnesses: np.array
+        @return: the (population_size, nb_parameters) next population
+        @rtype: np.array
+        """
+        nb_elites = max(1, int(round(self.elite_fraction * self.population_size)))
+        elites = self.population[np.argsort(-fitnesses, kind='stable')[:nb_elites]]
+        parents = elites[self.rng.integers(nb_elites, size=self.population_size - nb_elites)]
+        children = parents + self.rng.normal(0.0, self.mutation_std, parents.shape)
+        return np.vstack((elites, children))
+
+    def train(self, nb_generations, nb_workers=1, checkpoint_path=None):
+        """
+        Evolve the population until a given generation (a resumed trainer only plays the missing generations)
+
+        @param nb_generations: the generation to reach
+        @type nb_generations: int
+        @param nb_workers: the number of worker processes evaluating the candidates
+        @type nb_workers: int
+        @param checkpoint_path: (optional) the .npz file where the trainer is saved after each generation
+        @type checkpoint_path: str
+        """
+        executor = ProcessPoolExecutor(max_workers=nb_workers) if nb_workers > 1 else None
+        try:
+            while self.generation < nb_generations:
+                seeds = self.rng.integers(2 ** 31, size=self.nb_games).tolist()
+                start_time = time.perf_counter()
+                fitnesses, nb_moves = self.evaluate(seeds, executor)
+                elapsed_time = time.perf_counter() - start_time
+
+                # The elites are evaluated again on the fresh seeds of each generation: keeping the best fitness ever
+                # measured would rather keep the luckiest candidate (a few games give a noisy fitness)
+                best = int(np.argmax(fitnesses))
+                self.best_fitness = float(fitnesses[best])
+                self.best_parameters = self.population[best].copy()
+                print("Generation #{}: best {:.1f}, mean {:.1f}, {:.1f} games/s, {:.0f} moves/s".format(
+                    self.generation, fitnesses[best], np.mean(fitnesses),
+                    len(self.population) * self.nb_games / elapsed_time, nb_moves / elapsed_time))
+
+                self.population = self.next_population(fitnesses)
+                self.generation += 1
+                if checkpoint_path is not None:
+                    self.save_checkpoint(checkpoint_path)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def best_network(self):
+        """
+        @return: the network of the best candidate of the last generation evaluated
+        @rtype: NeuralNetwork
+        """
+        return network_of(self.layer_shapes, self.best_parameters)
+
+    def save_checkpoint(self, file_path):
+        """
+        Saves the population, the best candidate and the state of the trainer into a .npz file
+
+        @param file_path: the path of the .npz file to write
+        @type file_path: str
+        """
+        Path(os.path.dirname(file_path) or '.').mkdir(parents=True, exist_ok=True)
+        metadata = {'layer_shapes': self.layer_shapes, 'population_size': self.population_size,
+                    'nb_games': self.nb_games, 'elite_fraction': self.elite_fraction,
+                    'mutation_std': self.mutation_std, 'generation': self.generation,
+                    'best_fitness': self.best_fitness, 'rng_state': self.rng.bit_generator.state}
+        # The file is replaced at once so that an interruption never leaves a partial checkpoint
+        temp_file_path = '{}.{}.tmp'.format(file_path, os.getpid())
+        with open(temp_file_path, 'wb') as f:
+            np.savez(f, metadata=np.array(json.dumps(metadata)), population=self.population,
+                     best_parameters=self.best_parameters)
+        os.replace(temp_file_path, file_path)
+
+    @staticmethod
+    def load_checkpoint(file_path):
+        """
+        Loads a trainer saved with save_checkpoint(), to resume its training
+
+        @param file_path: the path of the .npz file to read
+        @type file_path: str
+        @return: the trainer
+        @rtype: NeuroevolutionTrainer
+        """
+        with np.load(file_path) as data:
+            metadata = json.loads(str(data['metadata']))
+            trainer = NeuroevolutionTrainer(metadata['layer_shapes'], population_size=metadata['population_size'],
+                                            nb_games=metadata['nb_games'], elite_fraction=metadata['elite_fraction'],
+                                            mutation_std=metadata['mutation_std'])
+            trainer.population = data['population']
+            trainer.best_parameters = data['best_parameters']
+        trainer.generation = metadata['generation']
+        trainer.best_fitness = metadata['best_fitness']
+        trainer.rng.bit_generator.state = metadata['rng_state']
+        return trainer
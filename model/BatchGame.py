@@ -0,0 +1,109 @@
+# coding: utf-8
+import numpy as np
+
+from model.BatchGrid import BatchGrid
+
+
+class BatchGame:
+    """
+    A BatchGame plays N headless 2048 games at once and consists in:
+        - the current scores, round counts and ended game flags of the N games
+        - a BatchGrid object holding the N grids
+        - the results (score, max tile, rounds, win) of every finished game
+    """
+
+    def __init__(self, nb_games, nb_rows_columns, init_grids_with_two_tiles=True, auto_reset=True, seed=None):
+        """
+        Init method to initialize N new games
+
+        @param nb_games: the number of games played at once (N)
+        @type nb_games: int
+        @param nb_rows_columns: the number of rows and columns of each grid
+        @type nb_rows_columns: int
+        @param init_grids_with_two_tiles: whether or not to generate two random tiles to start each game
+        @type init_grids_with_two_tiles: bool
+        @param auto_reset: whether or not a finished game is recorded and immediately replaced by a new one
+        @type auto_reset: bool
+        @param seed: (optional) the seed of the random generator used to generate new tiles
+        @type seed: int
+        """
+        self.nb_games = nb_games
+        self.auto_reset = auto_reset
+        self.rng = np.random.default_rng(seed)
+        self.grid = BatchGrid(nb_games, nb_rows_columns, rng=self.rng)
+        self.current_scores = np.zeros(nb_games, dtype='int64')
+        self.round_counts = np.zeros(nb_games, dtype='int64')
+        self.ended_games = np.zeros(nb_games, dtype=bool)
+        self.won_games = np.zeros(nb_games, dtype=bool)
+        self.total_moves = 0
+        self.finished_scores = list()
+        self.finished_max_tiles = list()
+        self.finished_round_counts = list()
+        self.finished_wins = list()
+        if init_grids_with_two_tiles:
+            self.grid.reset()
+
+    @property
+    def nb_finished_games(self):
+        """
+        The number of games that have been finished (and recorded) so far
+
+        @return: the number of finished games
+        @rtype: int
+        """
+        return len(self.finished_scores)
+
+    def play_directions(self, directions):
+        """
+        Method to play one move on every running game
+
+        As for Game.play_many_directions, each game can be given several directions sorted by order of preference:
+        the first legal direction is played. Games that are already ended are left untouched.
+
+        @param directions: a (N,) array of direction codes, or a (N, k) array of direction codes sorted by preference
+        @type directions: np.array
+        @return: the score obtained by each game, whether each game has moved and whether each game has just ended
+        @rtype: tuple of (np.array, np.array, np.array)
+        """
+        directions = np.asarray(directions)
+        running = ~self.ended_games
+        if directions.ndim == 1:
+            scores, moved = self.grid.move(directions, mask=running)
+        else:
+            new_grids, all_scores, legal = self.grid.successors()
+            indices = np.arange(self.nb_games)
+            legal_preferences = legal.T[indices[:, None], directions]
+            chosen = directions[indices, np.argmax(legal_preferences, axis=1)]
+            moved = legal_preferences.any(axis=1) & running
+            scores = np.where(moved, all_scores[chosen, indices], 0)
+            self.grid.grids[moved] = new_grids[chosen[moved], indices[moved]]
+
+        self.grid.generate_new_numbers(moved)
+        self.current_scores += scores
+        self.round_counts += moved
+        self.total_moves += int(np.count_nonzero(moved))
+
+        won = self.grid.is_winning() & running
+        just_ended = running & (won | ~self.grid.move_is_still_possible())
+        self.won_games |= won
+        self.ended_games |= just_ended
+        if self.auto_reset and just_ended.any():
+            self.record_and_reset(just_ended)
+        return scores, moved, just_ended
+
+    def record_and_reset(self, mask):
+        """
+        Method to record the results of the selected games and to start new games in their place
+
+        @param mask: a (N,) boolean array of the games to record and reset
+        @type mask: np.array
+        """
+        self.finished_scores.extend(self.current_scores[mask].tolist())
+        self.finished_max_tiles.extend(self.grid.max_tiles()[mask].tolist())
+        self.finished_round_counts.extend(self.round_counts[mask].tolist())
+        self.finished_wins.extend(self.won_games[mask].tolist())
+        self.grid.reset(mask)
+        self.current_scores[mask] = 0
+        self.round_counts[mask] = 0
+        self.ended_games[mask] = False
+        self.won_games[mask] = False
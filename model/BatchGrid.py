@@ -0,0 +1,230 @@
+# coding: utf-8
+import numpy as np
+
+import Constants
+from Constants import Directions
+from model.BitboardGrid import MAX_EXPONENT, exponent_of, merge_rows_left, pack_rows_left
+
+
+class BatchGrid:
+    """
+    This class represents many 2048 grids at once as a single (N, nb_rows, nb_columns) numpy array of tile exponents
+    (0 for an empty tile, 1 for a 2 tile, 2 for a 4 tile, etc.) so that all grids can be moved with a few numpy calls
+    Directions are given as integer codes, i.e. their index in Constants.DIRECTIONS_LIST
+    """
+
+    def __init__(self, nb_grids, nb_rows_columns, rng=None):
+        """
+        Init method to initialize N new empty squared grids
+
+        @param nb_grids: the number of grids (N)
+        @type nb_grids: int
+        @param nb_rows_columns: the number of rows and columns of each grid
+        @type nb_rows_columns: int
+        @param rng: (optional) the numpy random generator used to generate new tiles
+        @type rng: np.random.Generator
+        """
+        self.nb_grids = nb_grids
+        self.nb_rows = nb_rows_columns
+        self.nb_columns = nb_rows_columns
+        self.grids = np.zeros((nb_grids, nb_rows_columns, nb_rows_columns), dtype='uint8')
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    @property
+    def values(self):
+        """
+        The tile values of all grids (as stored in the Grid class)
+
+        @return: a (N, nb_rows, nb_columns) array of tile values
+        @rtype: np.array
+        """
+        return np.where(self.grids > 0, np.left_shift(1, self.grids.astype('int64')), 0)
+
+    @staticmethod
+    def exponents_of(values):
+        """
+        Utility method to convert tile values (as stored in the Grid class) into tile exponents
+
+        @param values: an array of tile values (0, 2, 4, 8, ...)
+        @type values: np.array
+        @return: an array of tile exponents with the same shape
+        @rtype: np.array
+        """
+        return np.log2(np.maximum(values, 1)).round().astype('uint8')
+
+    @staticmethod
+    def _to_left(grids, direction):
+        """
+        Utility method to get a view of the grids where the given direction becomes a LEFT move
+
+        @param grids: a (N, nb_rows, nb_columns) array of tile exponents
+        @type grids: np.array
+        @param direction: one of the defined directions from the Constants file
+        @type direction: Constants.Directions
+        @return: the transformed view
+        @rtype: np.array
+        """
+        if direction == Directions.RIGHT:
+            return grids[:, :, ::-1]
+        elif direction == Directions.UP:
+            return grids.transpose(0, 2, 1)
+        elif direction == Directions.DOWN:
+            return grids.transpose(0, 2, 1)[:, :, ::-1]
+        return grids
+
+    @staticmethod
+    def _from_left(grids, direction):
+        """
+        Utility method to undo the transformation made by the _to_left method
+
+        @param grids: a (N, nb_rows, nb_columns) array of tile exponents
+        @type grids: np.array
+        @param direction: one of the defined directions from the Constants file
+        @type direction: Constants.Directions
+        @return: the transformed view
+        @rtype: np.array
+        """
+        if direction == Directions.DOWN:
+            return grids[:, :, ::-1].transpose(0, 2, 1)
+        return BatchGrid._to_left(grids, direction)
+
+    @staticmethod
+    def move_grids(grids, direction):
+        """
+        Vectorized method to play the same direction on many grids (pack, merge and pack again)
+
+        @param grids: a (N, nb_rows, nb_columns) array of tile exponents (not modified)
+        @type grids: np.array
+        @param direction: one of the defined directions from the Constants file
+        @type direction: Constants.Directions
+        @return: the new grids and the score obtained by each grid
+        @rtype: tuple of (np.array, np.array)
+        """
+        view = BatchGrid._to_left(grids, direction)
+        nb_grids, nb_lines, line_length = view.shape
+        rows = pack_rows_left(view.reshape(nb_grids * nb_lines, line_length))
+        scores = merge_rows_left(rows, max_exponent=MAX_EXPONENT)
+        rows = pack_rows_left(rows)
+        new_view = rows.reshape(nb_grids, nb_lines, line_length)
+        new_grids = np.ascontiguousarray(BatchGrid._from_left(new_view, direction))
+        return new_grids, scores.reshape(nb_grids, nb_lines).sum(axis=1)
+
+    @staticmethod
+    def successors_of(grids):
+        """
+        Vectorized method to compute, without modifying the grids, the result of the four directions on many grids
+        All the rows of all the directions are packed and merged at once
+
+        @param grids: a (N, nb_rows, nb_columns) array of tile exponents (not modified)
+        @type grids: np.array
+        @return: the new grids (4, N, nb_rows, nb_columns), the scores obtained (4, N) and the legal moves (4, N),
+                 indexed by direction code
+        @rtype: tuple of (np.array, np.array, np.array)
+        """
+        views = np.stack([BatchGrid._to_left(grids, direction) for direction in Constants.DIRECTIONS_LIST])
+        rows = pack_rows_left(views.reshape(-1, views.shape[3]))
+        scores = merge_rows_left(rows, max_exponent=MAX_EXPONENT)
+        rows = pack_rows_left(rows)
+        new_views = rows.reshape(views.shape)
+        new_grids = np.empty((len(Constants.DIRECTIONS_LIST),) + grids.shape, dtype=grids.dtype)
+        for code, direction in enumerate(Constants.DIRECTIONS_LIST):
+            new_grids[code] = BatchGrid._from_left(new_views[code], direction)
+        scores = scores.reshape(views.shape[:3]).sum(axis=2)
+        legal = np.any(new_grids != grids[None], axis=(2, 3))
+        return new_grids, scores, legal
+
+    def successors(self):
+        """
+        Method to compute, without modifying the grids, the result of the four directions on every grid
+
+        @return: the new grids (4, N, nb_rows, nb_columns), the scores obtained (4, N) and the legal moves (4, N),
+                 indexed by direction code
+        @rtype: tuple of (np.array, np.array, np.array)
+        """
+        return self.successors_of(self.grids)
+
+    def move(self, direction_codes, mask=None):
+        """
+        Method to play one direction per grid
+
+        @param direction_codes: a (N,) array of direction codes
+        @type direction_codes: np.array
+        @param mask: (optional) a (N,) boolean array of the grids to move (all grids by default)
+        @type mask: np.array
+        @return: the score obtained by each grid and whether each grid has changed
+        @rtype: tuple of (np.array, np.array)
+        """
+        scores = np.zeros(self.nb_grids, dtype='int64')
+        moved = np.zeros(self.nb_grids, dtype=bool)
+        for code, direction in enumerate(Constants.DIRECTIONS_LIST):
+            selected = direction_codes == code
+            if mask is not None:
+                selected &= mask
+            if not selected.any():
+                continue
+            new_grids, scores[selected] = self.move_grids(self.grids[selected], direction)
+            moved[selected] = np.any(new_grids != self.grids[selected], axis=(1, 2))
+            self.grids[selected] = new_grids
+        return scores, moved
+
+    def generate_new_numbers(self, mask=None):
+        """
+        Method to generate a new tile (either a 2 or a 4 tile) on a random free position of each selected grid
+
+        @param mask: (optional) a (N,) boolean array of the grids that receive a new tile (all grids by default)
+        @type mask: np.array
+        """
+        free = (self.grids == 0).reshape(self.nb_grids, -1)
+        selected = free.any(axis=1)
+        if mask is not None:
+            selected &= mask
+        # Taking the argmax of random keys restricted to free positions picks a free position uniformly
+        keys = self.rng.random(free.shape) * free
+        positions = np.argmax(keys, axis=1)[selected]
+        exponents = self.rng.integers(1, 3, size=positions.shape[0], dtype='uint8')
+        flat_grids = self.grids.reshape(self.nb_grids, -1)
+        flat_grids[np.nonzero(selected)[0], positions] = exponents
+
+    def reset(self, mask=None):
+        """
+        Method to empty the selected grids and start them again with two random tiles
+
+        @param mask: (optional) a (N,) boolean array of the grids to reset (all grids by default)
+        @type mask: np.array
+        """
+        if mask is None:
+            mask = np.ones(self.nb_grids, dtype=bool)
+        self.grids[mask] = 0
+        self.generate_new_numbers(mask)
+        self.generate_new_numbers(mask)
+
+    def move_is_still_possible(self):
+        """
+        Method to determine, for each grid, if a move is still possible (free position or two equal adjacent tiles)
+
+        @return: a (N,) boolean array
+        @rtype: np.array
+        """
+        grids = self.grids
+        return np.any(grids == 0, axis=(1, 2)) | \
+            np.any(grids[:, :, 1:] == grids[:, :, :-1], axis=(1, 2)) | \
+            np.any(grids[:, 1:, :] == grids[:, :-1, :], axis=(1, 2))
+
+    def is_winning(self):
+        """
+        Method to determine, for each grid, if at least one tile reached the TILE_NUMBER_TO_WIN value
+
+        @return: a (N,) boolean array
+        @rtype: np.array
+        """
+        return np.any(self.grids >= exponent_of(Constants.TILE_NUMBER_TO_WIN), axis=(1, 2))
+
+    def max_tiles(self):
+        """
+        Method to get the maximum tile value of each grid
+
+        @return: a (N,) array of tile values
+        @rtype: np.array
+        """
+        max_exponents = self.grids.reshape(self.nb_grids, -1).max(axis=1).astype('int64')
+        return np.where(max_exponents > 0, np.left_shift(1, max_exponents), 0)
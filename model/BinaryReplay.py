@@ -0,0 +1,260 @@
+# coding: utf-8
+import struct
+
+import numpy as np
+
+from Constants import DIRECTIONS_LIST, GAME_TYPES, States
+from model.History import History
+
+# Binary replay layout (little-endian):
+#   - a 13-byte header: magic, version, nb rows, nb columns, final state code, agent code, nb of Grid states
+#     (version 1 headers have no agent code)
+#   - the Grid states: 4-bit tile exponents, two tiles per byte (8 bytes per 4x4 Grid)
+#   - the directions played: 2-bit codes (index in Constants.DIRECTIONS_LIST), four directions per byte
+#   - the direction indexes (0: first choice, 3: last choice): 2-bit codes, four indexes per byte
+#   - the score increments between two Grid states: unsigned LEB128 varints
+BINARY_REPLAY_EXTENSION = '.bin'
+MAGIC = b'2048'
+VERSION = 2
+HEADER_FORMATS = {1: '<4sBBBBI', 2: '<4sBBBBBI'}
+HEADER_FORMAT = HEADER_FORMATS[VERSION]
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+FINAL_STATE_CODES = {None: 0, States.WIN: 1, States.LOOSE: 2}
+FINAL_STATES = {code: state for state, code in FINAL_STATE_CODES.items()}
+# The kind of game (agent) of a replay: 0 when unknown, else its rank in Constants.GAME_TYPES (starting from 1)
+AGENT_CODES = dict([(None, 0)] + [(game_type, i + 1) for i, game_type in enumerate(GAME_TYPES)])
+AGENTS = {code: game_type for game_type, code in AGENT_CODES.items()}
+
+
+def pack_nibbles(exponents):
+    """
+    Pack tile exponents two by two into bytes
+
+    @param exponents: a (N, nb_tiles) array of tile exponents (between 0 and 15)
+    @type exponents: np.array
+    @return: a (N, ceil(nb_tiles / 2)) array of bytes
+    @rtype: np.array
+    """
+    if exponents.size and exponents.max() > 15:
+        raise ValueError("Tiles above 32768 cannot be stored in a binary replay")
+    if exponents.shape[1] % 2:
+        exponents = np.pad(exponents, ((0, 0), (0, 1)))
+    exponents = exponents.astype('uint8')
+    return exponents[:, 0::2] | (exponents[:, 1::2] << 4)
+
+
+def unpack_nibbles(packed, nb_tiles):
+    """
+    Unpack bytes into tile exponents (inverse of pack_nibbles)
+
+    @param packed: a (N, nb_bytes) array of bytes
+    @type packed: np.array
+    @param nb_tiles: the number of tiles per Grid
+    @type nb_tiles: int
+    @return: a (N, nb_tiles) array of tile exponents
+    @rtype: np.array
+    """
+    exponents = np.empty((packed.shape[0], 2 * packed.shape[1]), dtype='uint8')
+    exponents[:, 0::2] = packed & 0x0F
+    exponents[:, 1::2] = packed >> 4
+    return exponents[:, :nb_tiles]
+
+
+def pack_2bit_codes(codes):
+    """
+    Pack 2-bit codes four by four into bytes
+
+    @param codes: a 1D array of codes (between 0 and 3)
+    @type codes: np.array
+    @return: a 1D array of ceil(len(codes) / 4) bytes
+    @rtype: np.array
+    """
+    codes = np.asarray(codes, dtype='uint8')
+    padded = np.zeros(4 * ((len(codes) + 3) // 4), dtype='uint8')
+    padded[:len(codes)] = codes
+    padded = padded.reshape(-1, 4)
+    return padded[:, 0] | (padded[:, 1] << 2) | (padded[:, 2] << 4) | (padded[:, 3] << 6)
+
+
+def unpack_2bit_codes(packed, nb_codes):
+    """
+    Unpack bytes into 2-bit codes (inverse of pack_2bit_codes)
+
+    @param packed: a 1D array of bytes
+    @type packed: np.array
+    @param nb_codes: the number of codes to unpack
+    @type nb_codes: int
+    @return: a 1D array of codes
+    @rtype: np.array
+    """
+    shifts = np.array([0, 2, 4, 6], dtype='uint8')
+    return ((packed[:, None] >> shifts) & 0x03).ravel()[:nb_codes]
+
+
+def encode_varints(values):
+    """
+    Encode non-negative integers as unsigned LEB128 varints (7 bits per byte, high bit set on all but the last byte)
+
+    @param values: the integers to encode
+    @type values: list of int
+    @return: the encoded bytes
+    @rtype: bytes
+    """
+    encoded = bytearray()
+    for value in values:
+        value = int(value)
+        while value >= 0x80:
+            encoded.append((value & 0x7F) | 0x80)
+            value >>= 7
+        encoded.append(value)
+    return bytes(encoded)
+
+
+def decode_varints(data):
+    """
+    Decode unsigned LEB128 varints without any loop over the values
+
+    @param data: a 1D array of bytes containing complete varints only
+    @type data: np.array
+    @return: the decoded integers
+    @rtype: np.array
+    """
+    data = np.asarray(data, dtype='int64')
+    if len(data) == 0:
+        return np.zeros(0, dtype='int64')
+    is_last = data < 0x80
+    # Each byte belongs to the varint ending at the next byte without the high bit
+    varint_ids = np.concatenate(([0], np.cumsum(is_last)[:-1]))
+    first_byte = np.concatenate(([0], np.nonzero(is_last)[0][:-1] + 1))
+    positions = np.arange(len(data)) - first_byte[varint_ids]
+    values = np.zeros(int(np.count_nonzero(is_last)), dtype='int64')
+    np.add.at(values, varint_ids, (data & 0x7F) << (7 * positions))
+    return values
+
+
+def write_replay(history, file_path, agent_type=None):
+    """
+    Write the History of a Game into a binary replay file
+
+    @param history: the History of a Game
+    @type history: History
+    @param file_path: the path of the binary replay file to write
+    @type file_path: str
+    @param agent_type: (optional) the kind of game (e.g., 'HUMAN', see ReplayCatalog)
+    @type agent_type: str
+    """
+    if history.first_round > 0:
+        raise ValueError("The oldest rounds of this History are no longer in memory")
+    nb_states = len(history)
+    exponents = history.grid_exponents()
+
+    directions = history.direction_state_history[:nb_states - 1]
+    indexes = history.direction_index_history[:nb_states - 1]
+    final_state = None
+    if len(history.direction_state_history) >= nb_states and \
+            isinstance(history.direction_state_history[nb_states - 1], States):
+        final_state = history.direction_state_history[nb_states - 1]
+    scores = np.diff(np.array(history.score_history, dtype='int64'), prepend=0)
+
+    with open(file_path, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, history.nb_rows, history.nb_columns,
+                            FINAL_STATE_CODES[final_state], AGENT_CODES[agent_type], nb_states))
+        f.write(pack_nibbles(exponents).tobytes())
+        f.write(pack_2bit_codes([DIRECTIONS_LIST.index(d) for d in directions]).tobytes())
+        f.write(pack_2bit_codes(indexes).tobytes())
+        f.write(encode_varints(scores))
+
+
+def read_header(data):
+    """
+    Parse the header of a binary replay (of any version)
+
+    @param data: the content of a binary replay (e.g., a memory-mapped file)
+    @type data: np.array
+    @return: the nb of rows, the nb of columns, the final state (or None), the nb of Grid states, the kind of game
+             (or None) and the size of the header
+    @rtype: tuple of (int, int, Constants.States, int, str, int)
+    """
+    magic, version = struct.unpack('<4sB', bytes(data[:5]))
+    if magic != MAGIC or version not in HEADER_FORMATS:
+        raise ValueError("Not a binary replay (magic {!r}, version {})".format(magic, version))
+    header_format = HEADER_FORMATS[version]
+    header_size = struct.calcsize(header_format)
+    fields = struct.unpack(header_format, bytes(data[:header_size]))
+    if version == 1:
+        _, _, nb_rows, nb_columns, final_state_code, nb_states = fields
+        agent_code = 0
+    else:
+        _, _, nb_rows, nb_columns, final_state_code, agent_code, nb_states = fields
+    return nb_rows, nb_columns, FINAL_STATES[final_state_code], nb_states, AGENTS.get(agent_code), header_size
+
+
+def read_boards(file_path, as_exponents=False):
+    """
+    Read all the Grid states of a binary replay at once through a memory-mapped file
+
+    @param file_path: the path of the binary replay file
+    @type file_path: str
+    @param as_exponents: whether to return tile exponents (uint8) instead of tile values
+    @type as_exponents: bool
+    @return: a (nb_states, nb_rows * nb_columns) array with one Grid state per line
+    @rtype: np.array
+    """
+    data = np.memmap(file_path, dtype='uint8', mode='r')
+    nb_rows, nb_columns, _, nb_states, _, header_size = read_header(data)
+    nb_tiles = nb_rows * nb_columns
+    board_size = (nb_tiles + 1) // 2
+    packed = data[header_size:header_size + nb_states * board_size].reshape(nb_states, board_size)
+    exponents = unpack_nibbles(packed, nb_tiles)
+    if as_exponents:
+        return exponents
+    return np.where(exponents > 0, np.left_shift(1, exponents.astype('int64')), 0)
+
+
+def read_replay(file_path):
+    """
+    Read a complete binary replay into a History object
+
+    @param file_path: the path of the binary replay file
+    @type file_path: str
+    @return: the History stored in the binary replay
+    @rtype: History
+    """
+    data = np.memmap(file_path, dtype='uint8', mode='r')
+    nb_rows, nb_columns, final_state, nb_states, _, header_size = read_header(data)
+    offset = header_size + nb_states * ((nb_rows * nb_columns + 1) // 2)
+    nb_directions = max(nb_states - 1, 0)
+    codes_size = (nb_directions + 3) // 4
+    directions = unpack_2bit_codes(data[offset:offset + codes_size], nb_directions)
+    indexes = unpack_2bit_codes(data[offset + codes_size:offset + 2 * codes_size], nb_directions)
+    scores = np.cumsum(decode_varints(data[offset + 2 * codes_size:]))
+
+    history = History(nb_rows, nb_columns)
+    for i, exponents in enumerate(read_boards(file_path, as_exponents=True)):
+        history.add_grid_exponents(exponents, int(scores[i]))
+        if i < nb_directions:
+            history.add_direction_or_state(DIRECTIONS_LIST[directions[i]], int(indexes[i]))
+    if final_state is not None:
+        history.add_direction_or_state(final_state, -1)
+    return history
+
+
+def convert_log_to_binary(log_file_path, binary_file_path=None):
+    """
+    Convert a text game log (see Game.save_game) into a binary replay, keeping its kind of game (see ReplayCatalog)
+
+    @param log_file_path: the path of the text game log
+    @type log_file_path: str
+    @param binary_file_path: (optional) the path of the binary replay (same path with a .bin extension by default)
+    @type binary_file_path: str
+    @return: the path of the binary replay written
+    @rtype: str
+    """
+    from model.Game import Game  # Game depends on this module to load binary replays
+    from model.ReplayCatalog import agent_of
+
+    if binary_file_path is None:
+        binary_file_path = log_file_path.rsplit('.', 1)[0] + BINARY_REPLAY_EXTENSION
+    game = Game.load_game(log_file_path, display_grid=False)
+    write_replay(game.history, binary_file_path, agent_type=agent_of(log_file_path))
+    return binary_file_path
@@ -0,0 +1,465 @@
+# coding: utf-8
+import random
+
+import numpy as np
+
+import Constants
+from Constants import Directions
+from model.Grid import Grid
+
+# A 4x4 board is packed into a single 64-bit integer where each tile is stored as a 4-bit exponent
+# (0 for an empty tile, 1 for a 2 tile, 2 for a 4 tile, ..., 15 for a 32768 tile, see Grid.MAX_TILE_NUMBER).
+# The tile located at (r, c) is stored in the nibble number 4 * r + c (starting from the least significant bits)
+BITBOARD_SIZE = 4
+MAX_EXPONENT = 15
+ROW_MASK = 0xFFFF
+NIBBLE_MASK = 0xF
+TILE_VALUES = [0] + [2 ** e for e in range(1, MAX_EXPONENT + 1)]
+TILE_STRINGS = [str(v) for v in TILE_VALUES]
+
+
+def pack_rows_left(rows):
+    """
+    Vectorized method to pack all tiles of several rows to the left (without merging them)
+
+    @param rows: a 2D array of tile exponents, one row per line
+    @type rows: np.array
+    @return: the packed rows
+    @rtype: np.array
+    """
+    order = np.argsort(rows == 0, axis=1, kind='stable')
+    return np.take_along_axis(rows, order, axis=1)
+
+
+def merge_rows_left(rows, max_exponent=None):
+    """
+    Vectorized method to merge adjacent tiles of several rows to the left
+    As for Grid.merge, this method may leave holes and should be followed by a call to pack_rows_left
+
+    @param rows: a 2D array of tile exponents, one row per line (modified in place)
+    @type rows: np.array
+    @param max_exponent: (optional) tiles with this exponent cannot be merged anymore
+    @type max_exponent: int
+    @return: the score obtained for each row
+    @rtype: np.array
+    """
+    scores = np.zeros(rows.shape[0], dtype='int64')
+    for c in range(rows.shape[1] - 1):
+        mergeable = (rows[:, c] == rows[:, c + 1]) & (rows[:, c] != 0)
+        if max_exponent is not None:
+            mergeable &= rows[:, c] < max_exponent
+        rows[mergeable, c] += 1
+        rows[mergeable, c + 1] = 0
+        scores += np.where(mergeable, np.left_shift(1, rows[:, c].astype('int64')), 0)
+    return scores
+
+
+def _build_row_tables():
+    """
+    Precompute the result of every possible move for the 65,536 possible rows of a 4x4 bitboard
+
+    @return: for each (operation, direction), a tuple (row table, row score table, whether to transpose first)
+    @rtype: dict
+    """
+    all_rows = np.arange(ROW_MASK + 1, dtype='int64')
+    shifts = 4 * np.arange(BITBOARD_SIZE, dtype='int64')
+    nibbles = ((all_rows[:, None] >> shifts) & NIBBLE_MASK).astype('uint8')
+
+    def encode(t_nibbles):
+        return (t_nibbles.astype('int64') << shifts).sum(axis=1)
+
+    tables = dict()
+    for directions, t_nibbles in (((Directions.LEFT, Directions.UP), nibbles),
+                                  ((Directions.RIGHT, Directions.DOWN), nibbles[:, ::-1])):
+        packed = pack_rows_left(t_nibbles)
+        merged = t_nibbles.copy()
+        merge_score = merge_rows_left(merged, max_exponent=MAX_EXPONENT)
+        moved = packed.copy()
+        move_score = merge_rows_left(moved, max_exponent=MAX_EXPONENT)
+        moved = pack_rows_left(moved)
+        no_score = [0] * (ROW_MASK + 1)
+        if directions[0] == Directions.RIGHT:
+            packed, merged, moved = packed[:, ::-1], merged[:, ::-1], moved[:, ::-1]
+        operations = {'pack': (encode(packed).tolist(), no_score),
+                      'merge': (encode(merged).tolist(), merge_score.tolist()),
+                      'move': (encode(moved).tolist(), move_score.tolist())}
+        for operation, (table, score_table) in operations.items():
+            # Vertical directions use the same tables on the transposed bitboard
+            tables[operation, directions[0]] = (table, score_table, False)
+            tables[operation, directions[1]] = (table, score_table, True)
+    return tables
+
+
+_ROW_TABLES = None
+_MOVE_TABLES = None  # The (row table, row score table) of the complete LEFT and RIGHT moves, for board_successors
+# The two tile exponents stored in each of the 256 possible bytes of a bitboard (least significant nibble first)
+BYTE_EXPONENTS = np.array([[b & NIBBLE_MASK, b >> 4] for b in range(256)], dtype='uint8')
+TILE_VALUE_ARRAY = np.array(TILE_VALUES, dtype='int64')
+ONE_PER_NIBBLE = 0x1111111111111111
+HIGH_BIT_PER_NIBBLE = 0x8888888888888888
+
+
+def row_tables():
+    """
+    Lazily build (only once per process) and return the precomputed row tables
+
+    @return: for each (operation, direction), a tuple (row table, row score table, whether to transpose first)
+    @rtype: dict
+    """
+    global _ROW_TABLES, _MOVE_TABLES
+    if _ROW_TABLES is None:
+        _ROW_TABLES = _build_row_tables()
+        _MOVE_TABLES = _ROW_TABLES['move', Directions.LEFT][:2] + _ROW_TABLES['move', Directions.RIGHT][:2]
+    return _ROW_TABLES
+
+
+def has_empty_nibble(board):
+    """
+    Determine with a few mask operations whether a bitboard holds at least one empty (0) tile
+
+    @param board: a 64-bit bitboard
+    @type board: int
+    @return: whether or not one of the 16 nibbles is 0
+    @rtype: bool
+    """
+    # Subtracting 1 from each nibble only sets the high bit of a nibble that was 0 (or below a borrowing one)
+    return ((board - ONE_PER_NIBBLE) & ~board & HIGH_BIT_PER_NIBBLE) != 0
+
+
+def transpose(board):
+    """
+    Transpose a 4x4 bitboard (rows become columns) with a few mask and shift operations
+
+    @param board: a 64-bit bitboard
+    @type board: int
+    @return: the transposed bitboard
+    @rtype: int
+    """
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def move_board(board, direction, operation='move'):
+    """
+    Apply an operation (pack, merge or the complete move) on a bitboard according to the given direction
+
+    @param board: a 64-bit bitboard
+    @type board: int
+    @param direction: one of the defined directions from the Constants file
+    @type direction: Constants.Directions
+    @param operation: 'pack' (like Grid.move_tiles), 'merge' (like Grid.merge) or 'move' (pack, merge and pack)
+    @type operation: str
+    @return: the new bitboard and the score obtained
+    @rtype: tuple of (int, int)
+    """
+    table, score_table, vertical = row_tables()[operation, direction]
+    if vertical:
+        board = transpose(board)
+    r0 = board & ROW_MASK
+    r1 = (board >> 16) & ROW_MASK
+    r2 = (board >> 32) & ROW_MASK
+    r3 = (board >> 48) & ROW_MASK
+    new_board = table[r0] | (table[r1] << 16) | (table[r2] << 32) | (table[r3] << 48)
+    score = score_table[r0] + score_table[r1] + score_table[r2] + score_table[r3]
+    if vertical:
+        new_board = transpose(new_board)
+    return new_board, score
+
+
+def board_successors(board):
+    """
+    Compute the result of the four directions on a bitboard
+
+    @param board: a 64-bit bitboard
+    @type board: int
+    @return: for each direction of Constants.DIRECTIONS_LIST (in that order), a tuple with the new bitboard,
+             the score obtained and whether the move is legal (i.e. at least one tile moved)
+    @rtype: list of tuple of (int, int, bool)
+    """
+    if _MOVE_TABLES is None:
+        row_tables()
+    left, left_scores, right, right_scores = _MOVE_TABLES
+    # UP and DOWN are the LEFT and RIGHT moves of the transposed bitboard: rows are split only once per orientation
+    transposed = transpose(board)
+    successors = list()
+    for source, vertical in ((transposed, True), (board, False)):
+        r0 = source & ROW_MASK
+        r1 = (source >> 16) & ROW_MASK
+        r2 = (source >> 32) & ROW_MASK
+        r3 = (source >> 48) & ROW_MASK
+        for table, score_table in ((left, left_scores), (right, right_scores)):
+            new_board = table[r0] | (table[r1] << 16) | (table[r2] << 32) | (table[r3] << 48)
+            if new_board == source:
+                successors.append((board, 0, False))
+                continue
+            if vertical:
+                new_board = transpose(new_board)
+            successors.append((new_board, score_table[r0] + score_table[r1] + score_table[r2] + score_table[r3],
+                               True))
+    return successors
+
+
+def exponent_of(value):
+    """
+    Utility method to get the exponent of a tile value (0 for an empty tile)
+
+    @param value: a tile value (0, 2, 4, 8, ...)
+    @type value: int
+    @return: the associated exponent
+    @rtype: int
+    """
+    return int(value).bit_length() - 1 if value > 0 else 0
+
+
+class BitboardGrid(Grid):
+    """
+    This class represents a 4x4 2048 grid packed into a single 64-bit integer (4 bits per tile)
+    It replaces the Grid class: moves are computed with precomputed row tables
+    Unlike the Grid class, its grid attribute is a read-only copy of the tiles (see the grid property)
+    """
+
+    def __init__(self, nb_rows_columns=BITBOARD_SIZE, t_str_grid=None):
+        """
+        Init method to initialize a new 4x4 BitboardGrid object
+
+        @param nb_rows_columns: the number of rows and columns (only 4 is supported)
+        @type nb_rows_columns: int
+        @param t_str_grid: (optional) an inline string representation of an existing Grid
+        @type t_str_grid: str
+        """
+        if nb_rows_columns != BITBOARD_SIZE:
+            raise ValueError("A BitboardGrid only supports {0}x{0} grids".format(BITBOARD_SIZE))
+        self.nb_rows = BITBOARD_SIZE
+        self.nb_columns = BITBOARD_SIZE
+        self.board = 0
+        self._successors = (None, None)  # (bitboard, successors) of the last call to the successors method
+        self._exponents = (None, None, None)  # (bitboard, exponents, values) of the last Grid state converted
+        row_tables()
+        if t_str_grid is not None:
+            self.grid = Grid.from_string(t_str_grid, self.nb_rows, self.nb_columns)
+
+    @property
+    def grid(self):
+        """
+        The numpy representation (tile values) of this Grid, as for the Grid class
+        The array is read-only (writing a tile raises a ValueError): the tiles are changed through the setter,
+        set_exponents or set_state
+
+        @return: a read-only 4x4 numpy array of tile values
+        @rtype: np.array
+        """
+        exponents = self._cached_exponents()
+        values = self._exponents[2]
+        if values is None:
+            values = TILE_VALUE_ARRAY[exponents].reshape(self.nb_rows, self.nb_columns)
+            values.flags.writeable = False
+            self._exponents = (self.board, exponents, values)
+        return values
+
+    @grid.setter
+    def grid(self, values):
+        board = 0
+        for i, value in enumerate(np.ravel(values)):
+            board |= exponent_of(value) << (4 * i)
+        self.board = board
+
+    def to_exponents(self):
+        """
+        Utility method to get the tile exponents of this Grid (0 for an empty tile, 1 for a 2 tile, 2 for a 4 tile, ...)
+
+        @return: a flat uint8 numpy array of 16 tile exponents (a new array, that the caller may modify)
+        @rtype: np.array
+        """
+        return self._cached_exponents().copy()
+
+    def _cached_exponents(self):
+        """
+        Convert the bitboard into tile exponents, only once per Grid state
+
+        @return: the read-only flat array of 16 tile exponents
+        @rtype: np.array
+        """
+        if self._exponents[0] != self.board:
+            # Tiles (r, c) are stored from the least significant bits: bytes hold two tiles each in little-endian order
+            exponents = BYTE_EXPONENTS[np.frombuffer(self.board.to_bytes(8, 'little'), dtype='uint8')].ravel()
+            exponents.flags.writeable = False
+            self._exponents = (self.board, exponents, None)
+        return self._exponents[1]
+
+    def set_exponents(self, exponents):
+        """
+        Utility method to set the tiles of this Grid from tile exponents (inverse of to_exponents)
+
+        @param exponents: 16 tile exponents
+        @type exponents: np.array
+        """
+        exponents = np.asarray(exponents, dtype='uint8').ravel()
+        packed = exponents[0::2] | (exponents[1::2] << 4)
+        self.board = int(packed.view('<u8')[0])
+
+    def set_state(self, state):
+        """
+        Utility method to replace the tiles of this Grid by a state returned by the successors method
+
+        @param state: a 64-bit bitboard
+        @type state: int
+        """
+        self.board = state
+
+    def successors(self):
+        """
+        Method to compute the result of the four directions without modifying this Grid
+
+        @return: for each direction of Constants.DIRECTIONS_LIST (in that order), a tuple with the new bitboard
+                 (see set_state), the score obtained and whether the move is legal (i.e. at least one tile moved)
+        @rtype: list of tuple of (int, int, bool)
+        """
+        # The result is kept until the Grid changes (e.g., the agent and the Game both need it at each round)
+        if self._successors[0] != self.board:
+            self._successors = (self.board, board_successors(self.board))
+        return self._successors[1]
+
+    def __str__(self):
+        """
+        Utility method to print the current state of this Grid
+
+        @return: a matrix-like str with line breaks for debugging
+        @rtype: str
+        """
+        rows = list()
+        for r in range(self.nb_rows):
+            row = (self.board >> (16 * r)) & ROW_MASK
+            rows.append("".join("{}\t".format(TILE_STRINGS[(row >> (4 * c)) & NIBBLE_MASK])
+                                for c in range(self.nb_columns)))
+        return "\n".join(rows) + "\n"
+
+    def to_string(self):
+        """
+        Utility method to get the current inline string representation of this Grid
+
+        @return: the current inline string representation of this Grid
+        @rtype: str
+        """
+        board = self.board
+        return " ".join([TILE_STRINGS[(board >> (4 * i)) & NIBBLE_MASK] for i in range(16)])
+
+    def return_free_positions(self):
+        """
+        Method to get all free positions of a Grid object
+        A position is a (x,y) tuple where x refers to the position among rows while y refers to position among columns
+
+        @return: a list of free positions
+        @rtype: list of tuples
+        """
+        board = self.board
+        return [(i >> 2, i & 3) for i in range(16) if not (board >> (4 * i)) & NIBBLE_MASK]
+
+    def generate_new_number(self, remaining_pos, rng=random):
+        """
+        Method to generate a new tile (either a 2 or a 4 tile) and add it to the current grid
+        The new tile is chosen from the remaining positions given in parameter
+
+        @param remaining_pos: a list of tuples representing free positions
+        @type remaining_pos: list of tuples
+        @param rng: (optional) the random generator drawing the new tile (default: the global random module)
+        @type rng: random.Random
+        @return: the position (row, column) and the value of the new tile
+        @rtype: tuple of (int, int, int)
+        """
+        r, c = rng.choice(remaining_pos)
+        exponent = rng.choice([1, 2])
+        self.board |= exponent << (4 * (4 * r + c))
+        return r, c, TILE_VALUES[exponent]
+
+    def grid_still_has_room(self):
+        """
+        Method to determine if at least one position of this Grid is empty (tile with 0 value)
+
+        @return: whether or not at least one tile has the value 0 (empty)
+        @rtype: bool
+        """
+        return has_empty_nibble(self.board)
+
+    def move_is_still_possible(self):
+        """
+        Method to determine if a move is still possible given the current Grid state
+
+        A move is still possible if:
+            - There is at least one free position
+            - There is no free position but two adjacent tiles have the same value
+
+        @return: whether or not a move is still possible
+        @rtype: bool
+        """
+        if self.grid_still_has_room():
+            return True
+        # The successors of a full Grid are kept for the next round (see the successors method)
+        return any(legal for _, _, legal in self.successors())
+
+    def is_winning(self):
+        """
+        Method to determine if the current Grid state is a winning state
+        A Grid is in winning state if at least one of its tiles is equals to the TILE_NUMBER_TO_WIN value defined
+        in the Constants file
+
+        @return: whether or not the player has won
+        @rtype: bool
+        """
+        # A tile holds the winning exponent if and only if that nibble is 0 once XORed with the winning exponent
+        return has_empty_nibble(self.board ^ (exponent_of(Constants.TILE_NUMBER_TO_WIN) * ONE_PER_NIBBLE))
+
+    def move_tiles(self, direction):
+        """
+        Method to pack all tiles of a Grid according to the given direction
+        This method does not merge tiles between them
+
+        @param direction: one of the defined directions from the Constants file
+        @type direction: Constants.Directions
+        """
+        self.board = move_board(self.board, direction, operation='pack')[0]
+
+    def merge(self, direction):
+        """
+        Method to merge adjacent tiles of a Grid according to the given direction
+        This method may leave unrealistic free positions and should be followed by a new call to the move_tiles method
+
+        @param direction: one of the defined directions from the Constants file
+        @type direction: Constants.Directions
+        @return: the score to add to the current score
+        @rtype: int
+        """
+        self.board, score_to_add = move_board(self.board, direction, operation='merge')
+        return score_to_add
+
+    def move(self, direction):
+        """
+        Method to play a complete move (pack, merge and pack again) with a single lookup per row
+
+        @param direction: one of the defined directions from the Constants file
+        @type direction: Constants.Directions
+        @return: the score to add to the current score
+        @rtype: int
+        """
+        self.board, score_to_add = move_board(self.board, direction)
+        return score_to_add
+
+
+def create_grid(nb_rows_columns):
+    """
+    Factory method returning an empty Grid backed by the fastest engine available for the given size
+
+    @param nb_rows_columns: the number of rows and columns
+    @type nb_rows_columns: int
+    @return: a BitboardGrid for 4x4 grids (if enabled in the Constants file), a numpy Grid otherwise
+    @rtype: Grid
+    """
+    if Constants.USE_BITBOARD_GRID and nb_rows_columns == BITBOARD_SIZE \
+            and exponent_of(Constants.TILE_NUMBER_TO_WIN) <= MAX_EXPONENT:
+        return BitboardGrid(nb_rows_columns)
+    return Grid(nb_rows_columns)
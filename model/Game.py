@@ -1,13 +1,18 @@
 # coding: utf-8
+import random
 import re
 import time
 from os import path
 from pathlib import Path
 
 import Constants
-from Constants import States
+from Constants import DIRECTIONS_LIST, Directions, States
+from model.BinaryReplay import BINARY_REPLAY_EXTENSION, read_replay, write_replay
+from model.BitboardGrid import exponent_of
+from model.GameObserver import ConsoleObserver
 from model.Grid import Grid
 from model.History import History
+from model.SeedReplay import SEED_REPLAY_EXTENSION, read_seed_replay, write_seed_replay
 
 
 class Game:
@@ -18,9 +23,13 @@ class Game:
         - a round count variable
         - a Grid object
         - an History object
+        - a list of GameObserver objects notified after each move (formatting is only done by observers)
+        - a seeded random generator drawing all the new tiles, so that a Game can be rebuilt from its seed and
+          the directions played (see replay_moves)
     """
 
-    def __init__(self, grid, init_grid_with_two_tiles, display_grid=True):
+    def __init__(self, grid, init_grid_with_two_tiles, display_grid=True, observers=None, seed=None,
+                 history_window=None):
         """
         Init method to initialize a new Game from an empty Grid object
 
@@ -28,20 +37,33 @@ class Game:
         @type grid: Grid
         @param init_grid_with_two_tiles: whether or not to generate too random tiles to start
         @type init_grid_with_two_tiles: bool
-        @param display_grid: whether or not to print the initial state of the 2048 game
+        @param display_grid: whether or not to print the state of the 2048 game after each move
         @type display_grid: bool
+        @param observers: (optional) the observers to notify (no observer means a silent headless Game)
+        @type observers: list of GameObserver
+        @param seed: (optional) the seed of the random generator of the new tiles (default: drawn from the
+                     global random module)
+        @type seed: int
+        @param history_window: (optional) the number of recent rounds kept in the History (default: all the rounds),
+                               e.g., when the Game is streamed into a log by a ReplayLogObserver
+        @type history_window: int
         """
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.rng = random.Random(self.seed)
         self.current_score = 0
         self.ended_game = False
         self.round_count = 0
         self.grid = grid
-        self.history = History(grid.nb_rows, grid.nb_columns)
-        if init_grid_with_two_tiles:
-            self.grid.generate_new_number(self.grid.return_free_positions())
-            self.grid.generate_new_number(self.grid.return_free_positions())
-            self.history.add_grid_state(self.grid.to_string(), 0)
+        self.history = History(grid.nb_rows, grid.nb_columns, window=history_window)
+        self.observers = list(observers) if observers is not None else list()
         if display_grid:
-            print(self.__repr__())
+            self.observers.append(ConsoleObserver())
+        if init_grid_with_two_tiles:
+            self.grid.generate_new_number(self.grid.return_free_positions(), self.rng)
+            self.grid.generate_new_number(self.grid.return_free_positions(), self.rng)
+            self.history.add_grid_exponents(self.grid.to_exponents(), 0)
+        for observer in self.observers:
+            observer.on_game_started(self)
 
     def __repr__(self):
         """
@@ -55,10 +77,7 @@ class Game:
         @return: Game object representation
         @rtype: str
         """
-        str_to_return = "Round: {}\n".format(self.round_count)
-        str_to_return += "Score: {}\n\n".format(self.current_score)
-        str_to_return += self.grid.__str__()
-        return str_to_return
+        return "Round: {}\nScore: {}\n\n{}".format(self.round_count, self.current_score, self.grid.__str__())
 
     def play_one_direction(self, direction, index_choice):
         """
@@ -72,22 +91,45 @@ class Game:
         @return: whether or not it was a valid move (i.e. at least one tile moved)
         @rtype: bool
         """
-        self.grid.move_tiles(direction)
-        self.current_score += self.grid.merge(direction)
-        self.grid.move_tiles(direction)
-        if self.history.something_moved(self.grid.to_string()):
-            self.history.add_direction_or_state(direction, index_choice)
-            print("Next direction to be played: {}".format(direction.value))
-            print("=======================================")  # To distinguish from next round
-            self.round_count += 1
-            self.grid.generate_new_number(self.grid.return_free_positions())
-            self.history.add_grid_state(self.grid.to_string(), self.current_score)
-            print(self.__repr__())
-            self.check_win_or_loose()
+        self.current_score += self.grid.move(direction)
+        exponents = self.grid.to_exponents()
+        if self.history.something_moved(exponents):
+            self.end_round(direction, index_choice, exponents)
             return True
         else:
             return False
 
+    def end_round(self, direction, index_choice, exponents):
+        """
+        Method to complete a round once a legal direction has been played on the Grid: a new tile is generated,
+        the History is updated and the observers are notified
+
+        @param direction: the direction played
+        @type direction: Constants.Directions
+        @param index_choice: the index of the chosen direction (0 was the first choice, 3 was the last choice)
+        @type index_choice: int
+        @param exponents: the tile exponents of the Grid after the move (see Grid.to_exponents)
+        @type exponents: np.array
+        """
+        self.history.add_direction_or_state(direction, index_choice)
+        self.round_count += 1
+        r, c, value = self.grid.generate_new_number(self.grid.return_free_positions(), self.rng)
+        spawn = (int(r) * self.grid.nb_columns + int(c), exponent_of(value))
+        exponents[spawn[0]] = spawn[1]
+        self.history.add_grid_exponents(exponents, self.current_score, spawn=spawn)
+        for observer in self.observers:
+            observer.on_direction_played(self, direction)
+        self.check_win_or_loose()
+
+    def add_observer(self, observer):
+        """
+        Method to register a new observer notified of the events of this Game
+
+        @param observer: the observer to add
+        @type observer: GameObserver
+        """
+        self.observers.append(observer)
+
     def play_many_directions(self, direction_list):
         """
         Method to play one direction from a list on the Grid object associated to this Game
@@ -97,8 +139,14 @@ class Game:
         @param direction_list: the directions to be played sorted by order of preference (index 0 will be tried first)
         @type direction_list: list of Constants.Directions
         """
-        for i in range(len(direction_list)):
-            if self.play_one_direction(direction_list[i], i):
+        # The result of the four directions is computed at once, without trying them one by one on the Grid
+        successors = self.grid.successors()
+        for i, direction in enumerate(direction_list):
+            state, score, legal = successors[DIRECTIONS_LIST.index(direction)]
+            if legal:
+                self.grid.set_state(state)
+                self.current_score += score
+                self.end_round(direction, i, self.grid.to_exponents())
                 break
 
     def check_win_or_loose(self):
@@ -108,33 +156,103 @@ class Game:
         if self.grid.is_winning():
             self.ended_game = True
             self.history.add_direction_or_state(States.WIN, -1)
-            print("YOU WIN!!!\n")
+            for observer in self.observers:
+                observer.on_game_ended(self, States.WIN)
         elif not self.grid.move_is_still_possible():
             self.ended_game = True
             self.history.add_direction_or_state(States.LOOSE, -1)
-            print("Sorry, you loose...\n")
+            for observer in self.observers:
+                observer.on_game_ended(self, States.LOOSE)
         else:
             # The game continues (i.e. self.ended_game = False)
             pass
 
-    def save_game(self, base_path):
+    def directions_played(self):
+        """
+        @return: the directions played so far, in order (see replay_moves)
+        @rtype: list of Constants.Directions
+        """
+        return [d for d in self.history.direction_state_history if isinstance(d, Directions)]
+
+    @staticmethod
+    def replay_moves(grid, seed, directions, display_grid=False):
+        """
+        Static method to rebuild a Game from its seed and the directions played
+        Both Grid engines draw the same new tiles from the same seed, so that they can be compared on
+        identical games
+
+        @param grid: an empty Grid object (of any engine)
+        @type grid: Grid
+        @param seed: the seed of the Game to rebuild
+        @type seed: int
+        @param directions: the directions played (see directions_played)
+        @type directions: list of Constants.Directions
+        @param display_grid: whether or not to print the state of the 2048 game after each move
+        @type display_grid: bool
+        @return: the rebuilt Game
+        @rtype: Game
+        """
+        game = Game(grid, init_grid_with_two_tiles=True, display_grid=display_grid, seed=seed)
+        for direction in directions:
+            if not game.play_one_direction(direction, 0):
+                raise ValueError("Direction {} cannot be played at round {}".format(direction, game.round_count))
+        return game
+
+    def save_game(self, base_path, binary=False, seed_only=False, agent_type=None):
         """
         Utility method to save the History of a Game into file for later inspection
 
         @param base_path: the complete directory path where to write the log file
         @type base_path: str
+        @param binary: whether to write a compact binary replay (.bin) instead of a text log (.log)
+        @type binary: bool
+        @param seed_only: whether to write a seed replay (.seed) with only the seed and the directions played
+                          (a text log is written instead if the Game cannot be rebuilt from its seed)
+        @type seed_only: bool
+        @param agent_type: (optional) the kind of game (e.g., 'HUMAN'), written in the header of the replay
+        @type agent_type: str
         """
+        if self.history.first_round > 0:
+            raise ValueError("The oldest rounds of this Game are no longer in memory (stream its log instead)")
         Path(base_path).mkdir(parents=True, exist_ok=True)  # Require Python 3.4+
+        if seed_only and self.seed is not None:
+            write_seed_replay(self, path.join(base_path, "{}{}".format(int(time.time()), SEED_REPLAY_EXTENSION)),
+                              agent_type=agent_type)
+            return
+        if binary:
+            write_replay(self.history, path.join(base_path, "{}{}".format(int(time.time()), BINARY_REPLAY_EXTENSION)),
+                         agent_type=agent_type)
+            return
         file_path = path.join(base_path, "{}.log".format(int(time.time())))
         with open(file_path, 'w') as f:
-            f.write("{} {}\n".format(self.grid.nb_rows, self.grid.nb_columns))
+            f.write(Game.log_header(self.grid.nb_rows, self.grid.nb_columns, agent_type))
             f.write(self.history.__repr__())
             f.flush()
 
+    @staticmethod
+    def log_header(nb_rows, nb_columns, agent_type=None):
+        """
+        Utility method to get the first line of a text game log (only its first field is read by load_game)
+
+        @param nb_rows: the number of rows of the Grid
+        @type nb_rows: int
+        @param nb_columns: the number of columns of the Grid
+        @type nb_columns: int
+        @param agent_type: (optional) the kind of game (e.g., 'HUMAN', see ReplayCatalog)
+        @type agent_type: str
+        @return: the header line (with its line break)
+        @rtype: str
+        """
+        if agent_type is None:
+            return "{} {}\n".format(nb_rows, nb_columns)
+        return "{} {} {}\n".format(nb_rows, nb_columns, agent_type)
+
     @staticmethod
     def load_game(log_file_path, display_grid=True):
         """
-        Static method to load a 2048 game log to visualize it through the GUI
+        Static method to load a 2048 game log (text, binary or seed replay) to visualize it through the GUI
+        A text log interrupted during the Game (see ReplayLogObserver) is loaded up to its last complete round
+        The Grid states of a seed replay are only simulated when asked for (see SeedReplay.ReplayHistory)
 
         @param log_file_path: the path of the log to load
         @type log_file_path: str
@@ -144,21 +262,33 @@ class Game:
         @return: a Game object that contains all the game history (tile positions, directions and score)
         @rtype: Game
         """
+        if str(log_file_path).endswith(SEED_REPLAY_EXTENSION):
+            history = read_seed_replay(log_file_path)
+            game = Game(Grid(history.nb_rows), init_grid_with_two_tiles=False, display_grid=display_grid,
+                        seed=history.seed)
+            game.history = history
+            return game
+        if str(log_file_path).endswith(BINARY_REPLAY_EXTENSION):
+            history = read_replay(log_file_path)
+            game = Game(Grid(history.nb_rows), init_grid_with_two_tiles=False, display_grid=display_grid)
+            game.seed = None  # The new tiles of a logged Game were not drawn from this seed
+            game.history = history
+            return game
         with open(log_file_path, 'r') as f:
             nb_rows_columns = int(f.readline().strip().split(' ')[0])
             grid = Grid(nb_rows_columns)
             game = Game(grid, init_grid_with_two_tiles=False, display_grid=display_grid)
+            game.seed = None  # The new tiles of a logged Game were not drawn from this seed
             line = f.readline()
-            while line:
+            while line.endswith('\n') or line.endswith(']'):  # Otherwise, the last line was interrupted
                 l_split = line.strip().split(' ')
                 if len(l_split) > 3:
-                    game.history.score_history.append(int(l_split[1]))
-                    game.history.grid_history.append(' '.join(l_split[2:-2]))
+                    game.history.add_grid_state(' '.join(l_split[2:-2]), int(l_split[1]))
                     if l_split[-2] != "WIN" and l_split[-2] != "LOOSE":
-                        game.history.direction_state_history.append(Constants.Directions(l_split[-2]))
+                        direction_or_state = Constants.Directions(l_split[-2])
                     else:
-                        game.history.direction_state_history.append(Constants.States(l_split[-2]))
+                        direction_or_state = Constants.States(l_split[-2])
                     m = re.search(r"\[([-0-9]+)\]", l_split[-1])  # Regex to extract index from brackets
-                    game.history.direction_index_history.append(int(m.group(1)))
+                    game.history.add_direction_or_state(direction_or_state, int(m.group(1)))
                 line = f.readline()
         return game
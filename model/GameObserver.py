@@ -0,0 +1,179 @@
+# coding: utf-8
+import sys
+from os import path
+from pathlib import Path
+
+import Constants
+from Constants import States
+from model.History import History
+
+
+class GameObserver:
+    """
+    This class represents an observer (or sink) notified of the events of a Game
+    The base implementation ignores every event, so it can be used as a null sink
+    """
+
+    def on_game_started(self, game):
+        """
+        Method called once the initial Grid of a Game is ready
+
+        @param game: the observed Game
+        @type game: Game
+        """
+        pass
+
+    def on_direction_played(self, game, direction):
+        """
+        Method called after a valid direction has been played (i.e. once the new tile has been generated)
+
+        @param game: the observed Game
+        @type game: Game
+        @param direction: the direction that has been played
+        @type direction: Constants.Directions
+        """
+        pass
+
+    def on_game_ended(self, game, state):
+        """
+        Method called when a Game is won or lost
+
+        @param game: the observed Game
+        @type game: Game
+        @param state: the final state reached
+        @type state: Constants.States
+        """
+        pass
+
+
+class NullObserver(GameObserver):
+    """
+    An observer that ignores every event (e.g., for headless runs)
+    """
+    pass
+
+
+class ConsoleObserver(GameObserver):
+    """
+    An observer that prints the state of the Game after each move (to the console by default)
+    """
+
+    def __init__(self, stream=None):
+        """
+        @param stream: (optional) the text stream where to print (sys.stdout by default)
+        @type stream: io.TextIOBase
+        """
+        self.stream = stream
+
+    def write(self, text):
+        """
+        Utility method to print a text to the stream of this observer
+
+        @param text: the text to print
+        @type text: str
+        """
+        print(text, file=self.stream if self.stream is not None else sys.stdout)
+
+    def on_game_started(self, game):
+        self.write(game.__repr__())
+
+    def on_direction_played(self, game, direction):
+        self.write("Next direction to be played: {}\n"
+                   "=======================================\n"  # To distinguish from next round
+                   "{}".format(direction.value, game.__repr__()))
+
+    def on_game_ended(self, game, state):
+        self.write("YOU WIN!!!\n" if state == States.WIN else "Sorry, you loose...\n")
+
+
+class FileObserver(ConsoleObserver):
+    """
+    An observer that writes the state of the Game after each move into a text file
+    The file is opened when the Game starts and closed when it ends (or by close, e.g., for an interrupted Game)
+    """
+
+    def __init__(self, file_path):
+        """
+        @param file_path: the path of the file where to write (the file is overwritten)
+        @type file_path: str
+        """
+        super().__init__()
+        self.file_path = file_path
+
+    def on_game_started(self, game):
+        Path(path.dirname(self.file_path) or '.').mkdir(parents=True, exist_ok=True)
+        self.stream = open(self.file_path, 'w')
+        super().on_game_started(game)
+
+    def on_game_ended(self, game, state):
+        super().on_game_ended(game, state)
+        self.close()
+
+    def close(self):
+        """
+        Method to flush and close the file (nothing is written anymore)
+        """
+        if self.stream is not None:
+            self.stream.close()
+
+
+class ReplayLogObserver(GameObserver):
+    """
+    An observer that streams a Game into a text game log (same format as Game.save_game), one line per round
+    The log is opened when the Game starts and lines are appended through a buffered file, flushed every few
+    rounds: a Game interrupted before its end can still be loaded up to its last complete round (see Game.load_game)
+    """
+
+    def __init__(self, file_path, flush_interval=Constants.REPLAY_FLUSH_INTERVAL, agent_type=None):
+        """
+        @param file_path: the path of the game log to write (the file is overwritten)
+        @type file_path: str
+        @param flush_interval: the number of rounds between two flushes of the log to the disk
+        @type flush_interval: int
+        @param agent_type: (optional) the kind of game (e.g., 'RANDOM'), written in the header of the log
+        @type agent_type: str
+        """
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.agent_type = agent_type
+        self.stream = None
+        self.pending_round = None  # (tile exponents, score) of the last Grid state, written once its move is known
+
+    def on_game_started(self, game):
+        Path(path.dirname(self.file_path) or '.').mkdir(parents=True, exist_ok=True)
+        self.stream = open(self.file_path, 'w')
+        self.stream.write(game.log_header(game.grid.nb_rows, game.grid.nb_columns, self.agent_type))
+        self.stream.flush()
+        self.pending_round = (game.grid.to_exponents(), game.current_score)
+
+    def on_direction_played(self, game, direction):
+        self.write_round(game.round_count - 1, direction, game.history.direction_index_history[-1])
+        if game.round_count % self.flush_interval == 0:
+            self.stream.flush()
+        self.pending_round = (game.grid.to_exponents(), game.current_score)
+
+    def on_game_ended(self, game, state):
+        self.write_round(game.round_count, state, -1)
+        self.close()
+
+    def close(self):
+        """
+        Method to flush and close the log (e.g., when the Game is interrupted or abandoned)
+        The log can then be loaded up to its last complete round
+        """
+        if self.stream is not None:
+            self.stream.close()
+
+    def write_round(self, round_number, direction_or_state, index_choice):
+        """
+        Method to append the line of the last Grid state, now that its direction (or final state) is known
+
+        @param round_number: the round of the last Grid state
+        @type round_number: int
+        @param direction_or_state: the direction played from that Grid state or the final state reached (win/loss)
+        @type direction_or_state: Constants.Directions or Constants.States
+        @param index_choice: the index of the chosen direction (0 was the first choice, 3 was the last choice)
+        @type index_choice: int
+        """
+        exponents, score = self.pending_round
+        self.stream.write(History.round_to_string(round_number, score, exponents, direction_or_state, index_choice))
@@ -1,11 +1,36 @@
 # coding: utf-8
-from random import choice
+import random
 
 import numpy as np
 
 import Constants
 from Constants import Directions
 
+# Two tiles of this value are not merged: the bitboard engine and the binary replays store tiles as 4-bit exponents
+MAX_TILE_NUMBER = 32768
+
+
+def slide_line(line):
+    """
+    Utility method to play a complete move (pack, merge and pack again) on a single line towards its start
+
+    @param line: the tile values of a row or a column
+    @type line: list of int
+    @return: the new tile values and the score obtained
+    @rtype: tuple of (list of int, int)
+    """
+    tiles = [v for v in line if v]
+    new_line, score, i = list(), 0, 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1] < MAX_TILE_NUMBER:
+            new_line.append(2 * tiles[i])
+            score += 2 * tiles[i]
+            i += 2
+        else:
+            new_line.append(tiles[i])
+            i += 1
+    return new_line + [0] * (len(line) - len(new_line)), score
+
 
 class Grid:
     """
@@ -28,6 +53,7 @@ class Grid:
         else:
             t_list = [int(i) for i in t_str_grid.strip().split(' ')]
             self.grid = np.reshape(t_list, (self.nb_rows, self.nb_columns))
+        self._successors = (None, None)  # (raw tiles, successors) of the last call to the successors method
 
     def __str__(self):
         """
@@ -36,12 +62,7 @@ class Grid:
         @return: a matrix-like str with line breaks for debugging
         @rtype: str
         """
-        str_to_return = ""
-        for r in range(self.nb_rows):
-            for c in range(self.nb_columns):
-                str_to_return += "{}\t".format(self.grid[r, c])
-            str_to_return += "\n"
-        return str_to_return
+        return "".join("".join("{}\t".format(v) for v in row) + "\n" for row in self.grid.tolist())
 
     def to_string(self):
         """
@@ -50,11 +71,7 @@ class Grid:
         @return: the current inline string representation of this Grid
         @rtype: str
         """
-        str_to_return = ""
-        for r in range(self.nb_rows):
-            for c in range(self.nb_columns):
-                str_to_return += "{} ".format(self.grid[r, c])
-        return str_to_return.strip()
+        return " ".join(str(v) for v in self.grid.ravel().tolist())
 
     @staticmethod
     def from_string(t_str_grid, nb_rows, nb_columns):
@@ -73,6 +90,64 @@ class Grid:
         t_list = [int(i) for i in t_str_grid.strip().split(' ')]
         return np.reshape(t_list, (nb_rows, nb_columns))
 
+    def to_exponents(self):
+        """
+        Utility method to get the tile exponents of this Grid (0 for an empty tile, 1 for a 2 tile, 2 for a 4 tile, ...)
+
+        @return: a flat uint8 numpy array of nb_rows * nb_columns tile exponents
+        @rtype: np.array
+        """
+        return np.log2(np.maximum(self.grid, 1)).round().astype('uint8').ravel()
+
+    def set_exponents(self, exponents):
+        """
+        Utility method to set the tiles of this Grid from tile exponents (inverse of to_exponents)
+
+        @param exponents: nb_rows * nb_columns tile exponents
+        @type exponents: np.array
+        """
+        exponents = np.asarray(exponents, dtype='int64').reshape(self.nb_rows, self.nb_columns)
+        self.grid = np.where(exponents > 0, np.left_shift(1, exponents), 0)
+
+    def set_state(self, state):
+        """
+        Utility method to replace the tiles of this Grid by a state returned by the successors method
+
+        @param state: a Grid state (a (nb_rows, nb_columns) numpy array of tile values)
+        @type state: np.array
+        """
+        self.grid = state.copy()  # The successors are kept by this Grid and must not be modified
+
+    def successors(self):
+        """
+        Method to compute the result of the four directions without modifying this Grid
+
+        @return: for each direction of Constants.DIRECTIONS_LIST (in that order), a tuple with the new Grid state
+                 (see set_state), the score obtained and whether the move is legal (i.e. at least one tile moved)
+        @rtype: list of tuple of (np.array, int, bool)
+        """
+        # The result is kept until the Grid changes (e.g., the agent and the Game both need it at each round)
+        key = self.grid.tobytes()
+        if self._successors[0] == key:
+            return self._successors[1]
+
+        # A single Grid is moved line by line on Python lists: UP and DOWN (resp. LEFT and RIGHT) slide the columns
+        # (resp. the rows) towards their start or their end
+        rows = self.grid.tolist()
+        columns = [list(column) for column in zip(*rows)]
+        successors = list()
+        for lines, vertical in ((columns, True), (rows, False)):
+            for reverse in (False, True):
+                new_lines, score = list(), 0
+                for line in lines:
+                    new_line, line_score = slide_line(line[::-1] if reverse else line)
+                    new_lines.append(new_line[::-1] if reverse else new_line)
+                    score += line_score
+                new_grid = np.array(new_lines, dtype='int64')
+                successors.append((new_grid.T if vertical else new_grid, score, new_lines != lines))
+        self._successors = (key, successors)
+        return successors
+
     def return_free_positions(self):
         """
         Method to get all free positions of a Grid object
@@ -84,16 +159,21 @@ class Grid:
         free_pos = np.nonzero(self.grid == 0)
         return list(zip(*free_pos))
 
-    def generate_new_number(self, remaining_pos):
+    def generate_new_number(self, remaining_pos, rng=random):
         """
         Method to generate a new tile (either a 2 or a 4 tile) and add it to the current grid
         The new tile is chosen from the remaining positions given in parameter
 
         @param remaining_pos: a list of tuples representing free positions
         @type remaining_pos: list of tuples
+        @param rng: (optional) the random generator drawing the new tile (default: the global random module)
+        @type rng: random.Random
+        @return: the position (row, column) and the value of the new tile
+        @rtype: tuple of (int, int, int)
         """
-        r, c = choice(remaining_pos)
-        self.grid[r, c] = choice([2, 4])
+        r, c = rng.choice(remaining_pos)
+        self.grid[r, c] = rng.choice([2, 4])
+        return r, c, int(self.grid[r, c])
 
     def move_is_still_possible(self):
         """
@@ -110,11 +190,11 @@ class Grid:
             return True
         for r in range(self.nb_rows):
             for c in range(self.nb_columns - 1):
-                if self.grid[r, c] == self.grid[r, c + 1]:
+                if self.grid[r, c] == self.grid[r, c + 1] < MAX_TILE_NUMBER:
                     return True
         for c in range(self.nb_columns):
             for r in range(self.nb_rows - 1):
-                if self.grid[r, c] == self.grid[r + 1, c]:
+                if self.grid[r, c] == self.grid[r + 1, c] < MAX_TILE_NUMBER:
                     return True
         return False
 
@@ -165,7 +245,7 @@ class Grid:
 
     def merge(self, direction):
         """
-        Method to merge adjacent tiles of a Grid according to the given direction
+        Method to merge adjacent tiles of a Grid according to the given direction (up to MAX_TILE_NUMBER tiles)
         This method may leave unrealistic free positions and should be followed by a new call to the move_tiles method
 
         @param direction: one of the defined directions from the Constants file
@@ -177,29 +257,43 @@ class Grid:
         if direction == Directions.RIGHT:
             for r in range(self.nb_rows):
                 for c in range(self.nb_columns - 1, 0, -1):
-                    if self.grid[r, c] == self.grid[r, c - 1]:
+                    if self.grid[r, c] == self.grid[r, c - 1] < MAX_TILE_NUMBER:
                         self.grid[r, c] *= 2
                         score_to_add += self.grid[r, c]
                         self.grid[r, c - 1] = 0
         elif direction == Directions.LEFT:
             for r in range(self.nb_rows):
                 for c in range(self.nb_columns - 1):
-                    if self.grid[r, c] == self.grid[r, c + 1]:
+                    if self.grid[r, c] == self.grid[r, c + 1] < MAX_TILE_NUMBER:
                         self.grid[r, c] *= 2
                         score_to_add += self.grid[r, c]
                         self.grid[r, c + 1] = 0
         elif direction == Directions.UP:
             for c in range(self.nb_columns):
                 for r in range(self.nb_rows - 1):
-                    if self.grid[r, c] == self.grid[r + 1, c]:
+                    if self.grid[r, c] == self.grid[r + 1, c] < MAX_TILE_NUMBER:
                         self.grid[r, c] *= 2
                         score_to_add += self.grid[r, c]
                         self.grid[r + 1, c] = 0
         elif direction == Directions.DOWN:
             for c in range(self.nb_columns):
                 for r in range(self.nb_rows - 1, 0, -1):
-                    if self.grid[r, c] == self.grid[r - 1, c]:
+                    if self.grid[r, c] == self.grid[r - 1, c] < MAX_TILE_NUMBER:
                         self.grid[r, c] *= 2
                         score_to_add += self.grid[r, c]
                         self.grid[r - 1, c] = 0
         return score_to_add
+
+    def move(self, direction):
+        """
+        Method to play a complete move according to the given direction (pack, merge and pack again)
+
+        @param direction: one of the defined directions from the Constants file
+        @type direction: Constants.Directions
+        @return: the score to add to the current score
+        @rtype: int
+        """
+        self.move_tiles(direction)
+        score_to_add = self.merge(direction)
+        self.move_tiles(direction)
+        return score_to_add
@@ -0,0 +1,77 @@
+# coding: utf-8
+import numpy as np
+
+
+class GrowableArray:
+    """
+    This class represents a numpy array that can be appended to in amortized constant time: the underlying
+    storage is preallocated and its capacity is doubled each time it is full
+    """
+
+    def __init__(self, dtype, item_shape=(), capacity=64):
+        """
+        Init method to initialize a new (empty) GrowableArray object
+
+        @param dtype: the numpy data type of the items
+        @type dtype: str or np.dtype
+        @param item_shape: the shape of each item (() for scalars)
+        @type item_shape: tuple of int
+        @param capacity: the number of items initially preallocated
+        @type capacity: int
+        """
+        self._data = np.zeros((max(capacity, 1),) + tuple(item_shape), dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __setitem__(self, index, value):
+        self.values[index] = value
+
+    @property
+    def values(self):
+        """
+        @return: a view on the items stored (without the unused capacity)
+        @rtype: np.array
+        """
+        return self._data[:self._size]
+
+    def append(self, item):
+        """
+        Method to add an item at the end of this array, doubling the capacity if needed
+
+        @param item: the item to add (a scalar or an array of shape item_shape)
+        @type item: int or np.array
+        """
+        if self._size == len(self._data):
+            data = np.zeros((2 * len(self._data),) + self._data.shape[1:], dtype=self._data.dtype)
+            data[:self._size] = self._data
+            self._data = data
+        self._data[self._size] = item
+        self._size += 1
+
+    def pop(self):
+        """
+        Method to remove the last item of this array
+
+        @return: a copy of the item removed
+        @rtype: int or np.array
+        """
+        if self._size == 0:
+            raise IndexError("pop from an empty GrowableArray")
+        self._size -= 1
+        return self._data[self._size].copy()
+
+    def drop_first(self, nb_items):
+        """
+        Method to remove the first items of this array (the remaining items are moved to the front)
+
+        @param nb_items: the number of items to remove
+        @type nb_items: int
+        """
+        nb_items = min(nb_items, self._size)
+        self._data[:self._size - nb_items] = self._data[nb_items:self._size]
+        self._size -= nb_items
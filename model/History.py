@@ -1,17 +1,28 @@
 # coding: utf-8
 import numpy as np
+
+import Constants
+from Constants import Directions
+from model.BitboardGrid import create_grid, exponent_of
+from model.GrowableArray import GrowableArray
 from model.Grid import Grid
 
 
 class History:
     """
     This class represents an History of a 2048 game with:
-        - The different scores over time
-        - The different Grid states over time
+        - The different scores over time (in an int64 array)
+        - The different Grid states over time, delta-encoded: only the tile generated after each move is stored,
+          plus a full Grid state (keyframe) every K rounds
         - The different directions that have been played over time
+
+    Grid states are stored as flat uint8 arrays of tile exponents in preallocated arrays with amortized growth
+    Any Grid state is rebuilt by replaying the directions and new tiles from the nearest keyframe
+    With a window, only the most recent rounds are kept in memory (e.g., for long Games streamed into a log):
+    older rounds are dropped a keyframe at a time and round numbers keep counting from the start of the Game
     """
 
-    def __init__(self, nb_rows, nb_columns):
+    def __init__(self, nb_rows, nb_columns, keyframe_interval=Constants.HISTORY_KEYFRAME_INTERVAL, window=None):
         """
         Init method to initialize a new History object
 
@@ -19,13 +30,34 @@ class History:
         @type nb_rows: int
         @param nb_columns: the number of columns of the Grid for that Game
         @type nb_columns: int
+        @param keyframe_interval: the number of rounds between two keyframes (full Grid states)
+        @type keyframe_interval: int
+        @param window: (optional) the minimum number of recent rounds kept in memory (default: all the rounds)
+        @type window: int
         """
         self.nb_rows = nb_rows
         self.nb_columns = nb_columns
-        self.grid_history = list()
-        self.score_history = list()
+        self.keyframe_interval = keyframe_interval
+        self.window = window
+        self.first_round = 0  # The oldest round kept in memory (always a keyframe)
+        self.keyframes = GrowableArray('uint8', (nb_rows * nb_columns,))  # Full Grid states (tile exponents)
+        self.keyframe_rounds = GrowableArray('int64')  # Sorted round numbers of the keyframes
+        self.spawn_positions = GrowableArray('int16')  # Flat position of the tile generated at each round (or -1)
+        self.spawn_exponents = GrowableArray('uint8')  # Exponent of the tile generated at each round
+        self.scores = GrowableArray('int64')
         self.direction_state_history = list()
         self.direction_index_history = list()
+        self.last_state = None  # The tile exponents of the most recent Grid state
+        self._replay_grid = None
+        self._cursor = None  # (round, tile exponents) of the last rebuilt Grid state for fast sequential seeks
+
+    def __len__(self):
+        """
+        @return: the number of Grid states of the Game, including the ones no longer kept in memory
+                 (i.e. the number of rounds + 1)
+        @rtype: int
+        """
+        return self.first_round + len(self.scores)
 
     def __repr__(self):
         """
@@ -34,28 +66,177 @@ class History:
         @return: the entire history of a Game
         @rtype: str
         """
-        str_to_return = ""
-        for i in range(len(self.grid_history)):
-            str_to_return += "{} ".format(i)
-            str_to_return += "{} ".format(self.score_history[i])
-            str_to_return += str(self.grid_history[i])
-            str_to_return += " {}".format(self.direction_state_history[i].value)
-            str_to_return += " [{}]".format(self.direction_index_history[i])
-            str_to_return += "\n"
-        return str_to_return
+        lines = list()
+        scores = self.score_history.tolist()
+        for i, exponents in enumerate(self.grid_exponents()):
+            lines.append(History.round_to_string(self.first_round + i, scores[i], exponents,
+                                                 self.direction_state_history[i], self.direction_index_history[i]))
+        return "".join(lines)
+
+    @staticmethod
+    def round_to_string(round_number, score, exponents, direction_or_state, index_choice):
+        """
+        Utility method to get the line of a round in a text game log (see Game.save_game)
+
+        @param round_number: the round
+        @type round_number: int
+        @param score: the score of that round
+        @type score: int
+        @param exponents: the tile exponents of the Grid state of that round
+        @type exponents: np.array
+        @param direction_or_state: the direction played from that Grid state or the final state reached (win/loss)
+        @type direction_or_state: Constants.Directions or Constants.States
+        @param index_choice: the index of the chosen direction (0 was the first choice, 3 was the last choice)
+        @type index_choice: int
+        @return: the line of that round (with its line break)
+        @rtype: str
+        """
+        return "{} {} {} {} [{}]\n".format(round_number, score, History.state_to_string(History.values_of(exponents)),
+                                           direction_or_state.value, index_choice)
+
+    @property
+    def score_history(self):
+        """
+        @return: the scores of each Grid state kept in memory (a view, not a copy)
+        @rtype: np.array
+        """
+        return self.scores.values
+
+    @staticmethod
+    def state_to_string(state):
+        """
+        Utility method to get the inline string representation of a Grid state (as Grid.to_string)
+
+        @param state: a Grid state
+        @type state: np.array
+        @return: the inline string representation of that Grid state
+        @rtype: str
+        """
+        return " ".join(str(v) for v in np.ravel(state).tolist())
+
+    @staticmethod
+    def values_of(exponents):
+        """
+        Utility method to convert tile exponents into tile values
+
+        @param exponents: an array of tile exponents
+        @type exponents: np.array
+        @return: an int64 array of tile values with the same shape
+        @rtype: np.array
+        """
+        exponents = np.asarray(exponents, dtype='int64')
+        return np.where(exponents > 0, np.left_shift(1, exponents), 0)
+
+    def _to_exponents(self, state):
+        """
+        Utility method to convert a Grid state given as an inline string or as an array of tile values into
+        tile exponents
+
+        @param state: the Grid state
+        @type state: str or np.array
+        @return: a flat uint8 numpy array of nb_rows * nb_columns tile exponents
+        @rtype: np.array
+        """
+        if isinstance(state, str):
+            state = Grid.from_string(state, self.nb_rows, self.nb_columns)
+        state = np.asarray(state, dtype='int64').ravel()
+        return np.log2(np.maximum(state, 1)).round().astype('uint8')
+
+    def _apply_move(self, exponents, direction):
+        """
+        Utility method to play a direction on a Grid state without generating a new tile
+
+        @param exponents: the tile exponents of a Grid state
+        @type exponents: np.array
+        @param direction: the direction to play
+        @type direction: Constants.Directions
+        @return: the tile exponents of the new Grid state
+        @rtype: np.array
+        """
+        if self._replay_grid is None:
+            self._replay_grid = create_grid(self.nb_rows)
+        self._replay_grid.set_exponents(exponents)
+        self._replay_grid.move(direction)
+        return self._replay_grid.to_exponents()
+
+    def _find_spawn(self, exponents):
+        """
+        Method to find the tile generated between the last Grid state and the given one
+
+        @param exponents: the tile exponents of the new Grid state
+        @type exponents: np.array
+        @return: the (flat position, exponent) of the generated tile, or None if the new Grid state cannot be
+                 obtained by playing the last direction and generating a single tile
+        @rtype: tuple of (int, int)
+        """
+        if self.last_state is None or len(self.direction_state_history) < len(self.scores) or \
+                not isinstance(self.get_direction(len(self) - 1), Directions):
+            return None
+        expected = self._apply_move(self.last_state, self.get_direction(len(self) - 1))
+        differences = np.nonzero(expected != exponents)[0]
+        if len(differences) != 1 or expected[differences[0]] != 0:
+            return None
+        return int(differences[0]), int(exponents[differences[0]])
 
-    def add_grid_state(self, t_str_state, score):
+    def add_grid_state(self, state, score, spawn=None):
         """
         Method to add a new Grid snapshot to this History object
         A new Grid state can mean a change in score too so we keep track of it too
 
-        @param t_str_state: the new Grid state to add
-        @type t_str_state: str
+        @param state: the new Grid state to add (tile values)
+        @type state: str or np.array
+        @param score: the score associated with that Grid state
+        @type score: int
+        @param spawn: (optional) the (flat position, value) of the tile generated since the last Grid state
+                      (found by replaying the last direction if not given)
+        @type spawn: tuple of (int, int)
+        """
+        if spawn is not None:
+            spawn = (spawn[0], exponent_of(spawn[1]))
+        self.add_grid_exponents(self._to_exponents(state), score, spawn)
+
+    def add_grid_exponents(self, exponents, score, spawn=None):
+        """
+        Method to add a new Grid snapshot given as tile exponents (see Grid.to_exponents) to this History object
+
+        @param exponents: the nb_rows * nb_columns tile exponents of the new Grid state
+        @type exponents: np.array
         @param score: the score associated with that Grid state
         @type score: int
+        @param spawn: (optional) the (flat position, exponent) of the tile generated since the last Grid state
+                      (found by replaying the last direction if not given)
+        @type spawn: tuple of (int, int)
+        """
+        round_number = len(self)
+        if spawn is None and round_number % self.keyframe_interval != 0:
+            spawn = self._find_spawn(exponents)
+        if spawn is None or round_number % self.keyframe_interval == 0:
+            self.keyframes.append(exponents)
+            self.keyframe_rounds.append(round_number)
+        self.spawn_positions.append(spawn[0] if spawn is not None else -1)
+        self.spawn_exponents.append(spawn[1] if spawn is not None else 0)
+        self.scores.append(score)
+        self.last_state = np.array(exponents, dtype='uint8')
+        if self.window is not None and len(self.scores) >= 2 * self.window:
+            self._drop_old_rounds()
+
+    def _drop_old_rounds(self):
+        """
+        Method to drop the rounds older than the window (from the keyframe preceding the oldest round to keep)
         """
-        self.grid_history.append(t_str_state)
-        self.score_history.append(score)
+        keyframe_rounds = self.keyframe_rounds.values
+        k = int(np.searchsorted(keyframe_rounds, len(self) - self.window, side='right')) - 1
+        nb_rounds = int(keyframe_rounds[k]) - self.first_round
+        if nb_rounds <= 0:
+            return
+        self.keyframes.drop_first(k)
+        self.keyframe_rounds.drop_first(k)
+        for array in (self.spawn_positions, self.spawn_exponents, self.scores):
+            array.drop_first(nb_rounds)
+        del self.direction_state_history[:nb_rounds]
+        del self.direction_index_history[:nb_rounds]
+        self.first_round += nb_rounds
+        self._cursor = None
 
     def add_direction_or_state(self, direction_or_state, index_choice):
         """
@@ -69,18 +250,119 @@ class History:
         self.direction_state_history.append(direction_or_state)
         self.direction_index_history.append(index_choice)
 
-    def something_moved(self, previous_state):
+    def get_direction(self, round_number):
+        """
+        @param round_number: the round (negative values count from the end)
+        @type round_number: int
+        @return: the direction played from the Grid state of that round or the final state reached (win/loss)
+        @rtype: Constants.Directions or Constants.States
+        """
+        return self.direction_state_history[round_number - self.first_round if round_number >= 0 else round_number]
+
+    def pop_round(self):
+        """
+        Method to cancel the last round: the last direction/state and the last Grid state are removed
+        """
+        self.direction_state_history.pop()
+        self.direction_index_history.pop()
+        round_number = len(self) - 1
+        if len(self.keyframe_rounds) and self.keyframe_rounds[-1] == round_number:
+            self.keyframes.pop()
+            self.keyframe_rounds.pop()
+        self.spawn_positions.pop()
+        self.spawn_exponents.pop()
+        self.scores.pop()
+        self._cursor = None
+        self.last_state = None
+        self.last_state = self.get_grid_exponents(len(self) - 1) if len(self.scores) > 0 else None
+
+    def get_grid_exponents(self, round_number):
+        """
+        Method to rebuild the tile exponents of the Grid state of a given round by replaying the rounds from
+        the nearest keyframe (or from the last rebuilt Grid state when seeking forward)
+
+        @param round_number: the round of the Grid state to rebuild (negative values count from the end)
+        @type round_number: int
+        @return: a flat uint8 numpy array of nb_rows * nb_columns tile exponents
+        @rtype: np.array
+        """
+        if round_number < 0:
+            round_number += len(self)
+        if not 0 <= round_number < len(self):
+            raise IndexError("No Grid state for round {}".format(round_number))
+        if round_number < self.first_round:
+            raise IndexError("The Grid state of round {} is no longer kept in memory".format(round_number))
+        if round_number == len(self) - 1 and self.last_state is not None:
+            return self.last_state.copy()
+
+        keyframe_rounds = self.keyframe_rounds.values
+        k = int(np.searchsorted(keyframe_rounds, round_number, side='right')) - 1
+        start, exponents = int(keyframe_rounds[k]), self.keyframes[k]
+        if self._cursor is not None and start <= self._cursor[0] <= round_number:
+            start, exponents = self._cursor
+        next_keyframe = int(np.searchsorted(keyframe_rounds, start, side='right'))
+        for i in range(start + 1, round_number + 1):
+            if next_keyframe < len(keyframe_rounds) and keyframe_rounds[next_keyframe] == i:
+                exponents = self.keyframes[next_keyframe]
+                next_keyframe += 1
+            else:
+                exponents = self._apply_move(exponents, self.get_direction(i - 1))
+                exponents[self.spawn_positions[i - self.first_round]] = self.spawn_exponents[i - self.first_round]
+        self._cursor = (round_number, exponents)
+        return exponents.copy()
+
+    def get_grid_state(self, round_number):
+        """
+        Method to rebuild the Grid state of a given round (see get_grid_exponents)
+
+        @param round_number: the round of the Grid state to rebuild (negative values count from the end)
+        @type round_number: int
+        @return: the (nb_rows, nb_columns) Grid state
+        @rtype: np.array
+        """
+        return History.values_of(self.get_grid_exponents(round_number)).reshape(self.nb_rows, self.nb_columns)
+
+    def get_score(self, round_number):
+        """
+        @param round_number: the round (negative values count from the end)
+        @type round_number: int
+        @return: the score of that round
+        @rtype: int
+        """
+        return int(self.scores[round_number - self.first_round if round_number >= 0 else round_number])
+
+    def grid_exponents(self):
+        """
+        Method to rebuild the tile exponents of all the Grid states kept in memory at once
+
+        @return: a (nb of Grid states, nb_rows * nb_columns) uint8 array, one Grid state per line
+        @rtype: np.array
+        """
+        exponents = np.empty((len(self) - self.first_round, self.nb_rows * self.nb_columns), dtype='uint8')
+        for i in range(self.first_round, len(self)):
+            exponents[i - self.first_round] = self.get_grid_exponents(i)
+        return exponents
+
+    def grid_states(self):
+        """
+        Generator over all the Grid states kept in memory, from the oldest round to the last one
+
+        @return: the successive (nb_rows, nb_columns) Grid states
+        @rtype: generator of np.array
+        """
+        for i in range(self.first_round, len(self)):
+            yield self.get_grid_state(i)
+
+    def something_moved(self, current_exponents):
         """
-        Method to determine if at least one tile has moved between two Grid snapshots (current, previous)
+        Method to determine if at least one tile has moved between the last Grid snapshot and the current Grid
 
-        @param previous_state: the previous Grid state (or snapshot) in inline str representation format
-        @type previous_state: str
+        @param current_exponents: the tile exponents of the current Grid state (see Grid.to_exponents)
+        @type current_exponents: np.array
         @return: whether at least one tile has moved compared to the previous Grid snapshot
         @rtype: bool
         """
-        state_a = Grid.from_string(previous_state, self.nb_rows, self.nb_columns)
-        state_b = Grid.from_string(self.grid_history[-1], self.nb_rows, self.nb_columns)
-        return not np.array_equal(state_a, state_b)
+        return not np.array_equal(current_exponents, self.last_state)
 
     def print_stats(self):
         """
@@ -89,11 +371,7 @@ class History:
         nb_moves = len(self.direction_state_history) - 2
 
         # We search for the maximum tile obtained
-        max_tile = 0
-        for i in self.grid_history:
-            temp_list = [int(x) for x in i.split(' ')]
-            if max(temp_list) > max_tile:
-                max_tile = max(temp_list)
+        max_tile = int(History.values_of(self.grid_exponents().max()))
 
         # We compute the number of points obtained for each round
         points_per_round = []
@@ -108,14 +386,14 @@ class History:
             else:
                 freq_choices[i] = 1.0
         freq_choices[0] -= 1.0
-        del freq_choices[-1]
+        freq_choices.pop(-1, None)  # No final state in an interrupted log
         for f in freq_choices:
             freq_choices[f] /= nb_moves
             freq_choices[f] *= 100.0
 
         print("Final direction/state: {}".format(self.direction_state_history[-1]))
         print("Final score: {}".format(self.score_history[-1]))
-        print("Number of rounds: {}".format(len(self.score_history) - 1))
+        print("Number of rounds: {}".format(len(self) - 1))
         print("Max. tile: {}".format(max_tile))
         print("Avg. points per round: {}".format(np.mean(points_per_round)))
         print("Choice frequencies: {}".format(freq_choices))
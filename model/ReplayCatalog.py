@@ -0,0 +1,195 @@
+# coding: utf-8
+import hashlib
+import os
+import sqlite3
+import struct
+from pathlib import Path
+
+import Constants
+from Constants import States
+from model.BinaryReplay import BINARY_REPLAY_EXTENSION, HEADER_SIZE as BINARY_HEADER_SIZE, read_header
+from model.Game import Game
+from model.History import History
+from model.SeedReplay import SEED_REPLAY_EXTENSION, HEADER_SIZE as SEED_HEADER_SIZE, read_seed_header
+
+REPLAY_EXTENSIONS = ('.log', BINARY_REPLAY_EXTENSION, SEED_REPLAY_EXTENSION)
+# Bump this number when the summary of a replay changes, to rebuild existing catalogs
+CATALOG_VERSION = 2
+COLUMNS = ['path', 'size', 'mtime', 'hash', 'nb_rows', 'nb_columns', 'final_state', 'score', 'max_tile',
+           'nb_rounds', 'agent']
+
+
+def agent_of(file_path):
+    """
+    Guess the kind of game (agent) of a replay: the agent code of a binary or seed replay, the third field of the
+    header of a text log (see Game.save_game), or else the prefix of its file name (e.g., human_2048_1.log)
+
+    @param file_path: the path of the replay
+    @type file_path: str
+    @return: the kind of game (e.g., 'HUMAN' or 'EXPECTIMAX'), None if unknown
+    @rtype: str
+    """
+    if file_path.endswith('.log'):
+        with open(file_path, 'r') as f:
+            header = f.readline().split()
+        if len(header) > 2 and header[2] in Constants.GAME_TYPES:
+            return header[2]
+    elif file_path.endswith(BINARY_REPLAY_EXTENSION):
+        with open(file_path, 'rb') as f:
+            agent_type = read_header(f.read(BINARY_HEADER_SIZE))[4]
+        if agent_type is not None:
+            return agent_type
+    elif file_path.endswith(SEED_REPLAY_EXTENSION):
+        with open(file_path, 'rb') as f:
+            agent_type = read_seed_header(f.read(SEED_HEADER_SIZE))[5]
+        if agent_type is not None:
+            return agent_type
+    prefix = os.path.basename(file_path).split('_')[0].upper()
+    return prefix if prefix in Constants.GAME_TYPES else None
+
+
+def summarize_replay(file_path):
+    """
+    Load a replay to compute its summary (everything but its path, size, modification time and hash)
+
+    @param file_path: the path of the replay
+    @type file_path: str
+    @return: the grid size, the final state reached ('WIN', 'LOOSE' or None if the Game was interrupted),
+             the final score, the max. tile, the number of rounds and the kind of game
+    @rtype: dict
+    """
+    history = Game.load_game(file_path, display_grid=False).history
+    if len(history) == 0:
+        raise ValueError("No Grid state in {}".format(file_path))
+    last = history.direction_state_history[-1] if history.direction_state_history else None
+    return {'nb_rows': history.nb_rows, 'nb_columns': history.nb_columns,
+            'final_state': last.value if isinstance(last, States) else None,
+            'score': history.get_score(-1), 'max_tile': int(History.values_of(history.grid_exponents().max())),
+            'nb_rounds': len(history) - 1, 'agent': agent_of(file_path)}
+
+
+class ReplayCatalog:
+    """
+    A sqlite3 database indexing the summary of replays (text logs, binary and seed replays), so that replays can be
+    selected (e.g., "reached 1024 in less than 600 rounds") without loading them
+    A replay is only loaded again when its size or modification time changed and its content hash too
+    """
+
+    def __init__(self, db_path=None):
+        """
+        @param db_path: (optional) the path of the database (default: the catalog file in the data directory)
+        @type db_path: str
+        """
+        if db_path is None:
+            db_path = os.path.join(Constants.DATA_DIR_NAME, Constants.REPLAY_CATALOG_FILE_NAME)
+        Path(os.path.dirname(db_path) or '.').mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != CATALOG_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS replays")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS replays (path TEXT PRIMARY KEY, size INTEGER, "
+                                "mtime REAL, hash TEXT, nb_rows INTEGER, nb_columns INTEGER, final_state TEXT, "
+                                "score INTEGER, max_tile INTEGER, nb_rounds INTEGER, agent TEXT)")
+        for column in ['max_tile', 'nb_rounds', 'score', 'agent']:
+            self.connection.execute("CREATE INDEX IF NOT EXISTS replays_{0} ON replays ({0})".format(column))
+        self.connection.execute("PRAGMA user_version = {}".format(CATALOG_VERSION))
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Method to close the database
+        """
+        self.connection.close()
+
+    def update(self, directory):
+        """
+        Method to index the new and modified replays of a directory (and of its subdirectories), and to forget
+        the replays deleted from it
+
+        @param directory: the directory of the replays
+        @type directory: str
+        @return: the number of replays added or updated, and the number of replays removed
+        @rtype: tuple of (int, int)
+        """
+        directory = os.path.normpath(directory)
+        file_paths = list()
+        for root, _, filenames in os.walk(directory):
+            file_paths.extend(os.path.join(root, f) for f in filenames if f.endswith(REPLAY_EXTENSIONS))
+        prefix = os.path.join(directory, '')
+        indexed = {row['path']: row for row in self.connection.execute(
+            "SELECT path, size, mtime, hash FROM replays WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+
+        nb_updated = 0
+        for file_path in sorted(file_paths):
+            size, mtime = os.path.getsize(file_path), os.path.getmtime(file_path)
+            row = indexed.get(file_path)
+            if row is not None and row['size'] == size and row['mtime'] == mtime:
+                continue
+            with open(file_path, 'rb') as f:
+                file_hash = hashlib.sha1(f.read()).hexdigest()
+            if row is not None and row['hash'] == file_hash:  # Touched but unchanged
+                self.connection.execute("UPDATE replays SET size = ?, mtime = ? WHERE path = ?",
+                                        (size, mtime, file_path))
+                continue
+            try:
+                summary = summarize_replay(file_path)
+            except (ValueError, IndexError, struct.error) as e:
+                print("NOK - Replay not indexed: {} ({})".format(file_path, e))
+                self.connection.execute("DELETE FROM replays WHERE path = ?", (file_path,))
+                continue
+            summary.update(path=file_path, size=size, mtime=mtime, hash=file_hash)
+            self.connection.execute("INSERT OR REPLACE INTO replays ({}) VALUES ({})".format(
+                ", ".join(COLUMNS), ", ".join("?" * len(COLUMNS))), [summary[c] for c in COLUMNS])
+            nb_updated += 1
+
+        removed_paths = set(indexed) - set(file_paths)
+        self.connection.executemany("DELETE FROM replays WHERE path = ?", [(p,) for p in removed_paths])
+        self.connection.commit()
+        return nb_updated, len(removed_paths)
+
+    def query(self, directory=None, agent=None, final_state=None, min_max_tile=None, max_rounds=None,
+              min_score=None, extension=None):
+        """
+        Method to select indexed replays on their summary (all the criteria given must hold)
+
+        @param directory: (optional) the directory of the replays (including its subdirectories)
+        @type directory: str
+        @param agent: (optional) the kind of game (e.g., 'HUMAN')
+        @type agent: str
+        @param final_state: (optional) the final state reached
+        @type final_state: Constants.States
+        @param min_max_tile: (optional) the minimum max. tile (e.g., 1024)
+        @type min_max_tile: int
+        @param max_rounds: (optional) the maximum number of rounds
+        @type max_rounds: int
+        @param min_score: (optional) the minimum final score
+        @type min_score: int
+        @param extension: (optional) the extension of the replays (e.g., '.log')
+        @type extension: str
+        @return: the summary of each selected replay (see COLUMNS), sorted by path
+        @rtype: list of dict
+        """
+        conditions, parameters = list(), list()
+        if directory is not None:
+            prefix = os.path.join(os.path.normpath(directory), '')
+            conditions.append("substr(path, 1, ?) = ?")
+            parameters.extend([len(prefix), prefix])
+        if extension is not None:
+            conditions.append("substr(path, -?) = ?")
+            parameters.extend([len(extension), extension])
+        for condition, value in [("agent = ?", agent), ("max_tile >= ?", min_max_tile),
+                                 ("nb_rounds <= ?", max_rounds), ("score >= ?", min_score),
+                                 ("final_state = ?", final_state.value if final_state is not None else None)]:
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        sql = "SELECT {} FROM replays".format(", ".join(COLUMNS))
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return [dict(row) for row in self.connection.execute(sql + " ORDER BY path", parameters)]
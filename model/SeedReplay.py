@@ -0,0 +1,191 @@
+# coding: utf-8
+import struct
+
+import numpy as np
+
+from Constants import DIRECTIONS_LIST, States
+from model.BinaryReplay import AGENT_CODES, AGENTS, FINAL_STATE_CODES, FINAL_STATES, pack_2bit_codes, \
+    unpack_2bit_codes
+from model.BitboardGrid import create_grid
+from model.History import History
+
+# Seed replay layout (little-endian), for Games whose new tiles were all drawn from their seeded generator:
+#   - a 21-byte header: magic, version, nb rows, nb columns, final state code, agent code (see BinaryReplay), seed,
+#     nb of directions played (version 1 headers have no agent code)
+#   - the directions played: 2-bit codes (index in Constants.DIRECTIONS_LIST), four directions per byte
+# Grid states and scores are not stored: they are rebuilt by playing the directions again from the seed
+SEED_REPLAY_EXTENSION = '.seed'
+MAGIC = b'2SED'
+VERSION = 2
+HEADER_FORMATS = {1: '<4sBBBBQI', 2: '<4sBBBBBQI'}
+HEADER_FORMAT = HEADER_FORMATS[VERSION]
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+class ReplayHistory(History):
+    """
+    A read-only History rebuilt from a seed replay
+    The Game is simulated again from its seed, only up to the last round asked for (e.g., by the replay viewer),
+    so that opening a replay does not cost more than the rounds actually looked at
+    """
+
+    def __init__(self, nb_rows, nb_columns, seed, directions, final_state=None):
+        """
+        @param nb_rows: the number of rows of the Grid for that Game
+        @type nb_rows: int
+        @param nb_columns: the number of columns of the Grid for that Game
+        @type nb_columns: int
+        @param seed: the seed of the Game
+        @type seed: int
+        @param directions: the directions played
+        @type directions: list of Constants.Directions
+        @param final_state: (optional) the final state reached (win/loss)
+        @type final_state: Constants.States
+        """
+        super().__init__(nb_rows, nb_columns)
+        self.seed = seed
+        self.nb_states = len(directions) + 1
+        self.direction_state_history = list(directions)
+        self.direction_index_history = [0] * len(directions)  # The ranks of the directions played are not stored
+        if final_state is not None:
+            self.add_direction_or_state(final_state, -1)
+        self._game = None
+
+    def __len__(self):
+        """
+        @return: the number of Grid states of the replayed Game (simulated or not yet)
+        @rtype: int
+        """
+        return self.nb_states
+
+    @property
+    def score_history(self):
+        """
+        @return: the scores of each Grid state (the whole Game is simulated)
+        @rtype: np.array
+        """
+        self.simulate(len(self))
+        return self._game.history.score_history
+
+    def simulate(self, nb_states):
+        """
+        Method to simulate the Game from its seed until it holds a given number of Grid states
+
+        @param nb_states: the number of Grid states needed
+        @type nb_states: int
+        """
+        from model.Game import Game  # Game depends on this module to load seed replays
+
+        if self._game is None:
+            self._game = Game(create_grid(self.nb_rows), init_grid_with_two_tiles=True, display_grid=False,
+                              seed=self.seed)
+        history = self._game.history
+        while len(history) < nb_states:
+            direction = self.direction_state_history[len(history) - 1]
+            if not self._game.play_one_direction(direction, 0):
+                raise ValueError("Corrupted seed replay: {} cannot be played at round {}".format(direction,
+                                                                                               len(history) - 1))
+
+    def get_grid_exponents(self, round_number):
+        """
+        Method to get the tile exponents of the Grid state of a given round (simulated up to that round if needed)
+
+        @param round_number: the round of the Grid state (negative values count from the end)
+        @type round_number: int
+        @return: a flat uint8 numpy array of nb_rows * nb_columns tile exponents
+        @rtype: np.array
+        """
+        if round_number < 0:
+            round_number += len(self)
+        if not 0 <= round_number < len(self):
+            raise IndexError("No Grid state for round {}".format(round_number))
+        self.simulate(round_number + 1)
+        return self._game.history.get_grid_exponents(round_number)
+
+    def get_score(self, round_number):
+        """
+        Method to get the score of a given round (simulated up to that round if needed)
+
+        @param round_number: the round (negative values count from the end)
+        @type round_number: int
+        @return: the score of that round
+        @rtype: int
+        """
+        if round_number < 0:
+            round_number += len(self)
+        self.simulate(round_number + 1)
+        return self._game.history.get_score(round_number)
+
+    def add_grid_exponents(self, exponents, score, spawn=None):
+        raise TypeError("A replayed History cannot be modified")
+
+    def pop_round(self):
+        raise TypeError("A replayed History cannot be modified")
+
+
+def write_seed_replay(game, file_path, agent_type=None):
+    """
+    Write a Game into a seed replay file
+
+    @param game: a Game whose new tiles were all drawn from its seeded generator (i.e. game.seed is not None)
+    @type game: Game
+    @param file_path: the path of the seed replay file to write
+    @type file_path: str
+    @param agent_type: (optional) the kind of game (e.g., 'HUMAN', see ReplayCatalog)
+    @type agent_type: str
+    """
+    if game.seed is None or not 0 <= game.seed < 2 ** 64:
+        raise ValueError("This Game cannot be rebuilt from a 64-bit seed (e.g., it was loaded from a log)")
+    if game.history.first_round > 0:
+        raise ValueError("The oldest directions of this Game are no longer in memory")
+    directions = game.directions_played()
+    history = game.history
+    final_state = None
+    if history.direction_state_history and isinstance(history.direction_state_history[-1], States):
+        final_state = history.direction_state_history[-1]
+
+    with open(file_path, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, history.nb_rows, history.nb_columns,
+                            FINAL_STATE_CODES[final_state], AGENT_CODES[agent_type], game.seed, len(directions)))
+        f.write(pack_2bit_codes([DIRECTIONS_LIST.index(d) for d in directions]).tobytes())
+
+
+def read_seed_header(data):
+    """
+    Parse the header of a seed replay (of any version)
+
+    @param data: the content of a seed replay
+    @type data: bytes
+    @return: the nb of rows, the nb of columns, the final state (or None), the seed, the nb of directions played,
+             the kind of game (or None) and the size of the header
+    @rtype: tuple of (int, int, Constants.States, int, int, str, int)
+    """
+    magic, version = struct.unpack('<4sB', data[:5])
+    if magic != MAGIC or version not in HEADER_FORMATS:
+        raise ValueError("Not a seed replay (magic {!r}, version {})".format(magic, version))
+    header_format = HEADER_FORMATS[version]
+    header_size = struct.calcsize(header_format)
+    fields = struct.unpack(header_format, data[:header_size])
+    if version == 1:
+        _, _, nb_rows, nb_columns, final_state_code, seed, nb_directions = fields
+        agent_code = 0
+    else:
+        _, _, nb_rows, nb_columns, final_state_code, agent_code, seed, nb_directions = fields
+    return nb_rows, nb_columns, FINAL_STATES[final_state_code], seed, nb_directions, AGENTS.get(agent_code), \
+        header_size
+
+
+def read_seed_replay(file_path):
+    """
+    Read a seed replay into a ReplayHistory (no Grid state is simulated yet)
+
+    @param file_path: the path of the seed replay file
+    @type file_path: str
+    @return: the History of the replayed Game
+    @rtype: ReplayHistory
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    nb_rows, nb_columns, final_state, seed, nb_directions, _, header_size = read_seed_header(data)
+    codes = unpack_2bit_codes(np.frombuffer(data, dtype='uint8', offset=header_size), nb_directions)
+    return ReplayHistory(nb_rows, nb_columns, seed, [DIRECTIONS_LIST[code] for code in codes], final_state)
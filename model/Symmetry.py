@@ -0,0 +1,157 @@
+# coding: utf-8
+import numpy as np
+
+from Constants import Directions
+from model.BitboardGrid import transpose
+
+# The 8 symmetries of a square Grid (rotations and reflections) are numbered from 0 to 7:
+#   - bit 0: the Grid is transposed (rows become columns)
+#   - bit 1: then the Grid is flipped horizontally (columns are reversed)
+#   - bit 2: then the Grid is flipped vertically (rows are reversed)
+NB_SYMMETRIES = 8
+TRANSPOSED_DIRECTIONS = {Directions.UP: Directions.LEFT, Directions.LEFT: Directions.UP,
+                         Directions.DOWN: Directions.RIGHT, Directions.RIGHT: Directions.DOWN}
+H_FLIPPED_DIRECTIONS = {Directions.UP: Directions.UP, Directions.DOWN: Directions.DOWN,
+                        Directions.LEFT: Directions.RIGHT, Directions.RIGHT: Directions.LEFT}
+V_FLIPPED_DIRECTIONS = {Directions.UP: Directions.DOWN, Directions.DOWN: Directions.UP,
+                        Directions.LEFT: Directions.LEFT, Directions.RIGHT: Directions.RIGHT}
+
+
+def flip_board_horizontally(board):
+    """
+    Reverse the columns of a 4x4 bitboard
+
+    @param board: a 64-bit bitboard
+    @type board: int
+    @return: the flipped bitboard
+    @rtype: int
+    """
+    return ((board & 0x000F000F000F000F) << 12) | ((board & 0x00F000F000F000F0) << 4) | \
+        ((board & 0x0F000F000F000F00) >> 4) | ((board & 0xF000F000F000F000) >> 12)
+
+
+def flip_board_vertically(board):
+    """
+    Reverse the rows of a 4x4 bitboard
+
+    @param board: a 64-bit bitboard
+    @type board: int
+    @return: the flipped bitboard
+    @rtype: int
+    """
+    return ((board & 0x000000000000FFFF) << 48) | ((board & 0x00000000FFFF0000) << 16) | \
+        ((board & 0x0000FFFF00000000) >> 16) | ((board & 0xFFFF000000000000) >> 48)
+
+
+def board_symmetries(board):
+    """
+    Compute the 8 symmetric images of a 4x4 bitboard
+
+    @param board: a 64-bit bitboard
+    @type board: int
+    @return: the image of the bitboard by each symmetry (index = symmetry number)
+    @rtype: list of int
+    """
+    transposed = transpose(board)
+    images = [board, transposed]
+    images += [flip_board_horizontally(b) for b in images]
+    images += [flip_board_vertically(b) for b in images]
+    return images
+
+
+def canonical_board(board):
+    """
+    Get the canonical form of a 4x4 bitboard: the smallest of its 8 symmetric images
+
+    @param board: a 64-bit bitboard
+    @type board: int
+    @return: the canonical bitboard and the symmetry that maps the given bitboard to it
+    @rtype: tuple of (int, int)
+    """
+    images = board_symmetries(board)
+    canonical = min(images)
+    return canonical, images.index(canonical)
+
+
+def transform_states(states, symmetry):
+    """
+    Apply a symmetry to square Grid states of any size
+
+    @param states: a (N, n, n) array of Grid states
+    @type states: np.array
+    @param symmetry: the symmetry number (between 0 and 7)
+    @type symmetry: int
+    @return: a (N, n, n) view of the transformed Grid states
+    @rtype: np.array
+    """
+    if symmetry & 1:
+        states = states.transpose(0, 2, 1)
+    if symmetry & 2:
+        states = states[:, :, ::-1]
+    if symmetry & 4:
+        states = states[:, ::-1, :]
+    return states
+
+
+def canonical_states(states):
+    """
+    Get the canonical forms of square Grid states of any size (vectorized over many Grid states):
+    the lexicographically smallest of the 8 symmetric images of each Grid state, read row by row
+
+    @param states: a (N, n, n) array of Grid states (tile values or exponents)
+    @type states: np.array
+    @return: the (N, n * n) canonical Grid states and the (N,) symmetries that map the given states to them
+    @rtype: tuple of (np.array, np.array)
+    """
+    states = np.asarray(states)
+    rows = np.arange(len(states))
+    best = states.reshape(len(states), -1).copy()
+    best_symmetries = np.zeros(len(states), dtype='int64')
+    for symmetry in range(1, NB_SYMMETRIES):
+        candidate = transform_states(states, symmetry).reshape(len(states), -1)
+        different = candidate != best
+        first_difference = np.argmax(different, axis=1)
+        smaller = different.any(axis=1) & (candidate[rows, first_difference] < best[rows, first_difference])
+        best[smaller] = candidate[smaller]
+        best_symmetries[smaller] = symmetry
+    return best, best_symmetries
+
+
+def transform_direction(direction, symmetry):
+    """
+    Get the direction that plays on the image of a Grid by a symmetry the same move as a direction on that Grid
+
+    @param direction: one of the defined directions from the Constants file
+    @type direction: Constants.Directions
+    @param symmetry: the symmetry number (between 0 and 7)
+    @type symmetry: int
+    @return: the direction to play on the transformed Grid
+    @rtype: Constants.Directions
+    """
+    if symmetry & 1:
+        direction = TRANSPOSED_DIRECTIONS[direction]
+    if symmetry & 2:
+        direction = H_FLIPPED_DIRECTIONS[direction]
+    if symmetry & 4:
+        direction = V_FLIPPED_DIRECTIONS[direction]
+    return direction
+
+
+def inverse_transform_direction(direction, symmetry):
+    """
+    Inverse of transform_direction: get the direction to play on a Grid from a direction chosen on its image
+
+    @param direction: the direction chosen on the transformed Grid
+    @type direction: Constants.Directions
+    @param symmetry: the symmetry number (between 0 and 7)
+    @type symmetry: int
+    @return: the direction to play on the original Grid
+    @rtype: Constants.Directions
+    """
+    if symmetry & 4:
+        direction = V_FLIPPED_DIRECTIONS[direction]
+    if symmetry & 2:
+        direction = H_FLIPPED_DIRECTIONS[direction]
+    if symmetry & 1:
+        direction = TRANSPOSED_DIRECTIONS[direction]
+    return direction
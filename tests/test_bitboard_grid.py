@@ -0,0 +1,97 @@
+# coding: utf-8
+import random
+
+import numpy as np
+import pytest
+
+import Constants
+from Constants import DIRECTIONS_LIST, Directions
+from model.BatchGrid import BatchGrid
+from model.BitboardGrid import BitboardGrid
+from model.Game import Game
+from model.Grid import Grid
+
+
+def random_grids(nb_grids, seed=0):
+    """
+    Random 4x4 grids with some empty tiles, equal neighbours and large tiles
+    """
+    rng = random.Random(seed)
+    for _ in range(nb_grids):
+        values = [rng.choice([0, 0, 0, 2, 4, 8, 16, 1024, 2048]) for _ in range(16)]
+        yield np.array(values, dtype='int64').reshape(4, 4)
+
+
+def test_moves_match_numpy_grid():
+    for values in random_grids(500):
+        bitboard = BitboardGrid(4)
+        bitboard.grid = values
+        successors = bitboard.successors()
+        for direction, (state, score, legal) in zip(DIRECTIONS_LIST, successors):
+            grid = Grid(4)
+            grid.grid = values.copy()
+            expected_score = grid.move(direction)
+            moved = BitboardGrid(4)
+            moved.grid = values
+            assert moved.move(direction) == expected_score == score
+            assert np.array_equal(moved.grid, grid.grid)
+            assert legal == (not np.array_equal(grid.grid, values))
+            moved.set_state(state)
+            assert np.array_equal(moved.grid, grid.grid)
+        grid = Grid(4)
+        grid.grid = values.copy()
+        assert bitboard.grid_still_has_room() == grid.grid_still_has_room()
+        assert bitboard.move_is_still_possible() == grid.move_is_still_possible()
+        assert bitboard.is_winning() == grid.is_winning()
+        assert bitboard.to_string() == grid.to_string()
+        assert np.array_equal(bitboard.to_exponents(), grid.to_exponents())
+
+
+def test_full_grid_without_merge_is_lost():
+    values = np.array([[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]])
+    bitboard = BitboardGrid(4)
+    bitboard.grid = values
+    assert not bitboard.grid_still_has_room()
+    assert not bitboard.move_is_still_possible()
+    assert not any(legal for _, _, legal in bitboard.successors())
+
+
+def test_grid_is_read_only():
+    bitboard = BitboardGrid(4)
+    bitboard.grid = np.full((4, 4), 2)
+    with pytest.raises(ValueError):
+        bitboard.grid[0, 0] = 4
+    exponents = bitboard.to_exponents()
+    exponents[0] = 5  # to_exponents returns a new array every time
+    assert bitboard.to_exponents()[0] == 1
+
+
+def test_both_engines_play_the_same_game():
+    game = Game(BitboardGrid(4), init_grid_with_two_tiles=True, display_grid=False, seed=42)
+    rng = random.Random(0)
+    while not game.ended_game:
+        game.play_many_directions(rng.sample(DIRECTIONS_LIST, len(DIRECTIONS_LIST)))
+    replayed = Game.replay_moves(Grid(4), game.seed, game.directions_played())
+    assert replayed.current_score == game.current_score
+    assert np.array_equal(replayed.grid.grid, game.grid.grid)
+    assert np.array_equal(replayed.history.grid_exponents(), game.history.grid_exponents())
+    assert replayed.grid.is_winning() == game.grid.is_winning()
+    assert game.grid.is_winning() == (game.grid.grid.max() >= Constants.TILE_NUMBER_TO_WIN)
+
+
+@pytest.mark.parametrize('grid_class', [Grid, BitboardGrid])
+def test_32768_tiles_are_not_merged(grid_class):
+    values = np.array([[32768, 32768, 2, 2], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]])
+    grid = grid_class(4)
+    grid.grid = values
+    assert grid.successors()[DIRECTIONS_LIST.index(Directions.LEFT)][1] == 4
+    assert grid.move(Directions.LEFT) == 4
+    assert grid.grid[0].tolist() == [32768, 32768, 4, 0]
+
+
+def test_batch_grid_does_not_merge_32768_tiles():
+    grids = np.zeros((1, 4, 4), dtype='uint8')
+    grids[0, 0] = [15, 15, 1, 1]
+    new_grids, scores = BatchGrid.move_grids(grids, Directions.LEFT)
+    assert new_grids[0, 0].tolist() == [15, 15, 2, 0]
+    assert scores.tolist() == [4]
@@ -0,0 +1,50 @@
+# coding: utf-8
+import os
+import shutil
+
+import numpy as np
+
+import Constants
+from ai.Corpus import TrainingCorpus
+from ai.Dataset import build_dataset
+from ai.NeuralNetwork import NeuralNetwork
+
+TRAIN_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'train_logs')
+
+
+def corpus_examples(corpus):
+    batches = list(corpus.batches(64, shuffle=False))
+    return np.vstack([x for x, _ in batches]), np.vstack([y for _, y in batches])
+
+
+def test_corpus_follows_the_training_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(Constants, 'DATA_DIR_NAME', str(tmp_path))
+    file_paths = list()
+    for file_name in sorted(f for f in os.listdir(TRAIN_DIR) if f.endswith('.log')):
+        file_paths.append(str(tmp_path / file_name))
+        shutil.copy(os.path.join(TRAIN_DIR, file_name), file_paths[-1])
+    parse = NeuralNetwork.parse_inputs_outputs_for_neural_net
+
+    corpus = TrainingCorpus(str(tmp_path / 'corpus'))
+    corpus.add_files(file_paths, parse)
+    assert len(corpus) == len(build_dataset(file_paths, parse)[0])
+
+    # The examples of a log removed from the training set are dropped, the other ones are kept in order
+    kept_paths = [file_paths[0], file_paths[2]]
+    corpus = TrainingCorpus(str(tmp_path / 'corpus'))
+    corpus.add_files(kept_paths, parse)
+    expected_x, expected_y = build_dataset(kept_paths, parse)
+    x, y = corpus_examples(corpus)
+    assert np.allclose(x, expected_x) and np.array_equal(y, expected_y)
+
+    corpus.add_files(file_paths, parse)
+    assert len(corpus) == len(build_dataset(file_paths, parse)[0])
+
+
+def test_seeded_batches_are_reproducible(tmp_path, monkeypatch):
+    monkeypatch.setattr(Constants, 'DATA_DIR_NAME', str(tmp_path))
+    corpus = TrainingCorpus(str(tmp_path / 'corpus'))
+    corpus.add_files([os.path.join(TRAIN_DIR, 'human_1024_1.log')], NeuralNetwork.parse_inputs_outputs_for_neural_net)
+    orders = [[y.tolist() for _, y in corpus.batches(32, block_size=64, rng=np.random.default_rng(5))]
+              for _ in range(2)]
+    assert orders[0] == orders[1]
@@ -0,0 +1,29 @@
+# coding: utf-8
+from Constants import DIRECTIONS_LIST
+from model.BitboardGrid import BitboardGrid
+from model.Game import Game
+from model.GameObserver import FileObserver, ReplayLogObserver
+
+
+def test_file_observer_opens_its_file_with_the_game(tmp_path):
+    file_path = tmp_path / 'game.txt'
+    observer = FileObserver(str(file_path))
+    assert not file_path.exists()
+    game = Game(BitboardGrid(4), init_grid_with_two_tiles=True, display_grid=False, observers=[observer], seed=3)
+    for _ in range(5):
+        game.play_many_directions(DIRECTIONS_LIST)
+    observer.close()  # The Game is abandoned before its end
+    assert observer.stream.closed
+    assert file_path.read_text().count("Next direction to be played") == 5
+
+
+def test_interrupted_log_is_loaded_up_to_its_last_round(tmp_path):
+    log_path = str(tmp_path / 'game.log')
+    observer = ReplayLogObserver(log_path, flush_interval=1000)
+    game = Game(BitboardGrid(4), init_grid_with_two_tiles=True, display_grid=False, observers=[observer], seed=3)
+    for _ in range(20):
+        game.play_many_directions(DIRECTIONS_LIST)
+    observer.close()
+    loaded = Game.load_game(log_path, display_grid=False)
+    assert len(loaded.history) == game.round_count
+    assert loaded.history.get_score(-1) == game.history.get_score(game.round_count - 1)
@@ -0,0 +1,33 @@
+# coding: utf-8
+import random
+
+import numpy as np
+import pytest
+
+from Constants import DIRECTIONS_LIST, Directions
+from model.Grid import Grid
+
+
+@pytest.mark.parametrize('size', [3, 4, 5])
+def test_successors_match_moves(size):
+    rng = random.Random(size)
+    for _ in range(200):
+        values = np.array([rng.choice([0, 0, 2, 2, 4, 8, 64]) for _ in range(size * size)]).reshape(size, size)
+        grid = Grid(size)
+        grid.grid = values.copy()
+        for direction, (state, score, legal) in zip(DIRECTIONS_LIST, grid.successors()):
+            moved = Grid(size)
+            moved.grid = values.copy()
+            assert moved.move(direction) == score
+            assert np.array_equal(moved.grid, state)
+            assert legal == (not np.array_equal(moved.grid, values))
+        assert np.array_equal(grid.grid, values)
+
+
+def test_successors_follow_in_place_changes():
+    grid = Grid(4)
+    grid.grid[0, 0] = 2
+    left = DIRECTIONS_LIST.index(Directions.LEFT)
+    assert grid.successors()[left][1:] == (0, False)
+    grid.grid[0, 1] = 2
+    assert grid.successors()[left][1:] == (4, True)
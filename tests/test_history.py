@@ -0,0 +1,78 @@
+# coding: utf-8
+import random
+
+import numpy as np
+import pytest
+
+from Constants import DIRECTIONS_LIST
+from model.BitboardGrid import BitboardGrid
+from model.Game import Game
+from model.GameObserver import GameObserver
+from model.History import History
+
+
+class SnapshotObserver(GameObserver):
+    """
+    Keeps a copy of every Grid state, score and direction of a Game
+    """
+
+    def __init__(self):
+        self.rounds = list()
+
+    def on_game_started(self, game):
+        self.rounds.append((game.grid.to_exponents(), game.current_score, None))
+
+    def on_direction_played(self, game, direction):
+        self.rounds.append((game.grid.to_exponents(), game.current_score, direction))
+
+
+def play_game(seed=11):
+    observer = SnapshotObserver()
+    game = Game(BitboardGrid(4), init_grid_with_two_tiles=True, display_grid=False, observers=[observer], seed=seed)
+    rng = random.Random(seed)
+    while not game.ended_game:
+        game.play_many_directions(rng.sample(DIRECTIONS_LIST, len(DIRECTIONS_LIST)))
+    return game, observer.rounds
+
+
+def fill_history(history, rounds):
+    for exponents, score, direction in rounds:
+        if direction is not None:
+            history.add_direction_or_state(direction, 0)
+        history.add_grid_exponents(exponents, score)  # The new tile is found by replaying the direction
+
+
+def test_delta_encoded_states_are_rebuilt():
+    game, rounds = play_game()
+    assert np.array_equal(game.history.grid_exponents(), [exponents for exponents, _, _ in rounds])
+
+    history = History(4, 4, keyframe_interval=8)
+    fill_history(history, rounds)
+    assert len(history.keyframes) == (len(rounds) + 7) // 8
+    for i in random.Random(0).sample(range(len(rounds)), len(rounds)):  # Forward and backward seeks
+        assert np.array_equal(history.get_grid_exponents(i), rounds[i][0])
+        assert history.get_score(i) == rounds[i][1]
+
+
+def test_pop_round_restores_the_previous_state():
+    _, rounds = play_game()
+    history = History(4, 4, keyframe_interval=8)
+    fill_history(history, rounds[:17])
+    history.pop_round()
+    assert len(history) == 16
+    assert np.array_equal(history.get_grid_exponents(-1), rounds[15][0])
+    assert history.something_moved(rounds[16][0])
+
+
+def test_window_keeps_the_recent_rounds_only():
+    _, rounds = play_game()
+    history = History(4, 4, keyframe_interval=8, window=20)
+    fill_history(history, rounds)
+    assert len(history) == len(rounds)
+    assert 0 < history.first_round <= len(rounds) - 20
+    assert len(history.scores) < 40 + 8
+    for i in range(len(rounds) - 20, len(rounds)):
+        assert np.array_equal(history.get_grid_exponents(i), rounds[i][0])
+        assert history.get_direction(i - 1) == rounds[i][2]
+    with pytest.raises(IndexError):
+        history.get_grid_exponents(history.first_round - 1)
@@ -0,0 +1,93 @@
+# coding: utf-8
+import os
+import shutil
+
+import numpy as np
+
+import Constants
+
+from ai import Dataset
+from ai.Agents import NeuralAgent
+from ai.Layer import Layer
+from ai.NeuralNetwork import DIRECTION_VALUES_LIST, NeuralNetwork
+from model.BinaryReplay import convert_log_to_binary
+from model.Game import Game
+
+TRAIN_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'train_logs')
+TRAIN_LOG_PATH = os.path.join(TRAIN_DIR, 'human_2048_1.log')
+
+
+def test_training_log_yields_distinct_labelled_examples():
+    game = Game.load_game(TRAIN_LOG_PATH, display_grid=False)
+    x, y = NeuralNetwork.parse_inputs_outputs_for_neural_net(game)
+
+    assert len(x) > len(game.history) // 2
+    assert len(np.unique(np.hstack((x, y)), axis=0)) == len(x)
+    assert not np.any(np.all(x == 0, axis=1))
+    assert set(np.unique(y).tolist()) == set(DIRECTION_VALUES_LIST)
+
+
+def test_seeded_training_is_reproducible():
+    game = Game.load_game(TRAIN_LOG_PATH, display_grid=False)
+    x, y = NeuralNetwork.parse_inputs_outputs_for_neural_net(game)
+    weights = list()
+    for _ in range(2):
+        rng = np.random.default_rng(12)
+        nn = NeuralNetwork()
+        nn.add_layer(Layer(16, 4, rng=rng))
+        nn.add_layer(Layer(4, 4, rng=rng))
+        nn.train(x, y, learning_rate=0.1, max_epochs=3, batch_size=32, rng=rng)
+        weights.append(nn.get_parameters())
+    assert np.array_equal(weights[0], weights[1])
+
+
+def test_agent_feeds_the_network_its_training_input():
+    game = Game.load_game(TRAIN_LOG_PATH, display_grid=False)
+    x, _ = NeuralNetwork.parse_inputs_outputs_for_neural_net(game)
+    round_index = len(game.history) // 2
+    game.grid.set_exponents(game.history.get_grid_exponents(round_index))
+
+    class InputRecorder(NeuralNetwork):
+        def predict_batch(self, boards):
+            self.boards = boards
+            return super().predict_batch(boards)
+
+    nn = InputRecorder()
+    nn.add_layer(Layer(16, 4, rng=np.random.default_rng(0)))
+    NeuralAgent(nn).predict(game)
+    assert nn.boards.max() <= 1
+    assert any(np.allclose(nn.boards[0], example) for example in x)
+
+
+def test_training_step_updates_the_biases():
+    rng = np.random.default_rng(3)
+    layers = [Layer(16, 4, rng=rng), Layer(4, 4, rng=rng)]
+    nn = NeuralNetwork()
+    for layer in layers:
+        nn.add_layer(layer)
+    biases = [layer.bias.copy() for layer in layers]
+    nn.backpropagation(rng.random((8, 16)), rng.random((8, 4)), learning_rate=0.5)
+    assert all(not np.allclose(layer.bias, bias) for layer, bias in zip(layers, biases))
+
+
+def test_training_files_prefer_binary_replays(tmp_path, monkeypatch):
+    monkeypatch.setattr(Constants, 'DATA_DIR_NAME', str(tmp_path))
+    train_dir = tmp_path / 'train'
+    train_dir.mkdir()
+    for file_name in ['human_512_1.log', 'human_2048_1.log']:
+        shutil.copy(os.path.join(TRAIN_DIR, file_name), str(train_dir / file_name))
+    convert_log_to_binary(str(train_dir / 'human_2048_1.log'))
+
+    training_files = NeuralNetwork.list_training_files(str(train_dir))
+    assert [os.path.basename(f['path']) for f in training_files] == ['human_2048_1.bin', 'human_512_1.log']
+    x, y = NeuralNetwork().load_training_data([f['path'] for f in training_files],
+                                              [f['hash'] for f in training_files])
+    assert len(x) == len(y) > 0
+
+    # Cached examples are found from the hash of the catalog, without hashing the files again
+    def hash_of(file_path):
+        raise AssertionError("{} hashed again".format(file_path))
+    monkeypatch.setattr(Dataset, 'hash_of', hash_of)
+    cached_x, _ = NeuralNetwork().load_training_data([f['path'] for f in training_files],
+                                                     [f['hash'] for f in training_files])
+    assert np.array_equal(cached_x, x)
@@ -0,0 +1,16 @@
+# coding: utf-8
+import numpy as np
+
+from ai.Neuroevolution import NeuroevolutionTrainer
+
+
+def test_best_network_comes_from_the_last_generation(monkeypatch):
+    trainer = NeuroevolutionTrainer([[16, 4], [4, 4]], population_size=4, nb_games=1, seed=0)
+    # A lucky candidate of the first generation scores much less once evaluated again on other seeds
+    fitnesses = iter([np.array([1000.0, 1.0, 2.0, 3.0]), np.array([10.0, 20.0, 5.0, 1.0])])
+    monkeypatch.setattr(trainer, 'evaluate', lambda seeds, executor=None: (next(fitnesses), 1))
+    trainer.train(1)
+    second_generation = trainer.population.copy()
+    trainer.train(2)
+    assert trainer.best_fitness == 20.0
+    assert np.array_equal(trainer.best_parameters, second_generation[1])
@@ -0,0 +1,14 @@
+# coding: utf-8
+import numpy as np
+
+from ai.NTuple import NTupleNetwork
+
+
+def test_seeded_training_is_reproducible():
+    weights = list()
+    for _ in range(2):
+        network = NTupleNetwork()
+        network.train(3, learning_rate=0.1, print_every=3, seed=4)
+        weights.append(network.weights.copy())
+    assert np.array_equal(weights[0], weights[1])
+
@@ -0,0 +1,39 @@
+# coding: utf-8
+import os
+import shutil
+
+from Constants import States
+from model.ReplayCatalog import ReplayCatalog
+
+TRAIN_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'train_logs')
+
+
+def test_catalog_follows_the_replays_of_a_directory(tmp_path):
+    replay_dir = tmp_path / 'replays'
+    replay_dir.mkdir()
+    for file_name in ['human_512_1.log', 'human_1024_1.log', 'human_2048_1.log']:
+        shutil.copy(os.path.join(TRAIN_DIR, file_name), str(replay_dir / file_name))
+
+    with ReplayCatalog(str(tmp_path / 'replays.sqlite')) as catalog:
+        assert catalog.update(str(replay_dir)) == (3, 0)
+        assert catalog.update(str(replay_dir)) == (0, 0)
+
+        replays = catalog.query(directory=str(replay_dir), agent='HUMAN', min_max_tile=1024)
+        assert [os.path.basename(r['path']) for r in replays] == ['human_1024_1.log', 'human_2048_1.log']
+        assert [r['final_state'] for r in replays] == [States.LOOSE.value, States.WIN.value]
+
+        # A touched but unchanged replay is not loaded again, a modified one is
+        os.utime(str(replay_dir / 'human_512_1.log'), (0, 0))
+        assert catalog.update(str(replay_dir)) == (0, 0)
+        log_path = str(replay_dir / 'human_1024_1.log')
+        with open(log_path, 'r') as f:
+            lines = f.readlines()
+        with open(log_path, 'w') as f:
+            f.writelines(lines[:100])  # An interrupted Game
+        assert catalog.update(str(replay_dir)) == (1, 0)
+        replay = catalog.query(directory=str(replay_dir), max_rounds=120)
+        assert [(os.path.basename(r['path']), r['final_state']) for r in replay] == [('human_1024_1.log', None)]
+
+        os.remove(str(replay_dir / 'human_2048_1.log'))
+        assert catalog.update(str(replay_dir)) == (0, 1)
+        assert len(catalog.query()) == 2
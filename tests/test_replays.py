@@ -0,0 +1,101 @@
+# coding: utf-8
+import os
+import shutil
+import struct
+
+import numpy as np
+import pytest
+
+from Constants import DIRECTIONS_LIST
+from model.BinaryReplay import MAGIC, convert_log_to_binary, read_boards, read_replay, write_replay
+from model.BitboardGrid import BitboardGrid
+from model.Game import Game
+from model.ReplayCatalog import agent_of
+from model.SeedReplay import read_seed_replay, write_seed_replay
+
+TRAIN_LOG_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'train_logs', 'human_2048_1.log')
+
+
+def play_game(seed=7):
+    game = Game(BitboardGrid(4), init_grid_with_two_tiles=True, display_grid=False, seed=seed)
+    while not game.ended_game:
+        game.play_many_directions(DIRECTIONS_LIST)
+    return game
+
+
+def test_replays_keep_their_agent(tmp_path):
+    game = play_game()
+    binary_path, seed_path = str(tmp_path / '1.bin'), str(tmp_path / '1.seed')
+    write_replay(game.history, binary_path, agent_type='EXPECTIMAX')
+    write_seed_replay(game, seed_path, agent_type='NTUPLE')
+    assert agent_of(binary_path) == 'EXPECTIMAX'
+    assert agent_of(seed_path) == 'NTUPLE'
+
+    write_replay(game.history, binary_path)
+    assert agent_of(binary_path) is None
+
+
+def test_version_1_binary_replays_are_still_read(tmp_path):
+    game = play_game()
+    binary_path = str(tmp_path / '1.bin')
+    write_replay(game.history, binary_path, agent_type='RANDOM')
+    with open(binary_path, 'rb') as f:
+        data = f.read()
+    # A version 1 header is the same header without the agent code
+    _, _, nb_rows, nb_columns, final_state_code, _, nb_states = struct.unpack('<4sBBBBBI', data[:13])
+    with open(binary_path, 'wb') as f:
+        f.write(struct.pack('<4sBBBBI', MAGIC, 1, nb_rows, nb_columns, final_state_code, nb_states) + data[13:])
+    history = read_replay(binary_path)
+    assert list(history.score_history) == list(game.history.score_history)
+    assert agent_of(binary_path) is None
+
+
+def test_converted_log_keeps_the_agent_of_its_name(tmp_path):
+    log_path = str(tmp_path / 'human_2048_1.log')
+    shutil.copy(TRAIN_LOG_PATH, log_path)
+    assert agent_of(convert_log_to_binary(log_path)) == 'HUMAN'
+
+
+def test_seed_replay_is_rebuilt(tmp_path):
+    game = play_game()
+    seed_path = str(tmp_path / '1.seed')
+    write_seed_replay(game, seed_path)
+    history = read_seed_replay(seed_path)
+    assert len(history) == len(game.history)
+    assert history.get_score(-1) == game.current_score
+    assert np.array_equal(history.grid_exponents(), game.history.grid_exponents())
+    assert history.direction_state_history == game.history.direction_state_history
+
+
+def test_binary_replay_round_trip(tmp_path):
+    game = play_game()
+    binary_path = str(tmp_path / '1.bin')
+    write_replay(game.history, binary_path)
+    history = read_replay(binary_path)
+    assert np.array_equal(history.grid_exponents(), game.history.grid_exponents())
+    assert list(history.score_history) == list(game.history.score_history)
+    assert history.direction_state_history == game.history.direction_state_history
+    assert history.direction_index_history == game.history.direction_index_history
+    assert np.array_equal(read_boards(binary_path), [state.ravel() for state in game.history.grid_states()])
+
+
+def test_converted_log_round_trip(tmp_path):
+    binary_path = convert_log_to_binary(TRAIN_LOG_PATH, str(tmp_path / 'human.bin'))
+    original = Game.load_game(TRAIN_LOG_PATH, display_grid=False).history
+    history = Game.load_game(binary_path, display_grid=False).history
+    assert np.array_equal(history.grid_exponents(), original.grid_exponents())
+    assert list(history.score_history) == list(original.score_history)
+    assert history.direction_state_history == original.direction_state_history
+
+
+def test_unknown_replay_versions_are_reported(tmp_path):
+    game = play_game()
+    binary_path, seed_path = str(tmp_path / '1.bin'), str(tmp_path / '1.seed')
+    write_replay(game.history, binary_path)
+    write_seed_replay(game, seed_path)
+    for file_path, reader, kind in ((binary_path, read_replay, 'binary'), (seed_path, read_seed_replay, 'seed')):
+        with open(file_path, 'r+b') as f:
+            f.seek(4)
+            f.write(bytes([9]))  # A future version
+        with pytest.raises(ValueError, match="Not a {} replay .*version 9".format(kind)):
+            reader(file_path)
@@ -2,13 +2,43 @@
 from tkinter import *
 from tkinter import filedialog
 
+import Constants
 from Constants import Modes
 from Constants import Directions
+from ai.AnytimeSearch import IterativeDeepeningAgent
+from ai.Expectimax import ExpectimaxAgent
+from model.BitboardGrid import BITBOARD_SIZE
 from model.Game import Game
+from model.GameObserver import GameObserver
 from model.Grid import Grid
 from ui.TkConstants import TkConstants as tkc
 
 
+class WindowObserver(GameObserver):
+    """
+    An observer that refreshes the GUI after each move and saves the game log when the game ends
+    A game where the AI played at least one move (<a> key) is saved as an EXPECTIMAX game, so that it is never
+    selected as a HUMAN game
+    """
+
+    def __init__(self, window):
+        """
+        @param window: the GUI to refresh
+        @type window: Window
+        """
+        self.window = window
+
+    def on_direction_played(self, game, direction):
+        self.window.update_grid()
+
+    def on_game_ended(self, game, state):
+        game.save_game(self.window.base_path, binary=Constants.REPLAY_FORMAT == 'bin',
+                       seed_only=Constants.REPLAY_FORMAT == 'seed',
+                       agent_type='EXPECTIMAX' if self.window.agent_played else 'HUMAN')
+        print(game.history)
+        print("END OF GAME after {} turns with score {}".format(game.round_count, game.current_score))
+
+
 class Window:
     """
     This class represents a tkinter-based 2048 Graphical User Interface (GUI)
@@ -30,6 +60,13 @@ class Window:
         self.nb_columns = nb_rows_columns
         self.base_path = base_path
         self.label_grid_mat = None
+        # The AI that plays a move within a fixed time budget when the <a> key is pressed
+        self.agent = IterativeDeepeningAgent(ExpectimaxAgent(min_probability=Constants.EXPECTIMAX_MIN_PROBABILITY,
+                                                             table_size=Constants.EXPECTIMAX_TABLE_SIZE,
+                                                             use_symmetries=Constants.EXPECTIMAX_USE_SYMMETRIES),
+                                             time_budget=Constants.ANYTIME_TIME_BUDGET_MS / 1000.0,
+                                             max_depth=Constants.ANYTIME_MAX_DEPTH)
+        self.agent_played = False  # Whether the AI played a move of the current game
 
         # General parameters for Tk window
         self.window = Tk()
@@ -70,14 +107,15 @@ class Window:
         """
         self.mode = Modes.MODE_PLAY
         self.mode_text.set("PLAY")
-        self.next_move.set("Press <c> to cancel")
+        self.next_move.set("Press <c> to cancel, <a> to let the AI play")
         if self.label_grid_mat:
             del self.label_grid_mat
         self.label_grid_mat = list()
         self.mode_label.configure(bg="blue")
         grid = Grid(self.nb_rows)
-        self.game = Game(grid, init_grid_with_two_tiles=True)
         self.grid = grid
+        self.game = Game(grid, init_grid_with_two_tiles=True, observers=[WindowObserver(self)])
+        self.agent_played = False
         self.score_text.set("Score: 0")
         self.turn_text.set("Round 0")
         self.display_grid()
@@ -91,14 +129,16 @@ class Window:
         self.mode_text.set("REPLAY")
         self.mode_label.configure(bg="red")
         filepath = filedialog.askopenfilename(initialdir=".", title="Select file",
-                                              filetypes=(("2048 replay files", "*.log"), ("all files", "*.*")))
+                                              filetypes=(("2048 replay files", "*.log"),
+                                                         ("2048 binary replay files", "*.bin"),
+                                                         ("2048 seed replay files", "*.seed"),
+                                                         ("all files", "*.*")))
         if filepath != '':
             self.game = Game.load_game(filepath)
-            t_str_state = self.game.history.grid_history[0]
-            try:
-                self.grid.grid = Grid.from_string(t_str_state, self.nb_rows, self.nb_columns)
+            if self.game.history.nb_rows == self.nb_rows and self.game.history.nb_columns == self.nb_columns:
+                self.grid.grid = self.game.history.get_grid_state(0)
                 self.update_grid()
-            except ValueError:
+            else:
                 print("Incorrect matrix dimensions!")
         else:
             self.start_new_game()
@@ -137,7 +177,7 @@ class Window:
         self.score_text.set("Score: " + str(self.game.current_score))
         if self.mode == Modes.MODE_REPLAY:
             self.turn_text.set(
-                "Round {} / {}".format(self.game.round_count, str(len(self.game.history.grid_history) - 1)))
+                "Round {} / {}".format(self.game.round_count, str(len(self.game.history) - 1)))
             self.next_move.set("Next move: {}".format(self.game.history.direction_state_history[self.game.round_count]))
         else:
             self.turn_text.set("Round {}".format(self.game.round_count))
@@ -153,44 +193,39 @@ class Window:
         if self.mode == Modes.MODE_PLAY:
             if event.keysym in [v.value for v in Directions]:
                 if not self.game.ended_game:
+                    # The GUI is refreshed by the WindowObserver of the Game
                     self.game.play_one_direction(Directions(event.keysym), 0)
-                    self.update_grid()
-                if self.game.ended_game:
-                    self.game.save_game(self.base_path)
-                    print(self.game.history)
-                    print("END OF GAME after {} turns with score {}".format(self.game.round_count,
-                                                                            self.game.current_score))
+            elif event.keysym in ["a"] and self.nb_rows == BITBOARD_SIZE:  # Search agents require bitboards
+                if not self.game.ended_game:
+                    self.agent_played = True
+                    self.game.play_many_directions(self.agent.predict(self.game))
             elif event.keysym in ["c"]:
                 self.game.ended_game = False
-                if len(self.game.history.grid_history) > 1:
-                    self.game.history.direction_state_history.pop()
-                    self.game.history.direction_index_history.pop()
-                    self.game.history.grid_history.pop()
-                    self.game.history.score_history.pop()
+                if len(self.game.history) > 1:
+                    self.game.history.pop_round()
                     self.game.round_count -= 1
-                    t_str_state = self.game.history.grid_history[-1]
-                    self.grid.grid = Grid.from_string(t_str_state, self.nb_rows, self.nb_columns)
-                    self.game.current_score = self.game.history.score_history[-1]
+                    self.game.seed = None  # The new tiles drawn afterwards no longer match the directions played
+                    self.grid.grid = self.game.history.get_grid_state(-1)
+                    self.game.current_score = self.game.history.get_score(-1)
                     self.update_grid()
 
         elif self.mode == Modes.MODE_REPLAY:
             if event.keysym == "Right":
-                if self.game.round_count + 1 < len(self.game.history.grid_history):
+                if self.game.round_count + 1 < len(self.game.history):
                     self.game.round_count += 1
             elif event.keysym == "Left":
                 if self.game.round_count - 1 >= 0:
                     self.game.round_count -= 1
             elif event.keysym == "Up":
-                if self.game.round_count + 50 < len(self.game.history.grid_history):
+                if self.game.round_count + 50 < len(self.game.history):
                     self.game.round_count += 50
                 else:
-                    self.game.round_count = len(self.game.history.grid_history) - 1
+                    self.game.round_count = len(self.game.history) - 1
             elif event.keysym == "Down":
                 if self.game.round_count - 50 >= 0:
                     self.game.round_count -= 50
                 else:
                     self.game.round_count = 0
-            t_str_state = self.game.history.grid_history[self.game.round_count]
-            self.grid.grid = Grid.from_string(t_str_state, self.nb_rows, self.nb_columns)
-            self.game.current_score = self.game.history.score_history[self.game.round_count]
+            self.grid.grid = self.game.history.get_grid_state(self.game.round_count)
+            self.game.current_score = self.game.history.get_score(self.game.round_count)
             self.update_grid()